@@ -0,0 +1,253 @@
+import atexit
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Logging settings, overridable through environment variables
+LOG_FILE = os.environ.get("EVO_LOG_FILE", "app.log")
+LOG_LEVEL = os.environ.get("EVO_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("EVO_LOG_FORMAT", "json").lower()  # "json" or "text"
+LOG_MAX_BYTES = int(os.environ.get("EVO_LOG_MAX_BYTES", 5 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get("EVO_LOG_BACKUP_COUNT", 10))
+LOG_ROTATE_WHEN = os.environ.get("EVO_LOG_ROTATE_WHEN", "midnight")
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Correlation IDs attached to every record logged in the current context
+run_id_var = contextvars.ContextVar("run_id", default=None)
+tag_id_var = contextvars.ContextVar("tag_id", default=None)
+
+_listener = None
+_sample_counters = {}
+_sample_lock = threading.Lock()
+
+
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """
+    Rotates the log file on a time schedule and whenever it grows past max_bytes.
+    """
+
+    def __init__(self, filename, max_bytes=0, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+        # Size rollovers can happen several times per interval, so rotated
+        # files always carry a timestamp down to the second.
+        self.suffix = "%Y-%m-%d_%H-%M-%S"
+        self.extMatch = re.compile(r"^\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}(\.\w+)?$", re.ASCII)
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes > 0 and self.stream is not None:
+            self.stream.seek(0, 2)
+            self._size_rollover = self.stream.tell() >= self.max_bytes
+            return self._size_rollover
+        return False
+
+    def doRollover(self):
+        if not getattr(self, "_size_rollover", False):
+            return super().doRollover()
+        # Size triggered: rotate under the current time and keep the time schedule as is
+        self._size_rollover = False
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        rotated = self.rotation_filename(f"{self.baseFilename}.{time.strftime(self.suffix)}")
+        if not os.path.exists(rotated):
+            self.rotate(self.baseFilename, rotated)
+        if self.backupCount > 0:
+            for old_file in self.getFilesToDelete():
+                os.remove(old_file)
+        if not self.delay:
+            self.stream = self._open()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "run_id", None):
+            entry["run_id"] = record.run_id
+        if getattr(record, "tag_id", None):
+            entry["tag_id"] = record.tag_id
+        if getattr(record, "data", None) is not None:
+            entry["data"] = record.data
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class CorrelationFilter(logging.Filter):
+    """
+    Copies the run/tag correlation IDs of the emitting context onto the record.
+    """
+
+    def filter(self, record):
+        record.run_id = run_id_var.get()
+        record.tag_id = tag_id_var.get()
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that never blocks the caller and defers file I/O to the listener thread.
+    """
+
+    def prepare(self, record):
+        # Merge the message arguments now (they may be mutated later), but leave
+        # the final line formatting and the disk write to the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass  # Drop the record rather than stall a print run
+
+
+class Lazy:
+    """
+    Defers an expensive payload formatting until a handler actually needs the text.
+
+    Usage: logging.debug("Response: %s", Lazy(json.dumps, data))
+    """
+
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+
+def truncate(value, limit=200):
+    """
+    Lazily render a value, cut down to `limit` characters.
+    """
+    def _render():
+        text = str(value)
+        return text if len(text) <= limit else f"{text[:limit]}... ({len(text)} chars)"
+    return Lazy(_render)
+
+
+def should_sample(key, every):
+    """
+    Return True once every `every` calls for the given key (the first call included).
+    """
+    if every <= 1:
+        return True
+    with _sample_lock:
+        counter = _sample_counters.get(key)
+        if counter is None:
+            counter = _sample_counters[key] = itertools.count()
+        return next(counter) % every == 0
+
+
+def log_sampled(level, key, every, msg, *args, **kwargs):
+    """
+    Log a hot-loop message only once every `every` calls.
+    """
+    logger = logging.getLogger()
+    if logger.isEnabledFor(level) and should_sample(key, every):
+        logger.log(level, msg, *args, **kwargs)
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:12]
+
+
+@contextmanager
+def log_context(run_id=None, tag_id=None):
+    """
+    Bind correlation IDs to every record logged inside the block.
+    """
+    tokens = []
+    if run_id is not None:
+        tokens.append((run_id_var, run_id_var.set(run_id)))
+    if tag_id is not None:
+        tokens.append((tag_id_var, tag_id_var.set(tag_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def set_tag_id(tag_id):
+    """
+    Set the tag correlation ID for the current context (None clears it).
+    """
+    tag_id_var.set(tag_id)
+
+
+def setup_logging(log_file=LOG_FILE, level=LOG_LEVEL, fmt=LOG_FORMAT,
+                  max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT, when=LOG_ROTATE_WHEN):
+    """
+    Configure the root logger with a queue-based handler feeding a rotating file handler.
+    Safe to call more than once; only the first call installs handlers.
+    """
+    global _listener
+    root = logging.getLogger()
+    if _listener is not None:
+        return root
+
+    file_handler = SizedTimedRotatingFileHandler(
+        log_file, max_bytes=max_bytes, when=when, backupCount=backup_count, encoding="utf-8", delay=True
+    )
+    if fmt == "text":
+        file_handler.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+    else:
+        file_handler.setFormatter(JsonLinesFormatter())
+
+    log_queue = queue.Queue(maxsize=10000)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationFilter())
+
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return root
+
+
+def shutdown_logging():
+    """
+    Flush pending records and stop the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+import tkinter as tk
+import weakref
+from metrics import record_cache
+
+# Image assets shipped with the application
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "attached_assets")
+EVO_ICON = "EVOlogoInverse32x32_1758093354058.png"
+EVO_ICO = "evo_logo_inverse.ico"
+EVO_LOGO = "Evo200pixel_1757673015542.png"
+ICO_SIZES = [(16, 16), (32, 32), (48, 48), (64, 64)]
+
+# Formats Tk decodes natively; used without PIL when no resize is needed
+_TK_NATIVE_FORMATS = (".png", ".gif", ".ppm", ".pgm")
+
+_lock = threading.RLock()
+_images = {}  # (name, size) -> PIL image, decoded and resized once per process
+_photos = weakref.WeakKeyDictionary()  # Tk root -> {(name, size): PhotoImage}
+_ico_checked = {}  # ico name -> path, once per process
+
+
+def asset_path(name):
+    return os.path.join(ASSETS_DIR, name)
+
+
+def get_image(name, size=None):
+    """
+    Return the asset as an RGBA PIL image, resized to `size` with LANCZOS.
+    Each (name, size) is decoded and resized only once per process.
+    """
+    key = (name, size)
+    with _lock:
+        image = _images.get(key)
+        record_cache("image", image is not None)
+        if image is not None:
+            return image
+        from PIL import Image  # Imported lazily to keep startup fast
+        image = Image.open(asset_path(name))
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
+        else:
+            image.load()
+        if size and image.size != size:
+            image = image.resize(size, Image.Resampling.LANCZOS if hasattr(Image, "Resampling") else Image.ANTIALIAS)
+        _images[key] = image
+        return image
+
+
+def get_photo(name, size=None, master=None):
+    """
+    Return a PhotoImage of the asset for the Tk interpreter of `master`.
+    PhotoImages are cached per Tk root and kept alive for as long as the root exists,
+    so callers don't need to hold references to prevent garbage collection.
+    """
+    root = master._root() if master is not None else tk._get_default_root()
+    key = (name, size)
+    with _lock:
+        photos = _photos.setdefault(root, {})
+        photo = photos.get(key)
+        record_cache("photo", photo is not None)
+        if photo is not None:
+            return photo
+        path = asset_path(name)
+        if name.lower().endswith(_TK_NATIVE_FORMATS) and (size is None or _native_size(path) == size):
+            photo = tk.PhotoImage(master=root, file=path)
+        else:
+            from PIL import ImageTk
+            photo = ImageTk.PhotoImage(get_image(name, size), master=root)
+        photos[key] = photo
+        return photo
+
+
+def _native_size(path):
+    """
+    Read the pixel size from a PNG header without decoding the image (None for other formats).
+    """
+    try:
+        with open(path, "rb") as image_file:
+            header = image_file.read(24)
+    except OSError:
+        return None
+    if header[:8] != b"\x89PNG\r\n\x1a\n":
+        return None
+    return int.from_bytes(header[16:20], "big"), int.from_bytes(header[20:24], "big")
+
+
+def get_ico_path(source=EVO_ICON, ico=EVO_ICO):
+    """
+    Return the path of the multi-size ICO built from `source`, regenerating it only
+    when it is missing or older than the source image. None if it can't be built.
+    """
+    with _lock:
+        if ico in _ico_checked:
+            return _ico_checked[ico]
+        source_path, ico_path = asset_path(source), asset_path(ico)
+        try:
+            up_to_date = os.path.getmtime(ico_path) >= os.path.getmtime(source_path)
+        except OSError:
+            up_to_date = False
+        if not up_to_date:
+            try:
+                get_image(source).save(ico_path, format="ICO", sizes=ICO_SIZES)
+                logging.debug("Saved ICO file at %s", ico_path)
+            except Exception as e:
+                logging.debug("Could not save ICO file %s: %s", ico_path, e)
+                ico_path = ico_path if os.path.exists(ico_path) else None
+        _ico_checked[ico] = ico_path
+        return ico_path
@@ -4,6 +4,7 @@ from tkinter import messagebox
 from database import logging
 import json
 import config
+import session
 
 # Global variable to store authentication state
 current_user = None
@@ -42,6 +43,48 @@ def api_auth_request(method, endpoint, headers=None, payload=None):
         return None
 
 
+def _token_data(response):
+    """
+    The dict holding the access token in a login/refresh response (`data` may be a dict or a list).
+    """
+    data = response.get("data", {})
+    if isinstance(data, list) and len(data) > 0:
+        # If data is a list, get the first item
+        return data[0] if isinstance(data[0], dict) else {}
+    elif isinstance(data, dict):
+        return data
+    return {}
+
+
+def _session_from_response(username, response, refresh_token=None):
+    """
+    Build a session from a successful login/refresh response, None if there is no token.
+    """
+    if not response or response.get("status_code") != 200:
+        return None
+    data = _token_data(response)
+    access_token = data.get("access_token")
+    if not access_token:
+        return None
+    return session.Session(
+        username=username,
+        access_token=access_token,
+        refresh_token=data.get("refresh_token") or refresh_token,
+        expires_at=session.token_expiry(access_token, data.get("expires_in")),
+    )
+
+
+def _apply_session(new_session):
+    """
+    Make the session's user and token the current authentication state.
+    """
+    global current_user, auth_token
+    current_user = new_session.username
+    auth_token = new_session.access_token
+    # Store access_token to API_TOKEN in config.py
+    config.API_TOKEN = auth_token
+
+
 def login(username, password):
     """
     Authenticate user with username and password via REST API.
@@ -60,26 +103,18 @@ def login(username, password):
         # Login successful
         current_user = username
 
-        # Handle both dict and list formats for data field
-        data = response.get("data", {})
-        if isinstance(data, list) and len(data) > 0:
-            # If data is a list, get the first item
-            auth_token = data[0].get("access_token") if data[0] and isinstance(
-                data[0], dict) else None
-        elif isinstance(data, dict):
-            # If data is a dict, get access_token directly
-            auth_token = data.get("access_token")
+        new_session = _session_from_response(username, response)
+        if new_session:
+            _apply_session(new_session)
+            # Cache the session on disk and renew it in the background before it expires
+            session.start(new_session, password=password)
         else:
             auth_token = None
 
-        # Store access_token to API_TOKEN in config.py
-        if auth_token:
-            config.API_TOKEN = auth_token
-
         logging.info(
             f"Login successful for user: {username}, token extracted: {'Yes' if auth_token else 'No'}"
         )
-        logging.debug(f"Response data structure: {type(data)} - {data}")
+        logging.debug("Response data structure: %s", type(response.get("data")))
 
         return True
     else:
@@ -91,6 +126,36 @@ def login(username, password):
         return False
 
 
+def resume_session(cached_session):
+    """
+    Continue a session cached on disk by a previous run, without logging in again.
+    """
+    _apply_session(cached_session)
+    session.start(cached_session, persist=False)
+    logging.info(f"Resumed cached session for user: {cached_session.username}")
+
+
+def renew_session(current_session, credentials=None):
+    """
+    Get a new access token for the session: from the refresh endpoint when there is a
+    refresh token, otherwise by logging in again with the credentials kept in memory.
+    Returns the renewed session, or None if it could not be renewed.
+    """
+    renewed = None
+    if current_session.refresh_token:
+        endpoint = f"{config.BASE_URL}{config.REFRESH_ENDPOINT}"
+        response = api_auth_request("POST", endpoint, payload={"refresh_token": current_session.refresh_token})
+        renewed = _session_from_response(current_session.username, response, current_session.refresh_token)
+    if renewed is None and credentials:
+        username, password = credentials
+        endpoint = f"{config.BASE_URL}{config.LOGIN_ENDPOINT}"
+        response = api_auth_request("POST", endpoint, payload={"username": username, "password": password})
+        renewed = _session_from_response(username, response)
+    if renewed is not None:
+        _apply_session(renewed)
+    return renewed
+
+
 def logout():
     """
     Logout user via REST API.
@@ -112,6 +177,7 @@ def logout():
     # Clear local authentication state regardless of API response
     current_user = None
     auth_token = None
+    session.clear()
 
     if response and response.get("status_code") == 200:
         logging.info("Logout successful")
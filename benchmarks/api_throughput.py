@@ -0,0 +1,137 @@
+"""
+Fetch and registration throughput of database.py against the local fake eWMS API.
+
+Starts a benchmarks.fake_api server, logs in, then measures fetching the active POs,
+fetching the items of each PO and registering stock records (insert_into_stocks) with
+the configured concurrency, reporting calls/s and latency percentiles per phase.
+
+Usage: python -m benchmarks.api_throughput [--tags 500] [--concurrency 4] [--latency-ms 20]
+                                           [--error-rate 0.02] [--json out.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Keep the benchmark away from the user's log, metrics and cached session
+_scratch = tempfile.mkdtemp(prefix="evo-bench-")
+os.environ.setdefault("EVO_LOG_FILE", os.path.join(_scratch, "app.log"))
+os.environ.setdefault("EVO_DATA_DIR", _scratch)
+os.environ.setdefault("EVO_SESSION_FILE", os.path.join(_scratch, "session.dat"))
+
+from benchmarks.fake_api import FakeApiServer, add_config_arguments, config_from_args
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(name, calls, concurrency=1):
+    """
+    Run the zero-argument `calls` and return the phase summary.
+    """
+    latencies = []
+    failures = 0
+
+    def timed(call):
+        start = time.perf_counter()
+        ok = call()
+        return time.perf_counter() - start, bool(ok)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for latency, ok in executor.map(timed, calls):
+            latencies.append(latency)
+            failures += not ok
+    elapsed = time.perf_counter() - start
+    return {
+        "phase": name,
+        "calls": len(latencies),
+        "failures": failures,
+        "seconds": round(elapsed, 3),
+        "calls_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fetches", type=int, default=20, help="Number of active PO list fetches")
+    parser.add_argument("--tags", type=int, default=500, help="Number of stock records to register")
+    parser.add_argument("--concurrency", type=int, default=1, help="Parallel registrations")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with FakeApiServer(config_from_args(args)) as server:
+        import config
+        config.BASE_URL = server.url
+        import auth
+        import database
+        from resilience import API_RETRIES
+
+        if not auth.login("benchmark", "benchmark"):
+            print("FAIL: could not log in to the fake API")
+            return 1
+
+        po_numbers = [po[0] for po in database.fetch_po_number()]
+        item_lists = {po_number: database.fetch_items(po_number, 1) for po_number in po_numbers}
+        server.reset_stats()
+
+        phases = [
+            measure("fetch_po_number", [lambda: database.fetch_po_number() for _ in range(args.fetches)]),
+            measure("fetch_items", [lambda po=po: database.fetch_items(po, 1) for po in po_numbers]),
+        ]
+
+        items = [(po, item) for po, po_items in item_lists.items() for item in po_items]
+        base_tag = time.strftime("%y%m%d%H%M%S")
+
+        def register(index):
+            po_number, item = items[index % len(items)]
+            return lambda: database.insert_into_stocks(
+                po_number=po_number,
+                ri_number=item["receive_item_number"],
+                item_id=item["item_id"],
+                tag_id=f"{base_tag}{index:04d}",
+                exp_date="2030-01-01",
+                inventory_id=item["inventory_id"][0],
+                warehouse_id=1,
+            )
+
+        phases.append(measure("insert_into_stocks", [register(index) for index in range(args.tags)], args.concurrency))
+        server_stats = server.stats.as_dict()
+
+    retries = API_RETRIES.total()
+    print(f"Fake API: {args.pos} POs x {args.items_per_po} items, latency {args.latency_ms:.0f}+{args.jitter_ms:.0f} ms, "
+          f"error rate {args.error_rate:.1%}, concurrency {args.concurrency}")
+    for phase in phases:
+        print(f"  {phase['phase']:<20} {phase['calls']:5d} calls  {phase['calls_per_second']:8.1f}/s  "
+              f"p50 {phase['p50_ms']:7.2f} ms  p95 {phase['p95_ms']:7.2f} ms  p99 {phase['p99_ms']:7.2f} ms  "
+              f"failures {phase['failures']}")
+    print(f"  retries {retries}, injected errors {server_stats['errors_injected']}, "
+          f"stocks created {server_stats['stocks_created']} (replayed {server_stats['stocks_replayed']})")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as result_file:
+            json.dump({
+                "fake_api": vars(config_from_args(args)),
+                "concurrency": args.concurrency,
+                "phases": phases,
+                "retries": retries,
+                "server": server_stats,
+            }, result_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,470 @@
+"""
+Local stand-in for the Odoo eWMS REST API, for load and regression testing offline.
+
+Implements the endpoints used by auth.py and database.py with the same response
+envelopes ({"status_code", "data", "message"}), over a generated dataset of
+configurable size, with configurable latency and error injection.
+
+Usage: python -m benchmarks.fake_api [--port 8765] [--pos 50] [--items-per-po 10]
+                                     [--latency-ms 40] [--jitter-ms 20] [--error-rate 0.02]
+Point the app at it with EVO_BASE_URL=http://127.0.0.1:8765
+"""
+import argparse
+import bisect
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+API_PREFIX = "/api/ewms"
+STATS_PATH = "/_fake/stats"
+TAG_ID_PATTERN = re.compile(r"^\d{16}$")
+
+UNITS = ("PCS", "BOX", "BTL", "VIAL", "PACK")
+PRODUCTS = ("Amoxicillin", "Meloxicam", "Carprofen", "Enrofloxacin", "Ivermectin", "Doxycycline",
+            "Prednisolone", "Furosemide", "Metronidazole", "Cephalexin", "Gabapentin", "Tramadol")
+FORMS = ("Tablet 50mg", "Tablet 250mg", "Injection 100ml", "Oral Suspension 60ml", "Capsule 500mg", "Spray 30ml")
+
+
+@dataclass
+class FakeApiConfig:
+    """
+    Dataset size, latency and error injection of the fake server.
+    """
+    pos: int = 50  # active purchase orders
+    items_per_po: int = 10
+    inventory_ids_per_item: int = 3
+    warehouses: int = 3
+    latency_ms: float = 0.0  # added to every request
+    jitter_ms: float = 0.0  # uniform random extra latency
+    error_rate: float = 0.0  # share of requests answered with one of error_statuses
+    error_statuses: tuple = (500, 502, 503)
+    hang_rate: float = 0.0  # share of requests that stall for hang_seconds (client timeouts)
+    hang_seconds: float = 15.0
+    token_ttl: float = 3600.0  # seconds, reported as expires_in on login
+    tag_reservations: bool = True  # serve stocks/reserve (False: behave like a backend without it)
+    po_paging: bool = True  # page and prefix-filter the active POs (False: always send the whole list)
+    reservation_ttl: float = 900.0  # seconds a reserved tag ID is held for its run
+    username: Optional[str] = None  # accept any credentials unless set
+    password: Optional[str] = None
+    seed: int = 1
+
+
+def inventory_id(rng):
+    """
+    Random inventory ID in the NN-C-N-NC format the app validates.
+    """
+    return f"{rng.randint(1, 40):02d}-{rng.choice('ABCDEFGH')}-{rng.randint(1, 9)}-{rng.randint(1, 9)}{rng.choice('ABCD')}"
+
+
+def build_dataset(config):
+    """
+    Deterministic POs, items and warehouses for the configured size.
+    """
+    rng = random.Random(config.seed)
+    warehouses = [{"id": index, "name": f"Warehouse {index}"} for index in range(1, config.warehouses + 1)]
+    purchase_orders = {}
+    item_id = 1000
+    for po_index in range(1, config.pos + 1):
+        po_number = f"P{25000 + po_index:05d}"
+        items = []
+        for item_index in range(1, config.items_per_po + 1):
+            item_id += 1
+            items.append({
+                "item_id": item_id,
+                "sku": f"SKU-{item_id:06d}",
+                "name": f"{rng.choice(PRODUCTS)} {rng.choice(FORMS)}",
+                "unit_name": rng.choice(UNITS),
+                "quantity": rng.randint(1, 200),
+                "receive_item_number": f"WH/IN/{po_index:05d}/{item_index:03d}",
+                "inventory_id": sorted({inventory_id(rng) for _ in range(config.inventory_ids_per_item)}),
+            })
+        purchase_orders[po_number] = items
+    return warehouses, purchase_orders
+
+
+@dataclass
+class FakeApiStats:
+    """
+    Request counters of the fake server, by "METHOD path".
+    """
+    requests: dict = field(default_factory=dict)
+    errors_injected: int = 0
+    bytes_received: int = 0
+    bytes_sent: int = 0
+    stocks_created: int = 0
+    stocks_replayed: int = 0
+    tags_reserved: int = 0
+    tags_rejected: int = 0
+
+    def as_dict(self):
+        return {
+            "requests": dict(self.requests),
+            "errors_injected": self.errors_injected,
+            "bytes_received": self.bytes_received,
+            "bytes_sent": self.bytes_sent,
+            "stocks_created": self.stocks_created,
+            "stocks_replayed": self.stocks_replayed,
+            "tags_reserved": self.tags_reserved,
+            "tags_rejected": self.tags_rejected,
+        }
+
+
+class FakeApiServer:
+    """
+    The fake eWMS API served from a daemon thread. Use as a context manager or call
+    start()/stop(); `url` is the base URL to put in config.BASE_URL.
+    """
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or FakeApiConfig()
+        self.warehouses, self.purchase_orders = build_dataset(self.config)
+        # Active PO numbers sorted case-insensitively, for prefix searches
+        self._po_index = sorted(self.purchase_orders, key=str.casefold)
+        self._po_keys = [po_number.casefold() for po_number in self._po_index]
+        self.stocks = {}  # tag_id -> payload
+        self.reservations = {}  # reservation_id -> response data, replayed on a retry
+        self.reserved_tags = {}  # tag_id -> (reservation_id, item_id, expires_at)
+        self._next_serial = 1  # server-allocated tag IDs
+        self.tokens = {}  # access token -> expiry (epoch seconds)
+        self.refresh_tokens = {}  # refresh token -> username
+        self.stats = FakeApiStats()
+        self.lock = threading.Lock()
+        self.rng = random.Random(self.config.seed)
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = FakeApiStats()
+
+    # Request handling, called from the handler threads
+
+    def _issue_token(self, username):
+        access_token = uuid.uuid4().hex
+        refresh_token = uuid.uuid4().hex
+        with self.lock:
+            self.tokens[access_token] = time.time() + self.config.token_ttl
+            self.refresh_tokens[refresh_token] = username
+        return {"access_token": access_token, "refresh_token": refresh_token, "expires_in": self.config.token_ttl}
+
+    def _authorized(self, headers):
+        token = (headers.get("Authorization") or "").replace("Bearer ", "", 1).strip()
+        with self.lock:
+            expires_at = self.tokens.get(token)
+        return expires_at is not None and expires_at > time.time()
+
+    def revoke_tokens(self):
+        """
+        Invalidate every issued access token (to test 401 handling).
+        """
+        with self.lock:
+            self.tokens.clear()
+
+    def handle(self, method, path, query, headers, body):
+        """
+        Return (http_status, envelope) for a request.
+        """
+        if method == "POST" and path == f"{API_PREFIX}/login":
+            username, password = body.get("username"), body.get("password")
+            if not username or not password or (
+                self.config.username is not None and (username, password) != (self.config.username, self.config.password)
+            ):
+                return 401, _envelope(401, message="Invalid username or password.")
+            return 200, _envelope(200, [self._issue_token(username)], "Login successful")
+
+        if method == "POST" and path == f"{API_PREFIX}/refresh":
+            with self.lock:
+                username = self.refresh_tokens.pop(body.get("refresh_token"), None)
+            if username is None:
+                return 401, _envelope(401, message="Invalid refresh token.")
+            return 200, _envelope(200, [self._issue_token(username)], "Token refreshed")
+
+        if method == "POST" and path == f"{API_PREFIX}/logout":
+            token = (headers.get("Authorization") or "").replace("Bearer ", "", 1).strip()
+            with self.lock:
+                self.tokens.pop(token, None)
+            return 200, _envelope(200, message="Logout successful")
+
+        if not self._authorized(headers):
+            return 401, _envelope(401, message="Unauthorized: invalid or expired token.")
+
+        if method == "GET" and path == f"{API_PREFIX}/odoo/purchase-orders/active":
+            if self.config.po_paging and ("page" in query or "page_size" in query):
+                return self._po_page(query)
+            data = [{"purchase_order_number": po_number} for po_number in self.purchase_orders]
+            return 200, _envelope(200, data)
+
+        if method == "GET" and path == f"{API_PREFIX}/odoo/purchase-orders/items":
+            items = self.purchase_orders.get(query.get("po_number"))
+            if items is None:
+                return 404, _envelope(404, [], "Purchase order not found.")
+            return 200, _envelope(200, items)
+
+        if method == "POST" and path == f"{API_PREFIX}/odoo/stocks/create":
+            return self._create_stock(body)
+
+        if method == "POST" and path == f"{API_PREFIX}/odoo/stocks/reserve" and self.config.tag_reservations:
+            return self._reserve_tags(body)
+
+        if method == "GET" and path == f"{API_PREFIX}/accurate/warehouses":
+            return 200, _envelope(200, self.warehouses)
+
+        return 404, _envelope(404, message=f"No route for {method} {path}")
+
+    def _po_page(self, query):
+        """
+        One page of the active POs whose number starts with the `search` prefix (case-insensitive).
+        """
+        try:
+            page = int(query.get("page", 1))
+            page_size = int(query.get("page_size", 50))
+        except ValueError:
+            return 400, _envelope(400, message="page and page_size must be integers.")
+        if page < 1 or not 1 <= page_size <= 1000:
+            return 400, _envelope(400, message="page must be >= 1 and page_size between 1 and 1000.")
+        prefix = query.get("search", "").casefold()
+        first = bisect.bisect_left(self._po_keys, prefix)
+        last = bisect.bisect_left(self._po_keys, prefix + "\U0010ffff") if prefix else len(self._po_keys)
+        start = first + (page - 1) * page_size
+        end = min(start + page_size, last)
+        data = [{"purchase_order_number": po_number} for po_number in self._po_index[start:end]]
+        envelope = _envelope(200, data)
+        envelope.update(page=page, page_size=page_size, total=last - first, has_more=end < last)
+        return 200, envelope
+
+    def _create_stock(self, payload):
+        required = ("purchase_order_number", "receive_item_number", "item_id", "tag_id", "exp_date", "inventory_id")
+        missing = [name for name in required if not payload.get(name)]
+        if missing:
+            return 400, _envelope(400, message=f"Missing fields: {', '.join(missing)}")
+        if payload["purchase_order_number"] not in self.purchase_orders:
+            return 404, _envelope(404, message="Purchase order not found.")
+        with self.lock:
+            existing = self.stocks.get(payload["tag_id"])
+            if existing is not None and existing != payload:
+                return 409, _envelope(409, message=f"Tag {payload['tag_id']} is already registered.")
+            reserved = self._reservation_of(payload["tag_id"])
+            if reserved is not None and reserved[1] != payload["item_id"]:
+                return 409, _envelope(409, message=f"Tag {payload['tag_id']} is reserved for another item.")
+            if existing is None:
+                self.stocks[payload["tag_id"]] = payload
+                self.stats.stocks_created += 1
+            else:
+                self.stats.stocks_replayed += 1  # Same payload again: idempotent replay
+        return 201, _envelope(201, [{"tag_id": payload["tag_id"]}], "Stock created")
+
+    def _reservation_of(self, tag_id):
+        reserved = self.reserved_tags.get(tag_id)
+        if reserved is not None and reserved[2] < time.time():
+            del self.reserved_tags[tag_id]
+            return None
+        return reserved
+
+    def _reserve_tags(self, payload):
+        """
+        Reserve tag IDs for a print run: validate the given `tag_ids`, or allocate `count`
+        new ones. A retry with the same reservation_id gets the same answer.
+        """
+        reservation_id = payload.get("reservation_id")
+        item_id = payload.get("item_id")
+        if not reservation_id or not item_id:
+            return 400, _envelope(400, message="Missing fields: reservation_id, item_id")
+        expires_at = time.time() + self.config.reservation_ttl
+        renewable = set(payload.get("renew") or ())  # earlier reservations of the same (resumed) run
+        with self.lock:
+            replay = self.reservations.get(reservation_id)
+            if replay is not None:
+                return 200, _envelope(200, replay, "Tags reserved")
+
+            accepted, rejected = [], []
+            if payload.get("tag_ids") is not None:
+                for tag_id in payload["tag_ids"]:
+                    tag_id = str(tag_id)
+                    if not TAG_ID_PATTERN.match(tag_id):
+                        rejected.append({"tag_id": tag_id, "reason": "invalid format"})
+                    elif tag_id in self.stocks:
+                        rejected.append({"tag_id": tag_id, "reason": "already registered"})
+                    elif tag_id in accepted or (
+                        self._reservation_of(tag_id) is not None and self.reserved_tags[tag_id][0] not in renewable
+                    ):
+                        rejected.append({"tag_id": tag_id, "reason": "reserved by another run"})
+                    else:
+                        accepted.append(tag_id)
+            else:
+                count = int(payload.get("count") or 0)
+                if not 0 < count <= 10000:
+                    return 400, _envelope(400, message="count must be between 1 and 10000")
+                prefix = time.strftime("%y%m%d")
+                while len(accepted) < count:
+                    tag_id = f"{prefix}{self._next_serial:010d}"
+                    self._next_serial += 1
+                    if tag_id not in self.stocks and self._reservation_of(tag_id) is None:
+                        accepted.append(tag_id)
+
+            for tag_id in accepted:
+                self.reserved_tags[tag_id] = (reservation_id, item_id, expires_at)
+            data = {
+                "reservation_id": reservation_id,
+                "tag_ids": accepted,
+                "rejected": rejected,
+                "expires_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(expires_at)),
+            }
+            self.reservations[reservation_id] = data
+            self.stats.tags_reserved += len(accepted)
+            self.stats.tags_rejected += len(rejected)
+        return 200, _envelope(200, data, "Tags reserved")
+
+
+def _envelope(status_code, data=None, message=""):
+    return {"status_code": status_code, "data": data if data is not None else [], "message": message}
+
+
+def _make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _dispatch(self, method):
+            parts = urlsplit(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            config = server.config
+
+            with server.lock:
+                key = f"{method} {parts.path}"
+                server.stats.requests[key] = server.stats.requests.get(key, 0) + 1
+                server.stats.bytes_received += len(raw)
+                roll = server.rng.random()
+                error_status = server.rng.choice(config.error_statuses) if config.error_statuses else 500
+                delay = (config.latency_ms + server.rng.uniform(0, config.jitter_ms)) / 1000.0
+
+            if parts.path == STATS_PATH:
+                with server.lock:
+                    stats = server.stats.as_dict()
+                return self._send(200, stats)
+
+            if delay:
+                time.sleep(delay)
+            if roll < config.hang_rate:
+                time.sleep(config.hang_seconds)
+            elif roll < config.hang_rate + config.error_rate:
+                with server.lock:
+                    server.stats.errors_injected += 1
+                return self._send(error_status, _envelope(error_status, message="Injected error"))
+
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                return self._send(400, _envelope(400, message="Invalid JSON body."))
+            query = {name: values[0] for name, values in parse_qs(parts.query).items()}
+            status, envelope = server.handle(method, parts.path, query, self.headers, body if isinstance(body, dict) else {})
+            self._send(status, envelope)
+
+        def _send(self, status, envelope):
+            payload = json.dumps(envelope).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            with server.lock:
+                server.stats.bytes_sent += len(payload)
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def config_from_args(args):
+    return FakeApiConfig(
+        pos=args.pos,
+        items_per_po=args.items_per_po,
+        inventory_ids_per_item=args.inventory_ids,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_statuses=tuple(args.error_statuses),
+        hang_rate=args.hang_rate,
+        token_ttl=args.token_ttl,
+        tag_reservations=args.tag_reservations,
+        po_paging=args.po_paging,
+        seed=args.seed,
+    )
+
+
+def add_config_arguments(parser):
+    """
+    Command line options for FakeApiConfig, shared with the benchmarks that start a fake server.
+    """
+    parser.add_argument("--pos", type=int, default=50, help="Number of active purchase orders")
+    parser.add_argument("--items-per-po", type=int, default=10, help="Items per purchase order")
+    parser.add_argument("--inventory-ids", type=int, default=3, help="Registered inventory IDs per item")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency (uniform)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with an injected error")
+    parser.add_argument("--error-statuses", type=int, nargs="+", default=[500, 502, 503], help="Statuses used for injected errors")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Share of requests that stall past the client timeout")
+    parser.add_argument("--token-ttl", type=float, default=3600.0, help="Access token lifetime in seconds")
+    parser.add_argument("--no-tag-reservations", dest="tag_reservations", action="store_false",
+                        help="Answer stocks/reserve with 404, like a backend without tag reservations")
+    parser.add_argument("--no-po-paging", dest="po_paging", action="store_false",
+                        help="Ignore page/search on the active POs and send the whole list, like an older backend")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the generated dataset and injected errors")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = FakeApiServer(config_from_args(args), host=args.host, port=args.port)
+    print(f"Fake eWMS API on {server.url} ({args.pos} POs x {args.items_per_po} items); "
+          f"run the app with EVO_BASE_URL={server.url}. Ctrl+C to stop.")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(server.stats.as_dict(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,135 @@
+"""
+Memory and build time of the items of a large PO: the former list of 7-key dicts
+against the compact model of items.py (slotted Items decoded straight from the JSON).
+
+Decodes one fetch_items response of --items lines (from the fake API dataset, with
+unique item names as on a real PO) both ways and reports the memory retained by the
+result (tracemalloc), the peak while decoding, the decode time and the time the item
+screen spends on it (combobox names, and --selections item lookups by name).
+
+Usage: python -m benchmarks.item_memory [--items 5000] [--inventory-ids 20] [--selections 100]
+                                         [--repeat 5] [--json out.json]
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from benchmarks.fake_api import FakeApiConfig, build_dataset
+from items import Item, ItemTable, item_pairs_hook
+
+
+def legacy_items(body):
+    """
+    The items as fetch_items built them before items.py: a dict per item.
+    """
+    data = json.loads(body)
+    return [
+        {
+            "item_id": item["item_id"],
+            "sku": item["sku"],
+            "item_name": item["name"],
+            "unit_name": item["unit_name"],
+            "quantity": item["quantity"],
+            "receive_item_number": item["receive_item_number"],
+            "inventory_id": item.get("inventory_id"),
+        }
+        for item in data["data"]
+    ]
+
+
+def legacy_screen(items, selections):
+    names = [item["item_name"] for item in items]
+    for name in selections:
+        next((item for item in items if item["item_name"] == name), None)
+    return names
+
+
+def compact_items(body):
+    data = json.loads(body, object_pairs_hook=item_pairs_hook)
+    return ItemTable(item for item in data["data"] if isinstance(item, Item))
+
+
+def compact_screen(items, selections):
+    for name in selections:
+        items.find_by_name(name)
+    return items.names
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return round(min(times) * 1000, 2)
+
+
+def measure(decode, screen, body, selections, repeat):
+    """
+    Memory retained by the decoded items (and their screen data) and the best times over `repeat` runs.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = decode(body)
+    names = screen(items, selections[:1])
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del names
+    return {
+        "retained_kib": round((retained - before) / 1024, 1),
+        "peak_kib": round((peak - before) / 1024, 1),
+        "decode_ms": best_time(lambda: decode(body), repeat),
+        "screen_ms": best_time(lambda: screen(items, selections), repeat),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=5000, help="Lines of the PO")
+    parser.add_argument("--inventory-ids", type=int, default=20, help="Inventory IDs per item")
+    parser.add_argument("--selections", type=int, default=100, help="Items selected on the item screen")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per model (the best is reported)")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    _, purchase_orders = build_dataset(FakeApiConfig(pos=1, items_per_po=args.items,
+                                                     inventory_ids_per_item=args.inventory_ids))
+    lines = next(iter(purchase_orders.values()))
+    for index, line in enumerate(lines):
+        line["name"] = f"{line['name']} #{index}"
+    body = json.dumps({"status_code": 200, "message": "OK", "data": lines})
+    # Selections spread over the whole list
+    step = max(1, len(lines) // max(1, args.selections))
+    selections = [line["name"] for line in lines[::step]][:args.selections]
+
+    results = {
+        "items": args.items,
+        "inventory_ids_per_item": args.inventory_ids,
+        "response_kib": round(len(body) / 1024, 1),
+        "dicts": measure(legacy_items, legacy_screen, body, selections, args.repeat),
+        "compact": measure(compact_items, compact_screen, body, selections, args.repeat),
+    }
+    print(f"Items of a {args.items}-line PO ({args.inventory_ids} inventory IDs each, "
+          f"{results['response_kib']} KiB response):")
+    for model in ("dicts", "compact"):
+        result = results[model]
+        print(f"  {model:<8} retained {result['retained_kib']:9.1f} KiB  peak {result['peak_kib']:9.1f} KiB  "
+              f"decode {result['decode_ms']:8.2f} ms  screen {result['screen_ms']:8.2f} ms")
+    dicts, compact = results["dicts"], results["compact"]
+    if dicts["retained_kib"] and dicts["decode_ms"] and dicts["screen_ms"]:
+        print(f"  compact vs dicts: memory {compact['retained_kib'] / dicts['retained_kib'] - 1:+.1%}, "
+              f"decode {compact['decode_ms'] / dicts['decode_ms'] - 1:+.1%}, "
+              f"screen {compact['screen_ms'] / dicts['screen_ms'] - 1:+.1%}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as result_file:
+            json.dump(results, result_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+End-to-end throughput of the label printing pipeline (label_pipeline.run_label_job).
+
+Runs the same render -> spool -> wait -> register loop as the Print button, without a
+GUI, against the emulated Zebra printer and the local fake eWMS API. Scenarios: one
+run per --labels count on a single item, plus a run spread over --items items.
+Reports labels/s, per-label latency percentiles (wall time from the start of a label
+until its stock record is registered), API calls per label and bytes sent to the
+printer; --json saves the results and --baseline compares against a saved run.
+
+Usage: python -m benchmarks.label_pipeline [--labels 1 100 999] [--items 4 --labels-per-item 50]
+                                           [--labels-per-second 0] [--latency-ms 20]
+                                           [--print-mode label|serialized]
+                                           [--json out.json] [--baseline previous.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+# Keep the benchmark away from the user's log, metrics, run summaries and cached session
+_scratch = tempfile.mkdtemp(prefix="evo-bench-")
+os.environ.setdefault("EVO_LOG_FILE", os.path.join(_scratch, "app.log"))
+os.environ.setdefault("EVO_DATA_DIR", _scratch)
+os.environ.setdefault("EVO_SESSION_FILE", os.path.join(_scratch, "session.dat"))
+os.environ["EVO_PRINTER_BACKEND"] = "emulator"
+
+from benchmarks.api_throughput import percentile
+from benchmarks.fake_api import FakeApiServer, add_config_arguments, config_from_args
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class TagIds:
+    """
+    Unique tag IDs across all scenarios, in the format of generate_tag_ids.
+    """
+
+    def __init__(self):
+        self.base = time.strftime("%y%m%d%H%M%S")
+        self.next = 0
+
+    def take(self, amount):
+        ids = [f"{self.base}{index:04d}" for index in range(self.next, self.next + amount)]
+        self.next += amount
+        return ids
+
+
+def run_scenario(name, jobs, server, emulator, tag_ids):
+    """
+    Run the (item, amount) `jobs` of a scenario one after the other and summarise them.
+    """
+    from label_pipeline import LabelJob, run_label_job
+
+    server.reset_stats()
+    emulator.reset_stats()
+    latencies = []
+    labels = 0
+    failures = []
+    start = time.perf_counter()
+    for po_number, item, amount in jobs:
+        job = LabelJob(
+            po_number=po_number,
+            item=item,
+            inventory_id=item["inventory_id"][0],
+            exp_date=date(2030, 1, 1),
+            amount=amount,
+            warehouse_id=1,
+        )
+        result = run_label_job(job, tag_ids=tag_ids.take(amount))
+        latencies.extend(result.stats.label_latencies)
+        labels += len(result.printed_tags)
+        if not result.ok:
+            failures.append({"status": result.status, "tag_id": result.failed_tag, "message": result.error_message})
+    elapsed = time.perf_counter() - start
+    server_stats = server.stats.as_dict()
+    api_calls = sum(server_stats["requests"].values())
+    return {
+        "scenario": name,
+        "items": len(jobs),
+        "requested": sum(amount for _, _, amount in jobs),
+        "labels": labels,
+        "failures": failures,
+        "seconds": round(elapsed, 3),
+        "labels_per_second": round(labels / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "api_calls": api_calls,
+        "api_calls_per_label": round(api_calls / labels, 3) if labels else None,
+        "api_requests": server_stats["requests"],
+        "printer_bytes": emulator.bytes_received,
+        "printer_bytes_per_label": round(emulator.bytes_received / labels, 1) if labels else None,
+        "labels_printed": emulator.labels_printed,
+        "labels_voided": emulator.labels_voided,
+    }
+
+
+def compare(results, baseline_path):
+    """
+    Print the change of throughput and p95 latency against a saved run.
+    """
+    with open(baseline_path, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    previous = {scenario["scenario"]: scenario for scenario in baseline.get("scenarios", [])}
+    print(f"Compared with {baseline_path} (revision {baseline.get('revision') or '?'}):")
+    for scenario in results:
+        before = previous.get(scenario["scenario"])
+        if not before or not before.get("labels_per_second") or not before.get("p95_ms"):
+            print(f"  {scenario['scenario']:<16} no baseline")
+            continue
+        throughput = scenario["labels_per_second"] / before["labels_per_second"] - 1
+        p95 = scenario["p95_ms"] / before["p95_ms"] - 1
+        print(f"  {scenario['scenario']:<16} labels/s {throughput:+7.1%}  p95 {p95:+7.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--labels", type=int, nargs="+", default=[1, 100, 999], help="Single-item run sizes")
+    parser.add_argument("--items", type=int, default=4, help="Items in the multi-item run (0 to skip it)")
+    parser.add_argument("--labels-per-item", type=int, default=50, help="Labels per item in the multi-item run")
+    parser.add_argument("--labels-per-second", type=float, default=0.0,
+                        help="Emulated print speed, 0 for no feed delay (measures the host side only)")
+    parser.add_argument("--rfid-error-rate", type=float, default=0.0, help="Emulated RFID encode failure rate")
+    parser.add_argument("--print-mode", choices=("label", "serialized"), default="label",
+                        help="One print job per label, or one serialized job per run of consecutive tag IDs")
+    parser.add_argument("--poll-interval", type=float, default=None, help="Print job status poll interval in seconds")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with the results of a previous --json run")
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with FakeApiServer(config_from_args(args)) as server:
+        import config
+        config.BASE_URL = server.url
+        import auth
+        import database
+        import printer
+        import print_stats
+        from printer_emulator import EmulatedPrinter, set_emulator
+
+        print_stats.RUN_SUMMARY_FILE = os.path.join(_scratch, "print_runs.jsonl")
+        config.PRINT_MODE = args.print_mode
+        if args.poll_interval is not None:
+            printer.EMULATOR_POLL_INTERVAL = args.poll_interval
+        emulator = EmulatedPrinter(labels_per_second=args.labels_per_second, rfid_error_rate=args.rfid_error_rate,
+                                   seed=args.seed)
+        set_emulator(emulator)
+        printer.printer_name = emulator.name
+
+        if not auth.login("benchmark", "benchmark"):
+            print("FAIL: could not log in to the fake API")
+            return 1
+        po_number = database.fetch_po_number()[0][0]
+        items = database.fetch_items(po_number, 1)
+        if len(items) < max(1, args.items):
+            print(f"FAIL: {po_number} has {len(items)} items, {args.items} needed (raise --items-per-po)")
+            return 1
+
+        tag_ids = TagIds()
+        scenarios = [(f"{amount}_labels", [(po_number, items[0], amount)]) for amount in args.labels]
+        if args.items:
+            scenarios.append((f"{args.items}x{args.labels_per_item}_items",
+                              [(po_number, item, args.labels_per_item) for item in items[:args.items]]))
+        results = [run_scenario(name, jobs, server, emulator, tag_ids) for name, jobs in scenarios]
+
+    print(f"Label pipeline ({args.print_mode} mode): emulator {args.labels_per_second:g} labels/s, RFID error rate {args.rfid_error_rate:.1%}, "
+          f"API latency {args.latency_ms:.0f}+{args.jitter_ms:.0f} ms, error rate {args.error_rate:.1%}")
+    for result in results:
+        print(f"  {result['scenario']:<16} {result['labels']:5d}/{result['requested']:<5d} labels  "
+              f"{result['labels_per_second']:8.2f}/s  p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+              f"p99 {result['p99_ms']:7.2f} ms  API {result['api_calls_per_label']}/label  "
+              f"printer {result['printer_bytes_per_label']} B/label")
+        for failure in result["failures"]:
+            print(f"    {failure['status']}: {failure['message']}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as result_file:
+            json.dump({
+                "benchmark": "label_pipeline",
+                "revision": git_revision(),
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "print_mode": args.print_mode,
+                "emulator": {"labels_per_second": args.labels_per_second, "rfid_error_rate": args.rfid_error_rate},
+                "fake_api": vars(config_from_args(args)),
+                "scenarios": results,
+            }, result_file, indent=2)
+    return 0 if all(not result["failures"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Time to first row, total time and peak memory of fetching a large active-PO list:
+the whole response parsed with response.json() against the streaming parser
+(database.stream_po_numbers, json_stream.py).
+
+The fake API runs in a child process so its own allocations don't count; memory is
+the tracemalloc peak of this process while fetching. Run with a few list sizes to see
+the buffered peak grow with the response while the streamed one stays flat.
+
+Usage: python -m benchmarks.po_stream [--pos 1000 100000 300000] [--json out.json]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Keep the benchmark away from the user's log, metrics and cached session
+_scratch = tempfile.mkdtemp(prefix="evo-bench-")
+os.environ.setdefault("EVO_LOG_FILE", os.path.join(_scratch, "app.log"))
+os.environ.setdefault("EVO_DATA_DIR", _scratch)
+os.environ.setdefault("EVO_SESSION_FILE", os.path.join(_scratch, "session.dat"))
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ACTIVE_POS_ENDPOINT = "/api/ewms/odoo/purchase-orders/active"
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_fake_api(pos):
+    """
+    Start the fake API with `pos` POs in a child process and return (process, base URL).
+    """
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_api", "--port", str(port), "--pos", str(pos),
+         "--items-per-po", "1", "--inventory-ids", "1"],
+        cwd=PROJECT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("the fake API did not start")
+
+
+def buffered_fetch(on_row):
+    """
+    The former fetch_po_number: the whole response parsed before the first row.
+    """
+    from database import api_call
+    data = api_call("GET", ACTIVE_POS_ENDPOINT).data
+    for po in data["data"]:
+        on_row((po["purchase_order_number"],))
+
+
+def streamed_fetch(on_row):
+    from database import stream_po_numbers
+    for po in stream_po_numbers():
+        on_row(po)
+
+
+def measure(fetch):
+    rows = []
+    first_row = []
+    start = time.perf_counter()
+
+    def on_row(row):
+        if not first_row:
+            first_row.append(time.perf_counter() - start)
+        rows.append(row)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    fetch(on_row)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    total = time.perf_counter() - start
+    return {
+        "rows": len(rows),
+        "first_row_ms": round(first_row[0] * 1000, 2) if first_row else None,
+        "total_ms": round(total * 1000, 2),
+        "peak_kib": round(peak / 1024, 1),
+        # The rows themselves are kept by both; the rest is parsing overhead
+        "rows_kib": round(sum(sys.getsizeof(row) + sys.getsizeof(row[0]) for row in rows) / 1024, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pos", type=int, nargs="+", default=[1000, 100000, 300000], help="Active PO list sizes")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    import auth
+    import config
+
+    results = []
+    for pos in args.pos:
+        process, url = start_fake_api(pos)
+        try:
+            config.BASE_URL = url
+            if not auth.login("benchmark", "benchmark"):
+                print("FAIL: could not log in to the fake API")
+                return 1
+            results.append({"pos": pos, "buffered": measure(buffered_fetch), "streamed": measure(streamed_fetch)})
+        finally:
+            process.terminate()
+            process.wait()
+
+    print("Active PO list: buffered response.json() against the streaming parser")
+    for result in results:
+        for mode in ("buffered", "streamed"):
+            row = result[mode]
+            print(f"  {result['pos']:>7} POs  {mode:<8}  first row {row['first_row_ms']:9.2f} ms  "
+                  f"total {row['total_ms']:9.2f} ms  peak {row['peak_kib']:10.1f} KiB  (rows {row['rows_kib']:.1f} KiB)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as result_file:
+            json.dump(results, result_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
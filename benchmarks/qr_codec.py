@@ -0,0 +1,86 @@
+"""
+Throughput of the native QR code of zpl.py on tag IDs: encoding (uncached and cached),
+rendering at ^BQN,2,2, decoding the rendered image back, and whole local label previews
+(zpl.render_zpl_preview_local), with every decoded value checked against its tag ID.
+No network is used.
+
+Usage: python -m benchmarks.qr_codec [--tags 2000] [--labels 200] [--json out.json]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+import zpl
+from items import Item
+from label_pipeline import generate_label_zpl
+
+
+def tag_ids(count, seed=1):
+    """
+    `count` distinct tag IDs in the app's format (YYMMDDHHMMSS + a 4-digit index).
+    """
+    rng = random.Random(seed)
+    ids = set()
+    while len(ids) < count:
+        ids.add(f"{rng.randint(240101, 261231):06d}{rng.randint(0, 235959):06d}{rng.randint(0, 9999):04d}")
+    return sorted(ids)
+
+
+def rate(count, seconds):
+    return round(count / seconds, 1) if seconds else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tags", type=int, default=2000, help="Tag IDs encoded, rendered and decoded")
+    parser.add_argument("--labels", type=int, default=200, help="Whole label previews rendered")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    ids = tag_ids(args.tags)
+    zpl.qr_matrix.cache_clear()
+    results = {"tags": len(ids)}
+
+    start = time.perf_counter()
+    for tag_id in ids:
+        zpl.qr_matrix(tag_id)
+    results["encode_per_s"] = rate(len(ids), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for tag_id in ids:
+        zpl.qr_matrix(tag_id)
+    results["cached_encode_per_s"] = rate(len(ids), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    images = [zpl.render_qr(tag_id) for tag_id in ids]
+    results["render_per_s"] = rate(len(ids), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    mismatches = sum(zpl.decode_qr_image(image) != tag_id for image, tag_id in zip(images, ids))
+    results["decode_per_s"] = rate(len(ids), time.perf_counter() - start)
+
+    item = Item(1001, "SKU-001001", "Amoxicillin Oral Suspension 60ml", "BTL", 10, "WH/IN/00001/001", ("02-C-4-1A",))
+    start = time.perf_counter()
+    for tag_id in ids[:args.labels]:
+        label = zpl.render_zpl_preview_local(generate_label_zpl(item, tag_id, "02-C-4-1A", "19 Oct 2026"))
+        # The QR code sits at ^FO32,93 in the template, 2 dots per module
+        side = len(zpl.qr_matrix(tag_id)) * 2
+        mismatches += zpl.decode_qr_image(label.crop((32, 93, 32 + side, 93 + side))) != tag_id
+    results["label_previews"] = min(args.labels, len(ids))
+    results["label_preview_per_s"] = rate(results["label_previews"], time.perf_counter() - start)
+    results["mismatches"] = mismatches
+
+    print(f"Native QR code, {len(ids)} tag IDs (no network):")
+    for name in ("encode_per_s", "cached_encode_per_s", "render_per_s", "decode_per_s", "label_preview_per_s"):
+        print(f"  {name:<20} {results[name]:>12}")
+    print(f"  mismatches           {mismatches:>12}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as result_file:
+            json.dump(results, result_file, indent=2)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Import-time profile of the startup path (everything needed to show the login window).
+
+Runs `python -X importtime` in a fresh interpreter, reports the slowest imports and
+fails when the startup path exceeds its time budget or pulls in a module that
+should only load in the background.
+
+Usage: python -m benchmarks.startup_imports [--budget-ms 80] [--runs 5] [--json out.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Module imported to show the login window
+STARTUP_MODULE = "ui.login_interface"
+
+# Modules that must not be imported before the login window appears
+FORBIDDEN_MODULES = (
+    "requests",
+    "urllib3",
+    "PIL",
+    "tkcalendar",
+    "win32print",
+    "wmi",
+    "printer",
+    "database",
+    "ui.main_interface",
+    "ui.ui_item_selection",
+)
+
+DEFAULT_BUDGET_MS = 80.0
+
+
+def profile_once(module=STARTUP_MODULE):
+    """
+    Import `module` in a fresh interpreter and return (total_ms, per-module cumulative ms, loaded modules).
+    """
+    probe = (
+        "import sys, json; "
+        f"import {module}; "
+        "print(json.dumps(sorted(sys.modules)))"
+    )
+    env = dict(os.environ, EVO_LOG_FILE=os.devnull)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=PROJECT_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    # Each line is "import time: self | cumulative | <indent>name"; nested imports are
+    # listed before their parent with a deeper indent.
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative_us, raw_name = line[len("import time:"):].split("|")
+        if not cumulative_us.strip().isdigit():
+            continue  # Header line
+        name = raw_name.rstrip()
+        depth = len(name) - len(name.lstrip())
+        entries.append((name.strip(), depth, int(cumulative_us) / 1000.0))
+
+    # Keep only the subtree of the startup module (skips site/.pth imports)
+    cumulative = {}
+    top_level = min((depth for _, depth, _ in entries), default=0)
+    for index, (name, depth, ms) in enumerate(entries):
+        if name == module and depth == top_level:
+            cumulative[name] = ms
+            for child_name, child_depth, child_ms in reversed(entries[:index]):
+                if child_depth <= depth:
+                    break
+                cumulative[child_name] = child_ms
+            break
+    loaded = json.loads(completed.stdout.strip().splitlines()[-1])
+    return cumulative.get(module, 0.0), cumulative, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Max median import time of the startup path")
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters to sample")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    totals = []
+    cumulative = loaded = None
+    for _ in range(args.runs):
+        total, cumulative, loaded = profile_once()
+        totals.append(total)
+
+    median = statistics.median(totals)
+    forbidden = [name for name in FORBIDDEN_MODULES if name in loaded]
+    slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    print(f"Startup import of {STARTUP_MODULE}: median {median:.1f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    for name, ms in slowest:
+        print(f"  {ms:8.1f} ms  {name}")
+    if forbidden:
+        print(f"Modules loaded too early: {', '.join(forbidden)}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as result_file:
+            json.dump({
+                "module": STARTUP_MODULE,
+                "median_ms": round(median, 2),
+                "runs_ms": [round(total, 2) for total in totals],
+                "budget_ms": args.budget_ms,
+                "forbidden_loaded": forbidden,
+                "slowest": [{"module": name, "cumulative_ms": ms} for name, ms in slowest],
+            }, result_file, indent=2)
+
+    if forbidden or median > args.budget_ms:
+        print("FAIL: startup import regression")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
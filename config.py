@@ -1,18 +1,78 @@
-import tkinter as tk, base64, logging
+import tkinter as tk, base64, logging, os
 from io import BytesIO
-from PIL import Image, ImageTk
 
 # Global variable to store the last selected expiration date & printer_name
 last_exp_date = None
 printer_name = None
 
 # Base URL & API TOKEN for MVDEV - dev & staging
-BASE_URL = "https://mvdev.evosmartlife.net"
+BASE_URL = os.environ.get("EVO_BASE_URL", "https://mvdev.evosmartlife.net")  # e.g. a local benchmarks.fake_api server
 API_TOKEN = None
 
+# Printer backend: "system" (Windows print spooler, log-only simulation elsewhere),
+# "network" (raw ZPL to the Zebra at PRINTER_HOST, reading its RFID encode results back,
+# see printer_network.py) or "emulator" (the emulated Zebra printer in printer_emulator.py,
+# for end-to-end testing)
+PRINTER_BACKEND = os.environ.get("EVO_PRINTER_BACKEND", "system")
+PRINTER_HOST = os.environ.get("EVO_PRINTER_HOST")
+
+# Only tags whose encode the printer verified are registered. The spooler can't read the
+# results back, so it refuses to print unless this is set (tags are then registered as soon
+# as their print job completes, voided labels included)
+ALLOW_UNVERIFIED_ENCODES = os.environ.get("EVO_ALLOW_UNVERIFIED_ENCODES", "0") == "1"
+
+# Tag IDs of a print run are reserved with the backend before anything is encoded:
+# "local" (the server validates the locally generated IDs), "server" (the server allocates
+# the IDs) or "off". Backends without the reservation endpoint fall back to unreserved local IDs.
+TAG_RESERVATION = os.environ.get("EVO_TAG_RESERVATION", "local")
+
+# "label" sends one print job per label; "serialized" sends one stored-format recall per
+# run of consecutive tag IDs and lets the printer increment the ID itself (^SF)
+PRINT_MODE = os.environ.get("EVO_PRINT_MODE", "label")
+SERIAL_BATCH_SIZE = int(os.environ.get("EVO_SERIAL_BATCH_SIZE", 0))  # labels per serialized job, 0 = no limit
+
+# Times a label voided by a failed RFID encode is printed again before the run stops
+ENCODE_RETRIES = int(os.environ.get("EVO_ENCODE_RETRIES", 2))
+
 # Authentication endpoints
 LOGIN_ENDPOINT = "/api/ewms/login"
 LOGOUT_ENDPOINT = "/api/ewms/logout"
+REFRESH_ENDPOINT = "/api/ewms/refresh"  # Only used when the login response includes a refresh_token
+
+# Warehouse used when the warehouse list can't be fetched (Odoo ignores it), and how long
+# the fetched list is reused
+DEFAULT_WAREHOUSE_ID = int(os.environ.get("EVO_WAREHOUSE_ID", 1))
+WAREHOUSE_CACHE_TTL = float(os.environ.get("EVO_WAREHOUSE_CACHE_TTL", 3600))
+
+# Active POs are fetched a page at a time (filtered on the server by the typed prefix),
+# and fetched pages are reused for PO_PAGE_CACHE_TTL seconds
+PO_PAGE_SIZE = int(os.environ.get("EVO_PO_PAGE_SIZE", 50))
+PO_PAGE_CACHE_TTL = float(os.environ.get("EVO_PO_PAGE_CACHE_TTL", 60))
+
+# Label previews of the items on the item screen are rendered ahead of time by
+# PREVIEW_WORKERS threads; the PREVIEW_CACHE_SIZE most recently used are kept
+PREVIEW_WORKERS = int(os.environ.get("EVO_PREVIEW_WORKERS", 2))
+PREVIEW_CACHE_SIZE = int(os.environ.get("EVO_PREVIEW_CACHE_SIZE", 100))
+# "labelary" renders previews with the Labelary web service, "local" draws them here
+# (zpl.render_zpl_preview_local: native QR code, approximate fonts, no network)
+PREVIEW_RENDERER = os.environ.get("EVO_PREVIEW_RENDERER", "labelary").lower()
+# With Labelary (a public service) only the items in the list's first rows are rendered
+# ahead, one every PREVIEW_REMOTE_INTERVAL seconds
+PREVIEW_REMOTE_PREFETCH = int(os.environ.get("EVO_PREVIEW_REMOTE_PREFETCH", 10))
+PREVIEW_REMOTE_INTERVAL = float(os.environ.get("EVO_PREVIEW_REMOTE_INTERVAL", 1.0))
+
+# Per-user directory for state kept across restarts (cached session, station settings)
+DATA_DIR = os.environ.get("EVO_DATA_DIR") or os.path.join(
+    os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"),
+    "EVO RFID Printer" if os.name == "nt" else ".evo_rfid_printer",
+)
+
+def get_data_dir():
+    """
+    Return the per-user data directory, creating it on first use.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return DATA_DIR
 
 # Windows Fluent UI color palette
 PRIMARY_COLOR = "#005A9F"  # Fluent Blue
@@ -216,80 +276,24 @@ SUBHEADER_STYLE = {"font": FONT_SUBHEADER, "bg": CARD_COLOR, "fg": "#374151"}
 # Convert icon to base64 and store it as a string
 ICON_BASE64 = "iVBORw0KGgoAAAANSUhEUgAAABAAAAAQCAMAAAAoLQ9TAAADAFBMVEUAcrxmq9fk8Piy1esvjMnz+PwNecAAcrz///8AcrxToNIbgcSax+XT5/TE3/B/uN49lM0AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAzHvxgAAAACHRSTlPy////////5ZXmvn8AAABdSURBVHicXY5RDsAgCEONIivOef/jDnUirh8leQHaIKdCGCNCxRugCak/BhjIQId2QohS3Q+BtOafKqEjBQya6EuBbiQ4ME6QPCjqeYN7eDWQscxSus4ehVePn64XPfQHhymZj4gAAAAASUVORK5CYII="
 
-def get_icon_image():
+def get_icon_image(master=None):
     """Load the EVO logo for popup window title bars (uses same image as taskbar)"""
     try:
-        import os
-        # Load the same uploaded EVO logo as used for taskbar
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        image_path = os.path.join(current_dir, "attached_assets", "EVOlogoInverse32x32_1758093354058.png")
-        
-        if not os.path.exists(image_path):
-            print(f"EVO logo file does not exist at: {image_path}")
-            return None
-            
-        image = Image.open(image_path)
-        
-        # Convert to RGBA for better compatibility
-        if image.mode != 'RGBA':
-            image = image.convert('RGBA')
-        
-        # Ensure it's 32x32 for title bar use
-        if image.size != (32, 32):
-            image = image.resize((32, 32), Image.Resampling.LANCZOS if hasattr(Image, 'Resampling') else Image.ANTIALIAS)
-        
-        return ImageTk.PhotoImage(image)
+        import assets
+        # Decoded once per process and cached per Tk root (see assets.py)
+        return assets.get_photo(assets.EVO_ICON, (32, 32), master=master)
     except Exception as e:
         print(f"Error loading EVO logo for title bar: {e}")
         logging.warning(f"Could not load application icon: {e}")
         return None
 
-def get_evo_logo_icon():
+def get_evo_logo_icon(master=None):
     """Load the EVO logo for window icon with Windows 11 taskbar compatibility"""
     try:
-        import os
-        # Load the uploaded EVO logo with absolute path
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        image_path = os.path.join(current_dir, "attached_assets", "EVOlogoInverse32x32_1758093354058.png")
-        
-        print(f"Loading EVO logo from: {image_path}")
-        if not os.path.exists(image_path):
-            print(f"EVO logo file does not exist at: {image_path}")
-            return None
-            
-        image = Image.open(image_path)
-        print(f"Original image size: {image.size}, mode: {image.mode}")
-        
-        # Convert to RGBA first for better compatibility
-        if image.mode != 'RGBA':
-            image = image.convert('RGBA')
-        
-        # Create multiple sizes for better Windows compatibility
-        sizes = [(16, 16), (32, 32), (48, 48), (64, 64)]
-        images = []
-        
-        for size in sizes:
-            resized = image.resize(size, Image.Resampling.LANCZOS if hasattr(Image, 'Resampling') else Image.ANTIALIAS)
-            images.append(resized)
-        
-        # Create PhotoImage from the 32x32 version for Tkinter
-        main_image = images[1]  # 32x32
-        photo = ImageTk.PhotoImage(main_image)
-        print("Successfully created PhotoImage for EVO logo")
-        
-        # Save as ICO file for Windows taskbar compatibility
-        ico_path = os.path.join(current_dir, "attached_assets", "evo_logo_inverse.ico")
-        try:
-            # Save multiple sizes in ICO format
-            images[0].save(ico_path, format='ICO', sizes=[(16,16), (32,32), (48,48), (64,64)])
-            print(f"Saved ICO file at: {ico_path}")
-            
-            # Return both the PhotoImage and ICO path
-            return photo, ico_path
-        except Exception as ico_e:
-            print(f"Could not save ICO file: {ico_e}")
-            return photo, None
-        
+        import assets
+        # The PhotoImage is cached per Tk root and the ICO is only regenerated when the PNG changes
+        photo = assets.get_photo(assets.EVO_ICON, (32, 32), master=master)
+        return photo, assets.get_ico_path()
     except Exception as e:
         print(f"Error loading EVO logo icon: {e}")
         logging.warning(f"Could not load EVO logo icon: {e}")
@@ -311,7 +315,7 @@ def add_custom_title_bar(window, title, bg_color="#005A9F", show_menu=False):
     title_bar.pack(side="top", fill="x")
 
     # Add App Icon (if available)
-    icon_image = get_icon_image()
+    icon_image = get_icon_image(window)
     icon_label = None
     if icon_image:
         icon_label = tk.Label(title_bar, bg=bg_color, image=icon_image)
@@ -484,6 +488,10 @@ def add_custom_title_bar(window, title, bg_color="#005A9F", show_menu=False):
         minimize_button.configure(bg=bg_color)
     minimize_button.bind("<Enter>", minimize_button_hover_enter)
     minimize_button.bind("<Leave>", minimize_button_hover_leave)
+
+    # Let the app shell update the title and show/hide the menu button per screen
+    title_bar.title_label = title_label
+    title_bar.minimize_button = minimize_button
     
     if show_menu:
         return title_bar, menu_button
@@ -494,9 +502,11 @@ def set_window_evo_icon(window):
     """Set the EVO logo as the window icon with Windows 11 taskbar support"""
     try:
         print("Setting EVO logo as window icon with Windows 11 taskbar support...")
+        from metrics import record_cache
         # Cache the icon and ICO path if not already cached
+        record_cache("window_icon", hasattr(window, '_evo_icon_cached'))
         if not hasattr(window, '_evo_icon_cached'):
-            result = get_evo_logo_icon()
+            result = get_evo_logo_icon(window)
             if result and len(result) == 2:
                 window._evo_icon_cached, window._evo_ico_path = result
             else:
@@ -551,6 +561,16 @@ def set_window_evo_icon(window):
         print(f"Error setting window EVO icon: {e}")
 
 # Default Function to center align the window of the UI
+def center_geometry(window, width, height):
+    """
+    Resize a window and center it on the screen.
+    """
+    screen_width = window.winfo_screenwidth()
+    screen_height = window.winfo_screenheight()
+    x_cordinate = int((screen_width / 2) - (width / 2))
+    y_cordinate = int((screen_height / 2) - (height / 2))
+    window.geometry(f"{width}x{height}+{x_cordinate}+{y_cordinate}")
+
 def center_window(window, width, height, title=None, show_menu=False):
     """
     Centers a Tkinter window on the screen and allows free movement.
@@ -564,11 +584,7 @@ def center_window(window, width, height, title=None, show_menu=False):
     """
     window.resizable(True, True)  # Allow window resizing
 
-    screen_width = window.winfo_screenwidth()
-    screen_height = window.winfo_screenheight()
-    x_cordinate = int((screen_width / 2) - (width / 2))
-    y_cordinate = int((screen_height / 2) - (height / 2))
-    window.geometry(f"{width}x{height}+{x_cordinate}+{y_cordinate}")
+    center_geometry(window, width, height)
     # Removed topmost attribute to allow normal window behavior
 
     # Set the EVO logo as window icon for all windows
@@ -1,66 +1,273 @@
-import requests, logging
+import requests, logging, threading, time, contextvars
 import config
+from dataclasses import dataclass
+from typing import Any, Optional, Union
+from app_logging import setup_logging, log_sampled
+from metrics import API_REQUESTS, API_REQUEST_DURATION, record_cache
+from profiling import profiled
+from items import Item, ItemTable, item_pairs_hook
+from json_stream import CHUNK_SIZE, ArrayStream
+from resilience import CircuitOpenError, get_breaker, send_with_retry
+import session
+from urllib.parse import urlsplit
 
-# Configure logging
-logging.basicConfig(
-    filename="app.log",  # Log file name
-    level=logging.INFO,  # Log level (ERROR, WARNING, INFO, DEBUG, etc.)
-    format="%(asctime)s - %(levelname)s - %(message)s",  # Log message format
-    datefmt="%Y-%m-%d %H:%M:%S"  # Date format
-)
+# Configure logging (JSON lines to a rotating app.log through a non-blocking queue, see app_logging.py)
+setup_logging()
 
-error_msg = None  # Stores the most recent API error message
+# Most recent API error message, stored per thread/context so concurrent calls don't overwrite each other
+_last_error = contextvars.ContextVar("api_last_error", default=None)
 
 def get_err_msg():
-    return error_msg
+    """
+    Return the error message of the last api_request made in the current thread.
+    """
+    return _last_error.get()
 
-# Helper function to handle API requests
-def api_request(method, endpoint, headers=None, payload=None, params=None):
+@dataclass
+class ApiResult:
+    """
+    Outcome of a single API call: the parsed JSON `data` on success, otherwise `error`.
+    `status` is the HTTP status code, or "timeout" / "circuit_open" / "error" when no response arrived.
+    """
+    data: Any = None
+    error: Optional[str] = None
+    status: Union[int, str, None] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+# Helper function to handle API requests, returning a typed result
+@profiled("api_request")
+def api_call(method, endpoint, headers=None, payload=None, params=None, idempotent=None, object_pairs_hook=None,
+             stream=False):
     """
     A reusable function to handle API requests.
+    `object_pairs_hook` is passed to the JSON decoder (see items.item_pairs_hook).
+    With `stream`, `data` is a json_stream.ArrayStream decoding the "data" array of the
+    envelope while the body downloads, instead of the parsed JSON.
+    Transient failures are retried with backoff (GET always, POST only when `idempotent`
+    is set or the request never reached the server) behind a per-host circuit breaker.
+    Safe to call from several threads at once; never raises for request errors.
+    With the default headers, an expiring token is renewed first and a 401 is retried
+    once after renewing the session.
     """
-    global error_msg    
     url = f"{config.BASE_URL}{endpoint}"
+    session_auth = headers is None
+    if session_auth:
+        session.ensure_fresh()
+    token = config.API_TOKEN
     headers = headers or {
-        "Authorization": f"Bearer {config.API_TOKEN}",
+        "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
     }
     TIMEOUT = 10  # seconds
-    try:
+    if idempotent is None:
+        idempotent = method == "GET"
+
+    def send():
         if method == "GET":
-            response = requests.get(url, headers=headers, params=params, timeout=TIMEOUT)
+            return requests.get(url, headers=headers, params=params, timeout=TIMEOUT, stream=stream)
         elif method == "POST":
-            response = requests.post(url, json=payload, headers=headers, timeout=TIMEOUT)
+            return requests.post(url, json=payload, headers=headers, timeout=TIMEOUT)
         else:
             raise ValueError(f"Unsupported HTTP method: {method}")
 
+    result = ApiResult(status="error")
+    start = time.perf_counter()
+    try:
+        breaker = get_breaker(urlsplit(url).netloc)
+        response = send_with_retry(send, breaker, endpoint, idempotent=idempotent)
+        if response.status_code == 401 and session_auth and session.refresh(stale_token=token, trigger="unauthorized"):
+            # The token expired or was revoked; retry once with the renewed one
+            headers["Authorization"] = f"Bearer {config.API_TOKEN}"
+            response = send_with_retry(send, breaker, endpoint, idempotent=idempotent)
+        result.status = response.status_code
+        if stream and not response.ok:
+            response.close()
         response.raise_for_status()
-        error_msg = None  # Clear error if successful
-        return response.json()  # Return parsed JSON response
+        if stream:
+            result.data = ArrayStream(response.iter_content(CHUNK_SIZE), object_pairs_hook=object_pairs_hook,
+                                      close=response.close)
+        else:
+            result.data = response.json(object_pairs_hook=object_pairs_hook)  # Parsed JSON response
 
+    except CircuitOpenError as e:
+        result.status = "circuit_open"
+        result.error = f"Error during {method} request to {endpoint}: {e}"
+    except requests.exceptions.Timeout as e:
+        result.status = "timeout"
+        result.error = f"Error during {method} request to {endpoint}: {e}"
     except requests.exceptions.RequestException as e:
-        error_msg = f"Error during {method} request to {endpoint}: {e}"
-        logging.error(error_msg)
+        result.error = f"Error during {method} request to {endpoint}: {e}"
     except ValueError:
-        error_msg = "Invalid JSON response from API."
-        logging.error(error_msg)
+        result.error = "Invalid JSON response from API."
+    finally:
+        API_REQUEST_DURATION.observe(time.perf_counter() - start, method=method, endpoint=endpoint)
+        API_REQUESTS.inc(method=method, endpoint=endpoint, status=result.status)
+
+    if result.error:
+        logging.error(result.error)
+    return result
 
+# Legacy helper: returns the parsed JSON or None, with the error available through get_err_msg()
+def api_request(method, endpoint, headers=None, payload=None, params=None, idempotent=None, object_pairs_hook=None):
+    """
+    A reusable function to handle API requests.
+    """
+    result = api_call(method, endpoint, headers=headers, payload=payload, params=params, idempotent=idempotent,
+                      object_pairs_hook=object_pairs_hook)
+    _last_error.set(result.error)
+    return result.data
+
+def _stream_error(stream, endpoint):
+    """
+    The error of a finished ArrayStream: download/parse error or an envelope that isn't a success.
+    """
+    if stream.error:
+        return stream.error
+    if stream.envelope.get("status_code") != 200 or not stream.found:
+        return stream.envelope.get("message") or f"Unexpected response from {endpoint}"
     return None
 
-# Function to fetch PO Names from the REST API
-def fetch_po_number():
+# Function to stream PO Names from the REST API
+def stream_po_numbers():
+    """
+    Yield the active PO numbers as (po_number,) tuples while the response downloads, so
+    the first ones can be shown before the list is complete. Once the generator is
+    exhausted, get_err_msg() tells whether the list was read completely.
+    """
     #endpoint = "/api/ewms/accurate/purchase-orders/active"
     endpoint = "/api/ewms/odoo/purchase-orders/active"
 
-    data = api_request("GET", endpoint)
-    logging.info(f"RESPONSE: {data}")
-    if data and data.get("status_code") == 200 and "data" in data:
-        # Transform API output to match the desired format
-        po_numbers = [(po["purchase_order_number"],) for po in data["data"]]
-        # return sorted(po_numbers, key=lambda x: x[0], reverse=True)  # # Sort the tuples descendingly by the po_number
-        return po_numbers
+    result = api_call("GET", endpoint, stream=True)
+    _last_error.set(result.error)
+    if not result.ok:
+        return
+    stream = result.data
+    for po in stream:
+        if isinstance(po, dict) and "purchase_order_number" in po:
+            yield (po["purchase_order_number"],)
+    error = _stream_error(stream, endpoint)
+    _last_error.set(error)
+    if error:
+        logging.error("Active purchase orders incomplete after %d rows: %s", stream.count, error)
     else:
+        logging.info("Fetched %d active purchase orders", stream.count)
+
+# Function to fetch PO Names from the REST API
+def fetch_po_number():
+    po_numbers = list(stream_po_numbers())
+    if get_err_msg():
         return []
+    # return sorted(po_numbers, key=lambda x: x[0], reverse=True)  # # Sort the tuples descendingly by the po_number
+    return po_numbers
+
+@dataclass
+class PoPage:
+    """
+    One page of the active POs starting with `prefix`, as (po_number,) tuples.
+    `total` is the number of matches when the backend reports it.
+    """
+    prefix: str
+    page: int
+    po_numbers: list
+    has_more: bool = False
+    total: Optional[int] = None
+
+# Function to fetch one page of the active POs, filtered by prefix on the server
+def fetch_po_page(prefix="", page=1, page_size=None):
+    """
+    Fetch page `page` (from 1) of the active POs whose number starts with `prefix`.
+    Returns an ApiResult whose data is a PoPage. A backend that ignores the paging
+    parameters sends the whole list: it is filtered here and returned as the only page.
+    """
+    endpoint = "/api/ewms/odoo/purchase-orders/active"
+    page_size = page_size or config.PO_PAGE_SIZE
+    params = {"page": page, "page_size": page_size}
+    if prefix:
+        params["search"] = prefix
+
+    result = api_call("GET", endpoint, params=params, stream=True)
+    if not result.ok:
+        return result
+    stream = result.data
+    folded = prefix.casefold()
+    po_numbers = [
+        (po["purchase_order_number"],) for po in stream
+        if isinstance(po, dict) and "purchase_order_number" in po
+        and str(po["purchase_order_number"]).casefold().startswith(folded)
+    ]
+    result.error = _stream_error(stream, endpoint)
+    if result.error:
+        logging.error("Failed to read page %d of the active purchase orders for %r: %s", page, prefix, result.error)
+        result.data = None
+        return result
+    envelope = stream.envelope
+    if "has_more" in envelope or "total" in envelope:
+        total = envelope.get("total")
+        has_more = bool(envelope.get("has_more", total is not None and page * page_size < total))
+    else:
+        # Not paged: the whole list came at once, as page 1
+        if page > 1:
+            po_numbers = []
+        has_more, total = False, len(po_numbers)
+    result.data = PoPage(prefix, page, po_numbers, has_more, total)
+    return result
+
+# Fetched pages of active POs, reused for PO_PAGE_CACHE_TTL seconds
+_po_page_cache = {}  # (base_url, prefix, page, page_size) -> (fetched_at, PoPage)
+_po_page_lock = threading.Lock()
+
+def _cached_po_page(prefix, page, page_size, now):
+    """
+    The cached page, or one derived from a cached first page that held every PO of a
+    shorter prefix (typing more characters narrows it without a request). Call with the lock held.
+    """
+    def fresh(key):
+        cached = _po_page_cache.get(key)
+        if cached is not None and now - cached[0] < config.PO_PAGE_CACHE_TTL:
+            return cached[1]
+        return None
+
+    cached = fresh((config.BASE_URL, prefix, page, page_size))
+    if cached is not None or page != 1:
+        return cached
+    folded = prefix.casefold()
+    for length in range(len(prefix) - 1, -1, -1):
+        shorter = fresh((config.BASE_URL, prefix[:length], 1, page_size))
+        if shorter is not None and not shorter.has_more:
+            po_numbers = [po for po in shorter.po_numbers if str(po[0]).casefold().startswith(folded)]
+            return PoPage(prefix, 1, po_numbers, False, len(po_numbers))
+    return None
+
+def get_po_page(prefix="", page=1, force=False):
+    """
+    Return page `page` of the active POs starting with `prefix` as an ApiResult whose
+    data is a PoPage, from the cache unless it is older than PO_PAGE_CACHE_TTL or `force`
+    is set. Failed fetches are not cached.
+    """
+    page_size = config.PO_PAGE_SIZE
+    cached = None
+    if not force:
+        with _po_page_lock:
+            cached = _cached_po_page(prefix, page, page_size, time.monotonic())
+    record_cache("po_pages", cached is not None)
+    if cached is not None:
+        return ApiResult(data=cached, status=200)
+    result = fetch_po_page(prefix, page, page_size)
+    if result.ok:
+        now = time.monotonic()
+        with _po_page_lock:
+            for key in [key for key, (fetched_at, _) in _po_page_cache.items()
+                        if now - fetched_at >= config.PO_PAGE_CACHE_TTL]:
+                del _po_page_cache[key]
+            _po_page_cache[(config.BASE_URL, prefix, page, page_size)] = (now, result.data)
+    return result
+
+def invalidate_po_pages():
+    with _po_page_lock:
+        _po_page_cache.clear()
     
 # Function to fetch items from the REST API based on the selected PO and warehouse_id
 def fetch_items(po_number, warehouse_id):
@@ -68,32 +275,22 @@ def fetch_items(po_number, warehouse_id):
     endpoint = "/api/ewms/odoo/purchase-orders/items"
     params = {"warehouse_id": warehouse_id, "po_number": po_number}
 
-    data = api_request("GET", endpoint, params=params)
-    if data and data.get("status_code") == 200 and "data" in data:
-        '''
-        print(data)
-        if isinstance(data["data"], list):
-            # Format 1: data["data"] is directly a list of items
-            items = data["data"]
-        else:
-            # Format 2: data["data"] is a dict containing detail_items
-            items = data["data"]["detail_items"]
-        '''
-        # Transform API output to match the desired format
-        return [
-            {
-                "item_id": item["item_id"],
-                "sku": item["sku"],
-                "item_name": item["name"],
-                "unit_name": item["unit_name"],
-                "quantity": item["quantity"],
-                "receive_item_number": item["receive_item_number"],
-                "inventory_id": item.get("inventory_id")
-            }
-            for item in data["data"]
-        ]
-    else:
-        return []
+    # Items are decoded one by one while the body downloads, straight into the compact
+    # Item model (no dict per item, no parsed copy of the whole response)
+    result = api_call("GET", endpoint, params=params, object_pairs_hook=item_pairs_hook, stream=True)
+    _last_error.set(result.error)
+    if not result.ok:
+        return ItemTable()
+    stream = result.data
+    items = [item for item in stream if isinstance(item, Item)]
+    error = _stream_error(stream, endpoint)
+    _last_error.set(error)
+    if error:
+        logging.error("Failed to read the items of %s: %s", po_number, error)
+        return ItemTable()
+    if len(items) != stream.count:
+        logging.warning("Skipped %d items of %s without the expected fields", stream.count - len(items), po_number)
+    return ItemTable(items)
 
 # Function to insert data into stocks via REST API
 def insert_into_stocks(po_number, ri_number, item_id, tag_id, exp_date, inventory_id, warehouse_id):
@@ -110,20 +307,87 @@ def insert_into_stocks(po_number, ri_number, item_id, tag_id, exp_date, inventor
         "location_id": warehouse_id
     }
 
-    data = api_request("POST", endpoint, payload=payload)
+    # Not idempotent: whether the backend dedupes tag_id is unknown, and a replay of a create whose
+    # response was lost would either be refused or add a second stock record. It is only retried
+    # when the request provably did not reach the backend (connection refused, 429/503)
+    result = api_call("POST", endpoint, payload=payload, idempotent=False)
+    data = result.data
     if not data or data.get("status_code") != 201:  # Assuming 201 Created for successful insertion
         # Log the error and the payload data
         logging.error(
-            f"Failed to insert stock. Payload: {payload}, Response: {data.get('message', 'Unknown error') if data else 'No response'}"
+            "Failed to insert stock. Payload: %s, Response: %s",
+            payload, data.get('message', 'Unknown error') if data else result.error or 'No response'
         )
         return False
     else:
-        # Log successful insertion (optional, for debugging purposes)
-        logging.info(f"Successfully inserted stock. Payload: {payload}")
+        # Log successful insertion (sampled, the full payload only at DEBUG level)
+        logging.debug("Successfully inserted stock. Payload: %s", payload)
+        log_sampled(logging.INFO, "insert_into_stocks", 50, "Successfully inserted stock for tag %s", tag_id)
         return True
     
+# Statuses meaning the backend has no tag reservation endpoint (older eWMS versions)
+RESERVATION_UNSUPPORTED = (404, 405, 501)
+
+@dataclass
+class TagReservation:
+    reservation_id: str
+    tag_ids: list  # IDs reserved for this run, safe to encode
+    rejected: dict  # tag_id -> reason, for validated IDs the server refused
+    expires_at: Optional[str] = None
+
+# Function to reserve the tag IDs of a print run before printing
+def reserve_tag_ids(reservation_id, po_number, item_id, warehouse_id, tag_ids=None, count=None, renew=()):
+    """
+    Reserve the tag IDs of a print run in one call: with `tag_ids` the server validates
+    a locally generated block, otherwise it allocates `count` new IDs.
+    Returns an ApiResult whose data is a TagReservation on success; its status is one
+    of RESERVATION_UNSUPPORTED when the backend has no reservation endpoint.
+    `reservation_id` is chosen by the caller and identifies the run's reservation on the server.
+    `renew` lists earlier reservations of the same run (resumed runs) whose tags may be reserved again.
+    """
+    endpoint = "/api/ewms/odoo/stocks/reserve"
+
+    payload = {
+        "reservation_id": reservation_id,
+        "purchase_order_number": po_number,
+        "item_id": item_id,
+        "location_id": warehouse_id,
+    }
+    if tag_ids is not None:
+        payload["tag_ids"] = list(tag_ids)
+    else:
+        payload["count"] = count
+    if renew:
+        payload["renew"] = list(renew)
+
+    # Only retried when the request provably did not reach the backend: a replay after a lost
+    # response relies on the server deduplicating reservation_id, which is not guaranteed
+    result = api_call("POST", endpoint, payload=payload, idempotent=False)
+    data = result.data
+    if result.ok and (not data or data.get("status_code") != 200 or not isinstance(data.get("data"), dict)):
+        result.error = data.get("message", "Unexpected response") if data else "Empty response"
+    if not result.ok:
+        if result.status not in RESERVATION_UNSUPPORTED:
+            logging.error("Failed to reserve tag IDs for %s: %s", reservation_id, result.error)
+        return result
+
+    reservation = data["data"]
+    result.data = TagReservation(
+        reservation_id=reservation.get("reservation_id", reservation_id),
+        tag_ids=[str(tag_id) for tag_id in reservation.get("tag_ids", [])],
+        rejected={str(entry.get("tag_id")): entry.get("reason", "") for entry in reservation.get("rejected", [])},
+        expires_at=reservation.get("expires_at"),
+    )
+    logging.info(
+        "Reserved %d tag IDs (%d rejected) for %s", len(result.data.tag_ids), len(result.data.rejected), reservation_id
+    )
+    return result
+
 # Function to fetch Warehouse Data from the REST API
 def fetch_warehouse():
+    """
+    Return the warehouses as {name: id}; an empty dict on failure.
+    """
     endpoint = "/api/ewms/accurate/warehouses"
 
     data = api_request("GET", endpoint)
@@ -135,4 +399,30 @@ def fetch_warehouse():
         warehouse_map = {item['name']: item['id'] for item in warehouse_list}
         return warehouse_map
     else:
-        return []
+        return {}
+
+# Warehouses change rarely: fetched once per server and kept for WAREHOUSE_CACHE_TTL seconds
+_warehouse_cache = {}  # base_url -> (fetched_at, {name: id})
+_warehouse_lock = threading.Lock()
+
+def get_warehouses(force=False):
+    """
+    Return the warehouses as {name: id} from the cache, fetching them when missing,
+    older than WAREHOUSE_CACHE_TTL or when `force` is set. Failed fetches are not cached.
+    """
+    key = config.BASE_URL
+    with _warehouse_lock:
+        cached = _warehouse_cache.get(key)
+    hit = not force and cached is not None and time.monotonic() - cached[0] < config.WAREHOUSE_CACHE_TTL
+    record_cache("warehouses", hit)
+    if hit:
+        return dict(cached[1])
+    warehouse_map = fetch_warehouse()
+    if warehouse_map:
+        with _warehouse_lock:
+            _warehouse_cache[key] = (time.monotonic(), warehouse_map)
+    return dict(warehouse_map)
+
+def invalidate_warehouses():
+    with _warehouse_lock:
+        _warehouse_cache.clear()
@@ -0,0 +1,133 @@
+"""
+Compact in-memory model of the items of a PO.
+
+fetch_items parses the API response straight into Item objects: item_pairs_hook is
+given to the JSON decoder as its object_pairs_hook, so no intermediate dict is built
+per item. Items are slotted, their SKU, name and unit strings are interned and the
+inventory IDs of an item are kept as one interned string (shared by every item with the
+same list) instead of a list of strings, so the many lines of a large PO (and the
+screens cached for several POs) cost little memory. An Item still reads like the dict
+fetch_items used to return: item["sku"], item.get("inventory_id"), dict(item).
+"""
+import sys
+from collections.abc import Mapping, Sequence
+
+FIELDS = ("item_id", "sku", "item_name", "unit_name", "quantity", "receive_item_number", "inventory_id")
+
+# Position of each API field in the Item constructor
+_API_FIELDS = {
+    "item_id": 0,
+    "sku": 1,
+    "name": 2,
+    "unit_name": 3,
+    "quantity": 4,
+    "receive_item_number": 5,
+    "inventory_id": 6,
+}
+_MISSING = object()
+
+# Separator of the inventory IDs packed into one string
+_ID_SEPARATOR = "\x1f"
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def pack_inventory_ids(values):
+    """
+    The inventory IDs as one interned string, shared by every item with the same list.
+    """
+    if not values:
+        return ""
+    return sys.intern(_ID_SEPARATOR.join(map(str, values)))
+
+
+class Item(Mapping):
+    """
+    One line of a PO: item_id, sku, item_name, unit_name, quantity, receive_item_number
+    and inventory_id (a tuple of the registered inventory IDs).
+    """
+    __slots__ = ("item_id", "sku", "item_name", "unit_name", "quantity", "receive_item_number", "_inventory_ids")
+
+    def __init__(self, item_id, sku, item_name, unit_name=None, quantity=0, receive_item_number=None, inventory_id=()):
+        self.item_id = item_id
+        self.sku = _intern(sku)
+        self.item_name = _intern(item_name)
+        self.unit_name = _intern(unit_name)
+        self.quantity = quantity
+        self.receive_item_number = receive_item_number
+        self._inventory_ids = pack_inventory_ids(inventory_id)
+
+    @property
+    def inventory_id(self):
+        return tuple(self._inventory_ids.split(_ID_SEPARATOR)) if self._inventory_ids else ()
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return f"Item({self.item_id!r}, {self.sku!r}, {self.item_name!r})"
+
+
+_FIELD_SET = frozenset(FIELDS)
+
+
+def item_pairs_hook(pairs):
+    """
+    object_pairs_hook for json.loads: an object with the fields of an API item becomes
+    an Item directly, any other object (the response envelope) a dict.
+    """
+    values = [_MISSING] * len(FIELDS)
+    position_of = _API_FIELDS.get
+    for key, value in pairs:
+        position = position_of(key)
+        if position is not None:
+            values[position] = value
+    if values[0] is _MISSING or values[1] is _MISSING or values[2] is _MISSING or values[5] is _MISSING:
+        return dict(pairs)  # Not an item (item_id, sku, name and receive_item_number are required)
+    if values[3] is _MISSING:
+        values[3] = None
+    if values[4] is _MISSING:
+        values[4] = 0
+    if values[6] is _MISSING:
+        values[6] = ()
+    return Item(*values)
+
+
+class ItemTable(Sequence):
+    """
+    The items of a PO in API order, with the names shown in the item combobox built once.
+    """
+    __slots__ = ("_items", "names")
+
+    def __init__(self, items=()):
+        self._items = tuple(items)
+        self.names = tuple(item.item_name for item in self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __len__(self):
+        return len(self._items)
+
+    def find_by_name(self, item_name):
+        """
+        The first item named `item_name`, or None. The names are interned, so the scan
+        mostly compares identities.
+        """
+        try:
+            return self._items[self.names.index(_intern(item_name))]
+        except ValueError:
+            return None
+
+    def __repr__(self):
+        return f"ItemTable({len(self._items)} items)"
@@ -0,0 +1,148 @@
+"""
+Incremental parsing of an API response envelope {"status_code": ..., "data": [...], "message": ...}.
+
+The elements of the data array are decoded one at a time as the body arrives, so the
+first rows can be shown before the download finishes, and only the unparsed tail of
+the body is held in memory however large the response is. The other members of the
+envelope are collected in ArrayStream.envelope.
+"""
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024  # bytes read from the response at a time
+_WHITESPACE = " \t\n\r"
+
+
+class StreamError(ValueError):
+    """
+    The body is not a JSON object of the expected shape.
+    """
+
+
+class ArrayStream:
+    """
+    Iterate once to get the elements of the `key` array of the JSON object read from
+    `chunks` (bytes). Download or parse errors end the iteration and are kept in
+    `error`; once it ends, `envelope` holds the other members and `found` tells
+    whether the array was there. `close` is called when the iteration ends.
+    """
+
+    def __init__(self, chunks, key="data", object_pairs_hook=None, close=None):
+        self.key = key
+        self.envelope = {}
+        self.found = False
+        self.count = 0
+        self.error = None
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder(object_pairs_hook=object_pairs_hook)
+        self._close = close
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._started = False
+
+    def __iter__(self):
+        if self._started:
+            raise RuntimeError("an ArrayStream can only be iterated once")
+        self._started = True
+        try:
+            yield from self._parse()
+        except (ValueError, OSError) as e:  # requests' download errors are OSErrors
+            self.error = f"Could not read the response: {e}"
+        finally:
+            self._buffer = ""
+            if self._close is not None:
+                self._close()
+
+    def _fill(self):
+        """
+        Read the next chunk, dropping the part of the buffer already parsed. Returns False at the end.
+        """
+        if self._eof:
+            return False
+        for chunk in self._chunks:
+            text = self._text.decode(chunk)
+            if text:
+                self._buffer = self._buffer[self._pos:] + text
+                self._pos = 0
+                return True
+        self._buffer = self._buffer[self._pos:] + self._text.decode(b"", final=True)
+        self._pos = 0
+        self._eof = True
+        return False
+
+    def _peek(self):
+        """
+        The next non-whitespace character, None at the end of the body.
+        """
+        while True:
+            buffer, pos = self._buffer, self._pos
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not self._fill():
+                return None
+
+    def _expect(self, char):
+        found = self._peek()
+        if found != char:
+            raise StreamError(f"expected {char!r} at offset {self._pos}, found {found!r}")
+        self._pos += 1
+
+    def _value(self):
+        """
+        Decode the JSON value at the current position, reading more of the body until it is complete.
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _parse(self):
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            name = self._value()
+            if not isinstance(name, str):
+                raise StreamError(f"expected a member name, found {name!r}")
+            self._expect(":")
+            if name == self.key and self._peek() == "[":
+                self._pos += 1
+                self.found = True
+                yield from self._elements()
+            else:
+                self.envelope[name] = self._value()
+            separator = self._peek()
+            self._pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise StreamError(f"expected ',' or '}}' at offset {self._pos - 1}, found {separator!r}")
+
+    def _elements(self):
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            value = self._value()
+            self.count += 1
+            yield value
+            separator = self._peek()
+            self._pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise StreamError(f"expected ',' or ']' at offset {self._pos - 1}, found {separator!r}")
@@ -0,0 +1,533 @@
+"""
+Label printing pipeline: for each tag render the ZPL, spool it, wait for the printer
+and register the stock record. Used by the item selection screen and the benchmarks;
+it has no UI of its own, progress goes through a callback and failures are returned.
+
+After the pre-flight checks (preflight.py) the run's tag IDs are reserved with the
+backend in one call, so an ID the server would refuse is never encoded into a chip,
+and each printed tag is registered from a background worker while the next label
+prints. Every stage is journaled (run_journal.py) so a run cut short by a crash can
+be resumed.
+
+With config.PRINT_MODE "serialized", each run of consecutive tag IDs is sent as one
+stored-format recall with ^PQ{count}: the printer increments the tag ID itself (^SF)
+and the host derives the same IDs (serial_tag_ids) to journal and register them.
+
+The printer reports its RFID encode results (~RVE) and only the tags it verified are
+registered; labels it voided are printed again with the same tag ID, up to
+config.ENCODE_RETRIES times. Where the results can't be read back (the Windows spooler)
+nothing is registered unless config.ALLOW_UNVERIFIED_ENCODES is set.
+"""
+import contextvars
+import queue
+from collections import deque
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field, replace
+from datetime import date, datetime
+from typing import Callable, List, Mapping, Optional
+import config
+import preflight
+import printer
+import profiling
+import run_journal
+from app_logging import new_run_id, run_id_var, set_tag_id
+from database import RESERVATION_UNSUPPORTED, insert_into_stocks, logging, reserve_tag_ids
+from metrics import RFID_ENCODES
+from print_stats import PrintRunStats
+from zpl import generate_zpl_item_name, wrap_text_by_words, zpl_serialized_template, zpl_template
+
+
+# Reservation requests per run (the first one plus allocations replacing rejected IDs)
+MAX_RESERVATION_ROUNDS = 3
+
+# Trailing digits of a tag ID incremented by the printer in serialized mode (the label index)
+SERIAL_DIGITS = 4
+
+
+def generate_tag_ids(amount):
+    base_date = datetime.now().strftime("%y%m%d")
+    base_time = datetime.now().strftime("%H%M%S")
+    return [f"{base_date}{base_time}{str(i).zfill(4)}" for i in range(amount)]
+
+
+def generate_label_zpl(item, tag_id, inventory_id, formatted_exp_date):
+    """
+    Generate the ZPL string of one label of `item` (an item record of fetch_items).
+    """
+    wrapped_lines = wrap_text_by_words(item["item_name"], max_chars_per_line=28)
+    item_name_zpl = generate_zpl_item_name(wrapped_lines)
+    return zpl_template.format(
+        sku=item["sku"],
+        item_name=item_name_zpl,
+        rfid_value=tag_id,
+        expiration_date=formatted_exp_date,
+        inventory_id=inventory_id,
+    )
+
+
+def generate_serialized_zpl(item, first_tag_id, count, inventory_id, formatted_exp_date):
+    """
+    Generate one ZPL job printing `count` labels of `item` whose tag IDs the printer
+    counts up from `first_tag_id` (see serial_tag_ids).
+    """
+    wrapped_lines = wrap_text_by_words(item["item_name"], max_chars_per_line=28)
+    item_name_zpl = generate_zpl_item_name(wrapped_lines)
+    return zpl_serialized_template.format(
+        sku=item["sku"],
+        item_name=item_name_zpl,
+        rfid_value=first_tag_id,
+        expiration_date=formatted_exp_date,
+        inventory_id=inventory_id,
+        serial_mask="d" * SERIAL_DIGITS,
+        quantity=count,
+    )
+
+
+def serial_tag_ids(first_tag_id, count):
+    """
+    The tag IDs of `count` serialized labels starting at `first_tag_id`, as the printer
+    derives them: the last SERIAL_DIGITS digits count up by one per label and wrap around.
+    """
+    prefix, start = first_tag_id[:-SERIAL_DIGITS], int(first_tag_id[-SERIAL_DIGITS:])
+    modulus = 10 ** SERIAL_DIGITS
+    return [f"{prefix}{(start + index) % modulus:0{SERIAL_DIGITS}d}" for index in range(count)]
+
+
+def print_batches(tag_ids, mode=None, batch_size=None):
+    """
+    Split `tag_ids` into print jobs: one per tag, or in "serialized" mode one per run of
+    consecutive IDs (IDs allocated by the server to replace rejected ones break the run),
+    at most `batch_size` labels each (0 for no limit).
+    """
+    mode = mode or config.PRINT_MODE
+    if mode != "serialized":
+        return [[tag_id] for tag_id in tag_ids]
+    batch_size = config.SERIAL_BATCH_SIZE if batch_size is None else batch_size
+    batches = []
+    for tag_id in tag_ids:
+        batch = batches[-1] if batches else None
+        if (batch and (not batch_size or len(batch) < batch_size) and tag_id.isdigit()
+                and serial_tag_ids(batch[-1], 2)[1] == tag_id and tag_id > batch[-1]):
+            batch.append(tag_id)
+        else:
+            batches.append([tag_id])
+    return batches
+
+
+@dataclass
+class LabelJob:
+    po_number: str
+    item: Mapping  # items.Item of fetch_items (or a dict with its fields): item_id, sku, item_name, receive_item_number
+    inventory_id: str
+    exp_date: date
+    amount: int
+    warehouse_id: int
+
+
+def job_record(job):
+    """
+    The job as a JSON-serialisable dict, for the run journal.
+    """
+    record = asdict(replace(job, item=dict(job.item)))
+    record["exp_date"] = job.exp_date.isoformat()
+    return record
+
+
+def job_from_record(record):
+    return LabelJob(**{**record, "exp_date": date.fromisoformat(record["exp_date"])})
+
+
+@dataclass
+class LabelRunResult:
+    status: str  # completed, preflight_failed, reservation_failed, printer_offline, print_failed, encode_failed,
+    # encode_unverified or register_failed
+    stats: PrintRunStats
+    printed_tags: List[str] = field(default_factory=list)
+    registered_tags: List[str] = field(default_factory=list)
+    reservation_ids: List[str] = field(default_factory=list)
+    failed_tag: Optional[str] = None
+    error_title: Optional[str] = None
+    error_message: Optional[str] = None
+    journal: Optional[run_journal.RunJournal] = field(default=None, repr=False)
+
+    @property
+    def ok(self):
+        return self.status == "completed"
+
+    @property
+    def unregistered_tags(self):
+        registered = set(self.registered_tags)
+        return [tag_id for tag_id in self.printed_tags if tag_id not in registered]
+
+
+def reserve_tags(job, amount, tag_ids=None, mode=None, renew=()):
+    """
+    Reserve `amount` tag IDs for `job` before printing. Returns (tag_ids, reservation_ids),
+    or (None, error message) when the IDs could not be reserved.
+    In "local" mode the server validates `tag_ids` (generated when not given) and allocates
+    replacements for the IDs it rejects; in "server" mode it allocates all of them. With mode
+    "off", or a backend without the reservation endpoint, the local IDs are used unreserved.
+    `renew` lists the reservations of an interrupted run whose tags are reserved again.
+    """
+    mode = mode or config.TAG_RESERVATION
+    local_ids = list(tag_ids) if tag_ids else generate_tag_ids(amount)
+    if mode == "off":
+        return local_ids, []
+
+    run_key = uuid.uuid4().hex[:12]
+    accepted, reservation_ids = [], []
+    candidates = None if mode == "server" else local_ids
+    for attempt in range(1, MAX_RESERVATION_ROUNDS + 1):
+        reservation_id = f"{run_key}-{attempt}"
+        result = reserve_tag_ids(
+            reservation_id, job.po_number, job.item["item_id"], job.warehouse_id,
+            tag_ids=candidates, count=None if candidates is not None else amount - len(accepted), renew=renew,
+        )
+        if result.status in RESERVATION_UNSUPPORTED:
+            logging.warning("The backend has no tag reservation endpoint; printing unreserved tag IDs")
+            return local_ids, []
+        if not result.ok:
+            return None, f"Could not reserve the tag IDs of this run: {result.error}"
+
+        reservation = result.data
+        reservation_ids.append(reservation.reservation_id)
+        accepted.extend(reservation.tag_ids)
+        for tag_id, reason in reservation.rejected.items():
+            logging.warning("Tag ID %s rejected by the server: %s", tag_id, reason)
+        missing = amount - len(accepted)
+        if missing <= 0:
+            return accepted[:amount], reservation_ids
+        candidates = None  # Let the server allocate the IDs it rejected
+    return None, f"Only {len(accepted)} of {amount} tag IDs could be reserved."
+
+
+class StockRegistrar:
+    """
+    Registers printed tags (insert_into_stocks) from a worker thread, in print order,
+    so registering a tag overlaps with printing the next one.
+    """
+
+    def __init__(self, job, stats, journal=None):
+        self.job = job
+        self.stats = stats
+        self.journal = journal
+        self.registered = []
+        self.failed = []
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def submit(self, tag_id):
+        if self._thread is None:
+            # The worker keeps the run's log context (run_id)
+            context = contextvars.copy_context()
+            self._thread = threading.Thread(target=context.run, args=(self._run,), name="stock-registrar", daemon=True)
+            self._thread.start()
+        self._queue.put(tag_id)
+
+    def close(self):
+        """
+        Wait until every submitted tag has been registered or has failed.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def register(self, tag_id):
+        """
+        Register one tag now, in the calling thread. Returns True on success.
+        """
+        job = self.job
+        set_tag_id(tag_id)
+        start = time.perf_counter()
+        inserted = insert_into_stocks(
+            po_number=job.po_number,
+            ri_number=job.item["receive_item_number"],
+            item_id=job.item["item_id"],
+            tag_id=tag_id,
+            exp_date=job.exp_date.strftime("%Y-%m-%d"),
+            inventory_id=job.inventory_id,
+            warehouse_id=job.warehouse_id,
+        )
+        self.stats.record("register", time.perf_counter() - start, per_label=True)
+        if inserted:
+            self.registered.append(tag_id)
+            self.stats.label_registered(tag_id)
+            if self.journal is not None:
+                self.journal.mark(tag_id, run_journal.REGISTERED)
+        else:
+            logging.error(f"Failed to insert tag {tag_id} into database.")
+            self.failed.append(tag_id)
+        return inserted
+
+    def _run(self):
+        while True:
+            tag_id = self._queue.get()
+            if tag_id is None:
+                set_tag_id(None)
+                return
+            self.register(tag_id)
+
+
+def run_label_job(job, on_progress: Optional[Callable[[int, PrintRunStats], None]] = None, tag_ids=None):
+    """
+    Run the pre-flight checks and reserve the tag IDs, then print and register the
+    labels of `job`, stopping at the first failure. `on_progress(done, stats)` is called
+    after each printed label. The run summary is written before returning.
+    """
+    item = job.item
+    ri_number = item["receive_item_number"]
+    stats = PrintRunStats(
+        job.amount,
+        po_number=job.po_number,
+        ri_number=ri_number,
+        item_id=item["item_id"],
+        printer=printer.printer_name,
+    )
+    result = LabelRunResult("completed", stats)
+
+    logging.info("Starting print run of %d tags for %s (item %s)", job.amount, ri_number, item["item_id"])
+    send_jobs = printer.sends_print_jobs()
+    if not send_jobs:
+        logging.info("Linux/Replit environment - using printer simulation and disable sending job to printer")
+
+    with profiling.profile_run("print_labels"):
+        start = time.perf_counter()
+        report = preflight.run_preflight(item, job.inventory_id)
+        stats.record("preflight", time.perf_counter() - start)
+        if not report.ok:
+            return _finish(result, ("preflight_failed", None, "Pre-flight Check Failed", report.message()))
+
+        start = time.perf_counter()
+        reserved, detail = reserve_tags(job, job.amount, tag_ids)
+        stats.record("reserve", time.perf_counter() - start)
+        if reserved is None:
+            logging.error(detail)
+            return _finish(result, ("reservation_failed", None, "Tag Reservation Error", detail))
+        result.reservation_ids = detail
+        try:
+            result.journal = run_journal.RunJournal.create(run_id_var.get() or new_run_id(), job_record(job), reserved, detail)
+        except OSError as e:
+            logging.warning(f"Could not start the run journal, this run cannot be resumed after a crash: {e}")
+        return _print_tags(job, reserved, result, send_jobs, on_progress)
+
+
+def resume_label_job(journal, on_progress=None, print_remaining=True):
+    """
+    Continue a run interrupted by a crash from its journal: register the tags that were
+    printed but not registered, then, with `print_remaining`, print the tags that were
+    not printed yet, starting from the exact next one. `on_progress(done, stats)` counts
+    from the labels the run had already printed.
+    """
+    journal.activate()
+    job = job_from_record(journal.job)
+    done = journal.printed_count()
+    pending = journal.pending_tags() if print_remaining else []
+    unregistered = journal.unregistered_tags()
+    stats = PrintRunStats(
+        len(pending),
+        po_number=job.po_number,
+        ri_number=job.item["receive_item_number"],
+        item_id=job.item["item_id"],
+        printer=printer.printer_name,
+        resumed_run=journal.run_id,
+    )
+    result = LabelRunResult("completed", stats, reservation_ids=list(journal.reservation_ids), journal=journal)
+    logging.info(
+        "Resuming print run %s: %d printed tags to register, %d tags to print",
+        journal.run_id, len(unregistered), len(pending),
+    )
+    send_jobs = printer.sends_print_jobs()
+
+    with profiling.profile_run("print_labels"):
+        start = time.perf_counter()
+        report = preflight.run_preflight(job.item, job.inventory_id)
+        stats.record("preflight", time.perf_counter() - start)
+        if not report.ok:
+            return _finish(result, ("preflight_failed", None, "Pre-flight Check Failed", report.message()))
+
+        # Reconcile: the tags already on labels are registered before anything else is printed
+        registrar = StockRegistrar(job, stats, journal)
+        for tag_id in unregistered:
+            if not registrar.register(tag_id):
+                set_tag_id(None)
+                error_msg = (f"Failed to insert tag {tag_id} into database. "
+                             f"{len(registrar.registered)} of {len(unregistered)} printed tags were registered.")
+                result.registered_tags = list(registrar.registered)
+                return _finish(result, ("register_failed", tag_id, "Database Error", error_msg))
+        set_tag_id(None)
+        result.registered_tags = list(registrar.registered)
+        if not pending:
+            return _finish(result, None)
+
+        start = time.perf_counter()
+        reserved, detail = reserve_tags(job, len(pending), pending, renew=journal.reservation_ids)
+        stats.record("reserve", time.perf_counter() - start)
+        if reserved is None:
+            logging.error(detail)
+            return _finish(result, ("reservation_failed", None, "Tag Reservation Error", detail))
+        if reserved != pending or detail != journal.reservation_ids:
+            journal.replace_pending(reserved, detail)
+        result.reservation_ids = detail
+        return _print_tags(job, reserved, result, send_jobs, on_progress, done=done)
+
+
+def _print_tags(job, tag_ids, result, send_jobs, on_progress, done=0):
+    """
+    The print loop of run_label_job, one print job per batch of print_batches; `done`
+    labels were printed before (resumed runs).
+    """
+    journal = result.journal
+    stats = result.stats
+    item = job.item
+    formatted_exp_date = job.exp_date.strftime("%d %b %Y")  # Format for ZPL template
+    serialized = config.PRINT_MODE == "serialized"
+    failure = None  # (status, tag_id, title, message)
+
+    registrar = StockRegistrar(job, stats, journal)
+
+    def printed(batch):
+        if journal is not None:
+            journal.mark_many(batch, run_journal.PRINTED)
+        # Register the printed labels via REST API, in the background
+        for tag_id in batch:
+            registrar.submit(tag_id)
+        stats.label_done(len(batch))
+        result.printed_tags.extend(batch)
+        if on_progress is not None:
+            on_progress(done + len(result.printed_tags), stats)
+
+    batches = deque(print_batches(tag_ids))
+    reprints = {}  # tag_id -> times printed again after a voided encode
+    try:
+        while batches:
+            batch = batches.popleft()
+            if registrar.failed:
+                break  # Stop printing as soon as the backend refuses a tag
+            tag_id = batch[0]
+            set_tag_id(tag_id)
+            stats.labels_started(batch)
+            if send_jobs:
+                with stats.stage("render"):
+                    if serialized:
+                        zpl_filled = generate_serialized_zpl(item, tag_id, len(batch), job.inventory_id, formatted_exp_date)
+                    else:
+                        zpl_filled = generate_label_zpl(item, tag_id, job.inventory_id, formatted_exp_date)
+
+                # Submit print job and check if it succeeds
+                with stats.stage("spool"):
+                    job_id = printer.print_zpl(zpl_filled)
+                if job_id and journal is not None:
+                    journal.mark_many(batch, run_journal.SPOOLED)
+                if not job_id:
+                    title, message = printer.get_print_error() or ("Print Error", f"Could not send tag {tag_id} to the printer.")
+                    failure = ("printer_offline", tag_id, title, message)
+                    break
+
+                with stats.stage("wait"):
+                    job_completed = printer.wait_for_print_completion(job_id)
+                report = printer.get_encode_report(job_id, batch)
+                if report is None and job_completed and not config.ALLOW_UNVERIFIED_ENCODES:
+                    # Nobody checked these encodes: a voided label must not end up registered
+                    if journal is not None:
+                        journal.mark_many(batch, run_journal.VOIDED)
+                    tags = tag_id if len(batch) == 1 else f"{tag_id} to {batch[-1]}"
+                    error_msg = (f"The printer '{printer.printer_name}' cannot report whether the RFID tags were encoded. "
+                                 f"Discard the labels of tag {tags}: they are not registered. "
+                                 f"{len(result.printed_tags)} tags were successfully printed.")
+                    logging.error(error_msg)
+                    failure = ("encode_unverified", tag_id, "RFID Encode Not Verified", error_msg)
+                    break
+                if report is None and job_completed:
+                    # Unverified encodes allowed: the job's completion is trusted
+                    RFID_ENCODES.inc(len(batch), result="unverified")
+                    if stats.context.get("encode_verification") != "unavailable":
+                        stats.context["encode_verification"] = "unavailable"
+                        logging.warning("RFID encode verification unavailable on %s: tags are registered "
+                                        "once their print job completes, without checking the encode", printer.printer_name)
+                if report is not None and (job_completed or report.encode_failed):
+                    verified = set(report.verified)
+                    voided = [tag for tag in batch if tag not in verified]
+                    good = [tag for tag in batch if tag in verified]
+                    RFID_ENCODES.inc(len(good), result="verified")
+                    RFID_ENCODES.inc(report.voided, result="voided")
+                    if good:
+                        printed(good)
+                    if voided:
+                        # Tags the printer could not verify are never registered; print them again
+                        if journal is not None:
+                            journal.mark_many(voided, run_journal.VOIDED)
+                        attempt = reprints.get(voided[0], 0) + 1
+                        if attempt > config.ENCODE_RETRIES:
+                            error_msg = (f"The RFID tag {voided[0]} could not be encoded after {attempt} print jobs. "
+                                         f"{len(result.printed_tags)} tags were successfully printed.")
+                            logging.error(error_msg)
+                            failure = ("encode_failed", voided[0], "RFID Encode Error", error_msg)
+                            break
+                        logging.warning("%d labels voided by the printer, printing tag %s again", len(voided), voided[0])
+                        reprints.update(dict.fromkeys(voided, attempt))
+                        batches.extendleft(reversed(print_batches(voided)))
+                    continue
+                if not job_completed:
+                    # Labels a serialized job printed before stopping are kept; when the printer
+                    # can't tell how many, the whole job is voided rather than registered unprinted
+                    reported = printer.get_labels_printed(job_id) if len(batch) > 1 else 0
+                    count = min(reported or 0, len(batch))
+                    if count:
+                        printed(batch[:count])
+                    if journal is not None:
+                        journal.mark_many(batch[count:], run_journal.VOIDED)
+                    if count < len(batch):
+                        tag_id = batch[count]
+                        error_msg = f"Print job for tag {tag_id} failed. {len(result.printed_tags)} tags were successfully printed."
+                    else:
+                        # Every label of the job came out but the job still failed: no tag to blame
+                        tag_id = None
+                        error_msg = (f"Print job for tags {batch[0]} to {batch[-1]} did not complete after printing all "
+                                     f"{count} labels. {len(result.printed_tags)} tags were successfully printed.")
+                    if reported is None:
+                        error_msg += (f" Discard any label printed with tag IDs {tag_id} to {batch[-1]}: "
+                                      "they are not registered and will be printed again.")
+                    logging.error(error_msg)
+                    failure = ("print_failed", tag_id, "Print Error", error_msg)
+                    break
+
+            printed(batch)
+    finally:
+        set_tag_id(None)
+        registrar.close()
+
+    result.registered_tags.extend(registrar.registered)
+    if registrar.failed:
+        unregistered = len(registrar.failed)
+        if failure is None:
+            tag_id = registrar.failed[0]
+            error_msg = (f"Failed to insert tag {tag_id} into database. "
+                         f"{len(result.registered_tags)} tags were successfully processed.")
+            if unregistered > 1:
+                error_msg += f" {unregistered} printed tags are not registered."
+            failure = ("register_failed", tag_id, "Database Error", error_msg)
+        else:
+            status, tag_id, title, error_msg = failure
+            failure = (status, tag_id, title, f"{error_msg} {unregistered} printed tags are not registered.")
+    return _finish(result, failure)
+
+
+def _finish(result, failure):
+    """
+    Write the run summary and fill in the failure, if any; close the run journal.
+    """
+    if result.journal is not None:
+        result.journal.finish(failure[0] if failure is not None else "completed")
+    if failure is not None:
+        result.status, result.failed_tag, result.error_title, result.error_message = failure
+        if result.status != "preflight_failed":
+            preflight.invalidate()  # Check everything again before the next run
+        result.stats.write_summary(result.status)
+        return result
+    result.stats.write_summary("completed")
+    logging.info("All %d tags printed and processed successfully!", len(result.printed_tags))
+    logging.debug("Successful Tags: %s", result.printed_tags)
+    return result
@@ -1,41 +1,9 @@
-from ui.main_interface import main
-from printer import detect_printers, select_printer
-from config import printer_name
-from database import fetch_po_number, get_err_msg
-from tkinter import messagebox, Tk
+from ui.login_interface import show_login
 import sys
-import auth
 
 if __name__ == "__main__":
-    # Check if user is authenticated before allowing access to any RFID functionality
-    if not auth.is_authenticated():
-        # Import and show login instead of continuing
-        from ui.login_interface import show_login
-        show_login()
-        sys.exit()
-    
-    # Detect available printers
-    available_printers = detect_printers()
-    
-    # Handle printer selection (auto-select if one, show UI if multiple)
-    selected_printer = select_printer(available_printers)
-    
-    # Check if user cancelled printer selection
-    if not selected_printer:
-        messagebox.showinfo("Printer Required", "A printer must be selected to use the application.")
-        sys.exit()
-
-    po_numbers = fetch_po_number()
-    
-    if not po_numbers:
-        root = Tk()
-        root.withdraw()
-        msg = "No Purchase Order available."
-        error_msg = get_err_msg()
-        if error_msg:
-            msg += f"\n{error_msg}"
-        messagebox.showwarning("No PO numbers", msg)
-        root.destroy()
-        sys.exit()
-
-    main(po_numbers)
\ No newline at end of file
+    # Authentication is required before any RFID functionality, so the login window comes first.
+    # Heavy imports, printer discovery and the metrics exporters are started in the background
+    # while it is shown, and the first PO fetch right after login (see startup.py).
+    show_login()
+    sys.exit()
@@ -0,0 +1,285 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Exposition settings, overridable through environment variables.
+# The HTTP endpoint is only started when EVO_METRICS_PORT is set. It binds to localhost unless
+# EVO_METRICS_HOST names another interface (e.g. 0.0.0.0 for a remote Prometheus): it has no
+# authentication, so anyone who can reach that interface can read the metrics (endpoints,
+# API hosts, error and print counts).
+METRICS_PORT = os.environ.get("EVO_METRICS_PORT")
+METRICS_HOST = os.environ.get("EVO_METRICS_HOST", "127.0.0.1")
+METRICS_FILE = os.environ.get("EVO_METRICS_FILE", "metrics.prom")
+METRICS_DUMP_INTERVAL = float(os.environ.get("EVO_METRICS_DUMP_INTERVAL", 60))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter, optionally split by label values.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def total(self):
+        """
+        Sum over all label values.
+        """
+        with self._lock:
+            return sum(self._values.values())
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """
+    Value that can go up and down.
+    """
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed upper bounds, optionally split by label values.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    """
+    Holds all metrics of the process and renders them in Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Application metrics
+API_REQUESTS = REGISTRY.counter(
+    "evo_api_requests_total", "REST API requests by endpoint and HTTP status.", ("method", "endpoint", "status"))
+API_REQUEST_DURATION = REGISTRY.histogram(
+    "evo_api_request_duration_seconds", "REST API request latency.", ("method", "endpoint"))
+PRINT_JOBS = REGISTRY.counter(
+    "evo_print_jobs_total", "Label print jobs by outcome.", ("outcome",))
+PRINT_RUNS = REGISTRY.counter(
+    "evo_print_runs_total", "Print runs by final status.", ("status",))
+PRINT_STAGE_DURATION = REGISTRY.histogram(
+    "evo_print_stage_duration_seconds", "Per-label time spent in each print pipeline stage.", ("stage",))
+RFID_ENCODES = REGISTRY.counter(
+    "evo_rfid_encodes_total", "RFID tags by encode result read back from the printer (verified/voided), or unverified when it can't be read.", ("result",))
+COMPLETION_WAIT_DURATION = REGISTRY.histogram(
+    "evo_print_completion_wait_seconds", "Time spent waiting for a print job to complete.", ("outcome",))
+PREVIEW_RENDER_DURATION = REGISTRY.histogram(
+    "evo_preview_render_seconds", "Label preview render time.", ("result",))
+INPUT_TRIGGERS = REGISTRY.counter(
+    "evo_input_triggers_total", "Input changes asking for a UI task (preview, autocomplete) by source.", ("task", "source"))
+INPUT_RUNS = REGISTRY.counter(
+    "evo_input_runs_total", "UI task runs after coalescing the input changes of a user action.", ("task",))
+INPUT_TRIGGERS_PER_RUN = REGISTRY.histogram(
+    "evo_input_triggers_per_run", "Input changes coalesced into one UI task run.", ("task",),
+    buckets=(1, 2, 3, 5, 10, 20, 50))
+CACHE_REQUESTS = REGISTRY.counter(
+    "evo_cache_requests_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result"))
+START_TIME = REGISTRY.gauge(
+    "evo_process_start_time_seconds", "Start time of the process since the epoch.")
+START_TIME.set(time.time())
+
+
+def record_cache(cache, hit):
+    """
+    Count a cache lookup as a hit or a miss.
+    """
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("Metrics endpoint: " + format, *args)
+
+
+_server = None
+_dump_timer = None
+
+
+def start_http_server(port, host=METRICS_HOST):
+    """
+    Serve /metrics over HTTP from a daemon thread.
+    """
+    global _server
+    if _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+    except OSError as e:
+        logging.error(f"Could not start metrics endpoint on {host}:{port}: {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    if host not in ("127.0.0.1", "localhost", "::1"):
+        logging.warning(f"The metrics endpoint is reachable from other machines on {host}, without authentication")
+    return _server
+
+
+def dump_to_file(path=METRICS_FILE):
+    """
+    Write the current metrics to a file, replacing it atomically.
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(REGISTRY.render())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Could not write metrics to {path}: {e}")
+
+
+def start_file_dump(path=METRICS_FILE, interval=METRICS_DUMP_INTERVAL):
+    """
+    Dump the metrics to a file every `interval` seconds from a daemon timer.
+    """
+    global _dump_timer
+
+    def _tick():
+        global _dump_timer
+        dump_to_file(path)
+        _dump_timer = threading.Timer(interval, _tick)
+        _dump_timer.daemon = True
+        _dump_timer.start()
+
+    if _dump_timer is None and interval > 0:
+        _dump_timer = threading.Timer(interval, _tick)
+        _dump_timer.daemon = True
+        _dump_timer.start()
+
+
+def start_exporters():
+    """
+    Start the exporters enabled by configuration: the periodic file dump always,
+    the HTTP endpoint only when EVO_METRICS_PORT is set.
+    """
+    if METRICS_FILE:
+        start_file_dump()
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
@@ -0,0 +1,172 @@
+"""
+Pre-flight checks of a print run, done in one pass before the first label so problems
+surface before any label is used: printer online, media/ribbon, RFID encode verification,
+session token, API reachability (checked in parallel) and the inventory ID against the
+item's registered list.
+
+Passing printer/session/API checks are cached for PREFLIGHT_TTL seconds so consecutive
+runs skip them; a failed run invalidates the cache.
+"""
+import contextvars
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List
+import config
+import printer
+import session
+from database import api_call, logging
+from metrics import REGISTRY
+
+PREFLIGHT_TTL = float(os.environ.get("EVO_PREFLIGHT_TTL", 30))  # seconds a passing check is reused
+INVENTORY_ID_PATTERN = re.compile(r"^\d{2}-[A-Z]-\d-\d[A-Z]$")
+PING_ENDPOINT = "/api/ewms/accurate/warehouses"
+
+PREFLIGHT_CHECKS = REGISTRY.counter(
+    "evo_preflight_checks_total", "Pre-flight checks by check and result (ok/failed/cached).", ("check", "result"))
+
+
+@dataclass
+class CheckResult:
+    name: str
+    ok: bool
+    message: str = ""
+    elapsed: float = 0.0
+
+
+@dataclass
+class PreflightReport:
+    checks: List[CheckResult] = field(default_factory=list)
+    cached: bool = False
+
+    @property
+    def ok(self):
+        return all(check.ok for check in self.checks)
+
+    @property
+    def problems(self):
+        return [check.message for check in self.checks if not check.ok]
+
+    def message(self):
+        return "Printing was not started:\n\n" + "\n".join(f"- {problem}" for problem in self.problems)
+
+
+def check_printer():
+    if printer.is_printer_online():
+        return CheckResult("printer", True)
+    error = printer.get_print_error()
+    message = error[1] if error else (f"The printer '{printer.printer_name}' is offline. "
+                                      "Please turn it on or check the connection.")
+    return CheckResult("printer", False, message)
+
+
+def check_media():
+    problems = printer.get_media_problems()
+    return CheckResult("media", not problems, " ".join(problems))
+
+
+def check_encode_verification():
+    if not printer.sends_print_jobs() or printer.verifies_encodes() or config.ALLOW_UNVERIFIED_ENCODES:
+        return CheckResult("encode_verification", True)
+    return CheckResult(
+        "encode_verification", False,
+        f"The printer '{printer.printer_name}' is connected through the print spooler, which cannot report "
+        "whether each RFID tag was encoded. Connect it as a network printer (EVO_PRINTER_BACKEND=network, "
+        "EVO_PRINTER_HOST=<its address>).",
+    )
+
+
+def check_token():
+    current = session.current()
+    if current is None:
+        if config.API_TOKEN:
+            return CheckResult("token", True)
+        return CheckResult("token", False, "You are not logged in.")
+    if current.is_valid() or session.refresh(trigger="preflight"):
+        return CheckResult("token", True)
+    return CheckResult("token", False, "Your session has expired. Please log in again.")
+
+
+def check_api():
+    result = api_call("GET", PING_ENDPOINT)
+    if isinstance(result.status, int) and result.status < 500:
+        return CheckResult("api", True)
+    return CheckResult("api", False, f"The eWMS server cannot be reached ({result.status}).")
+
+
+def check_inventory_id(item, inventory_id):
+    if not INVENTORY_ID_PATTERN.match(inventory_id or ""):
+        return CheckResult("inventory_id", False, f"Inventory ID '{inventory_id}' is not in the NN-C-N-NC format.")
+    registered = [str(value).upper() for value in item.get("inventory_id") or []]
+    if registered and inventory_id.upper() not in registered:
+        return CheckResult(
+            "inventory_id", False,
+            f"Inventory ID '{inventory_id}' is not registered for {item.get('sku', item.get('item_id'))} "
+            f"(registered: {', '.join(registered)}).",
+        )
+    return CheckResult("inventory_id", True)
+
+
+# Checks of the station and the connection, cached between runs
+ENVIRONMENT_CHECKS = (check_printer, check_media, check_encode_verification, check_token, check_api)
+
+_cache_lock = threading.Lock()
+_cache = {}  # key -> (checked_at, [CheckResult])
+
+
+def _cache_key():
+    current = session.current()
+    return printer.printer_name, config.BASE_URL, current.username if current else None
+
+
+def invalidate():
+    """
+    Forget the cached results (after a failed run, a printer change or a logout).
+    """
+    with _cache_lock:
+        _cache.clear()
+
+
+def _timed(check):
+    start = time.perf_counter()
+    try:
+        result = check()
+    except Exception as e:
+        logging.error(f"Pre-flight check {check.__name__} failed: {e}")
+        result = CheckResult(check.__name__.replace("check_", ""), False, f"Check failed: {e}")
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def run_preflight(item, inventory_id, use_cache=True):
+    """
+    Run every pre-flight check for printing `item` with `inventory_id` and return the report.
+    """
+    key = _cache_key()
+    report = PreflightReport()
+    with _cache_lock:
+        cached = _cache.get(key)
+    if use_cache and cached is not None and time.monotonic() - cached[0] < PREFLIGHT_TTL:
+        report.checks.extend(cached[1])
+        report.cached = True
+    else:
+        with ThreadPoolExecutor(max_workers=len(ENVIRONMENT_CHECKS), thread_name_prefix="preflight") as executor:
+            # Each check keeps the caller's log context (run_id)
+            futures = [executor.submit(contextvars.copy_context().run, _timed, check) for check in ENVIRONMENT_CHECKS]
+            report.checks.extend(future.result() for future in futures)
+        if report.ok:
+            with _cache_lock:
+                _cache[key] = (time.monotonic(), list(report.checks))
+    report.checks.append(check_inventory_id(item, inventory_id))
+
+    for check in report.checks:
+        result = "cached" if report.cached and check.name != "inventory_id" else ("ok" if check.ok else "failed")
+        PREFLIGHT_CHECKS.inc(check=check.name, result=result)
+    if report.ok:
+        logging.info("Pre-flight checks passed%s", " (cached)" if report.cached else "")
+    else:
+        logging.warning("Pre-flight checks failed: %s", "; ".join(report.problems))
+    return report
@@ -0,0 +1,204 @@
+"""
+Label previews rendered ahead of time, so switching items on the item screen shows
+the preview at once instead of waiting for a render.
+
+Previews are kept by what is printed on the label: the item, the expiry date and the
+inventory ID. The item screen asks for the preview it shows (rendered before anything
+else) and queues the other items of the PO behind it, first visible first. Changing the
+date or the inventory ID only changes the keys asked for: previews of other inputs stay
+cached and queued renders nobody needs any more are dropped. Renders run on
+config.PREVIEW_WORKERS threads; the config.PREVIEW_CACHE_SIZE most recently used
+previews are kept.
+
+Labelary is a public web service: with it only config.PREVIEW_REMOTE_PREFETCH previews
+are rendered ahead (the rows the item list shows), one every
+config.PREVIEW_REMOTE_INTERVAL seconds. The preview shown is never held back.
+"""
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+
+import config
+from database import logging
+from metrics import PREVIEW_RENDER_DURATION, record_cache
+
+
+def preview_key(item, formatted_exp_date, inventory_id):
+    """
+    The fields of the label that a preview depends on (the tag ID is a sample).
+    """
+    return (item["item_id"], item["sku"], item["item_name"], formatted_exp_date, inventory_id)
+
+
+def renders_remotely():
+    """
+    True when previews are rendered by the Labelary web service.
+    """
+    return config.PREVIEW_RENDERER != "local"
+
+
+def render_preview(item, formatted_exp_date, inventory_id):
+    """
+    Render the preview image of one label of `item`, with a sample tag ID.
+    """
+    from label_pipeline import generate_label_zpl, generate_tag_ids
+    from zpl import render_zpl_preview, render_zpl_preview_local
+    tag_id = generate_tag_ids(1)[0]
+    render = render_zpl_preview if renders_remotely() else render_zpl_preview_local
+    return render(generate_label_zpl(item, tag_id, inventory_id, formatted_exp_date))
+
+
+class PreviewCache:
+    """
+    Preview images (PIL) by preview_key, rendered by `render(item, formatted_exp_date,
+    inventory_id)` on worker threads started on first use. At most `prefetch_limit`
+    previews are rendered ahead, starting one every `prefetch_interval` seconds.
+    """
+
+    def __init__(self, render=render_preview, workers=None, capacity=None, prefetch_limit=None,
+                 prefetch_interval=None):
+        self._render = render
+        self.workers = workers or config.PREVIEW_WORKERS
+        self.capacity = capacity or config.PREVIEW_CACHE_SIZE
+        remote = render is render_preview and renders_remotely()
+        if prefetch_limit is None:
+            prefetch_limit = config.PREVIEW_REMOTE_PREFETCH if remote else self.capacity
+        if prefetch_interval is None:
+            prefetch_interval = config.PREVIEW_REMOTE_INTERVAL if remote else 0.0
+        self.prefetch_limit = min(prefetch_limit, self.capacity)
+        self.prefetch_interval = prefetch_interval
+        self._next_prefetch = 0.0  # time.monotonic() from which the next render ahead may start
+        self._images = OrderedDict()  # key -> image, least recently used first
+        self._queue = deque()  # (key, args) to render, next first
+        self._queued = set()
+        self._rendering = set()
+        self._waiters = {}  # key -> callbacks of request()
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def get(self, item, formatted_exp_date, inventory_id):
+        """
+        The cached preview, or None.
+        """
+        key = preview_key(item, formatted_exp_date, inventory_id)
+        with self._cond:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+        record_cache("preview", image is not None)
+        return image
+
+    def request(self, item, formatted_exp_date, inventory_id, on_ready):
+        """
+        Return the cached preview, or None after queueing its render ahead of the others;
+        `on_ready(key, image)` is then called from a worker thread when it is done
+        (image None if the render failed).
+        """
+        image = self.get(item, formatted_exp_date, inventory_id)
+        if image is not None:
+            return image
+        key = preview_key(item, formatted_exp_date, inventory_id)
+        with self._cond:
+            self._waiters.setdefault(key, []).append(on_ready)
+            if key not in self._rendering:
+                if key in self._queued:
+                    self._queue = deque(entry for entry in self._queue if entry[0] != key)
+                self._queue.appendleft((key, (item, formatted_exp_date, inventory_id)))
+                self._queued.add(key)
+                self._start_workers()
+                self._cond.notify()
+        return None
+
+    def prefetch(self, items, formatted_exp_date, inventory_id):
+        """
+        Queue the previews of `items` (in render order) with these inputs, replacing the
+        renders queued by an earlier prefetch. Cached previews are skipped, and at most
+        `prefetch_limit` are queued (never more than `capacity`, so the first ones are not
+        evicted by the last).
+        """
+        with self._cond:
+            self._queue = deque(entry for entry in self._queue if entry[0] in self._waiters)
+            self._queued = {key for key, _ in self._queue}
+            for item in items:
+                if len(self._queue) >= self.prefetch_limit:
+                    break
+                key = preview_key(item, formatted_exp_date, inventory_id)
+                if key not in self._images and key not in self._queued and key not in self._rendering:
+                    self._queue.append((key, (item, formatted_exp_date, inventory_id)))
+                    self._queued.add(key)
+            if self._queue:
+                self._start_workers()
+                self._cond.notify_all()
+
+    def pending(self):
+        """
+        Number of renders queued or in progress.
+        """
+        with self._cond:
+            return len(self._queue) + len(self._rendering)
+
+    def _start_workers(self):
+        # Called with the lock held
+        while len(self._threads) < self.workers:
+            context = contextvars.copy_context()
+            thread = threading.Thread(target=context.run, args=(self._run,),
+                                      name=f"preview-{len(self._threads) + 1}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    while not self._queue:
+                        self._cond.wait()
+                    key, args = self._queue[0]
+                    # Renders ahead are spaced out; a preview someone waits for goes at once
+                    delay = 0.0 if key in self._waiters else self._next_prefetch - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                self._queue.popleft()
+                self._queued.discard(key)
+                self._rendering.add(key)
+                if key not in self._waiters:
+                    self._next_prefetch = time.monotonic() + self.prefetch_interval
+
+            start = time.perf_counter()
+            try:
+                image = self._render(*args)
+            except Exception as e:
+                logging.error(f"Failed to render the preview of item {key[0]}: {e}")
+                image = None
+            PREVIEW_RENDER_DURATION.observe(time.perf_counter() - start, result="ok" if image is not None else "error")
+
+            with self._cond:
+                self._rendering.discard(key)
+                if image is not None:
+                    self._images[key] = image
+                    self._images.move_to_end(key)
+                    while len(self._images) > self.capacity:
+                        self._images.popitem(last=False)
+                else:
+                    # The renderer is failing (offline, rate limited): stop rendering ahead
+                    self._queue = deque(entry for entry in self._queue if entry[0] in self._waiters)
+                    self._queued = {queued_key for queued_key, _ in self._queue}
+                waiters = self._waiters.pop(key, [])
+            for on_ready in waiters:
+                on_ready(key, image)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_preview_cache():
+    """
+    The preview cache shared by the item screens (labels don't depend on the PO).
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PreviewCache()
+        return _cache
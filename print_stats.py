@@ -0,0 +1,221 @@
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from database import logging
+from app_logging import run_id_var
+from metrics import PRINT_RUNS, PRINT_STAGE_DURATION
+
+# Stages of a print run, in pipeline order: "preflight" and "reserve" once per run, the others
+# per label ("register" runs in the background, next to the printing of the following labels)
+STAGES = ("preflight", "reserve", "render", "spool", "wait", "register")
+
+# Human readable stage names for the progress window
+STAGE_LABELS = {
+    "preflight": "Checks",
+    "reserve": "Reserve",
+    "render": "ZPL",
+    "spool": "Spool",
+    "wait": "Printer",
+    "register": "API",
+}
+
+# File where one JSON summary record per print run is appended
+RUN_SUMMARY_FILE = "print_runs.jsonl"
+
+
+class PrintRunStats:
+    """
+    Collects per-stage timings for a print run and derives throughput,
+    ETA and a rolling breakdown of where the time goes.
+    """
+
+    def __init__(self, total, window=20, **context):
+        self.total = total
+        self.context = context
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._current = {}
+        self._recent = deque(maxlen=window)
+        self._recent_background = deque(maxlen=window)  # (stage, seconds) of background work
+        self._totals = dict.fromkeys(STAGES, 0.0)
+        self._max = dict.fromkeys(STAGES, 0.0)
+        self.label_seconds = []  # time of each completed label in the timed stages (render, spool, wait)
+        self.label_latencies = []  # wall time of each registered label, from its first render to its registration
+        self._label_started = {}  # tag_id -> perf_counter when its label was started
+        self.completed = 0
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time one stage of the label currently being processed.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._current[name] = self._current.get(name, 0.0) + elapsed
+
+    def record(self, name, elapsed, per_label=False):
+        """
+        Add the time of a stage that is not part of a label's critical path (the tag ID
+        reservation, background registration) to the run totals. With `per_label` it is
+        the time of one label and also counts in the rolling breakdown, but not in the ETA.
+        """
+        with self._lock:
+            self._totals[name] = self._totals.get(name, 0.0) + elapsed
+            self._max[name] = max(self._max.get(name, 0.0), elapsed)
+            if per_label:
+                self._recent_background.append((name, elapsed))
+        PRINT_STAGE_DURATION.observe(elapsed, stage=name)
+
+    def labels_started(self, tag_ids):
+        """
+        Note the start of the labels of `tag_ids`; a label printed again keeps its first start.
+        """
+        now = time.perf_counter()
+        with self._lock:
+            for tag_id in tag_ids:
+                self._label_started.setdefault(tag_id, now)
+
+    def label_registered(self, tag_id):
+        """
+        Close the end-to-end latency of a label started with labels_started.
+        """
+        now = time.perf_counter()
+        with self._lock:
+            started = self._label_started.pop(tag_id, None)
+            if started is not None:
+                self.label_latencies.append(now - started)
+
+    def label_done(self, count=1):
+        """
+        Close the timings of the current label and add them to the run. With `count`
+        labels printed by one job (serialized printing) the timings are shared among them.
+        """
+        with self._lock:
+            for name, elapsed in self._current.items():
+                self._totals[name] = self._totals.get(name, 0.0) + elapsed
+                self._max[name] = max(self._max.get(name, 0.0), elapsed / count)
+                PRINT_STAGE_DURATION.observe(elapsed, stage=name)
+            per_label = {name: elapsed / count for name, elapsed in self._current.items()}
+            for _ in range(count):
+                self._recent.append(per_label)
+                self.label_seconds.append(sum(per_label.values()))
+            self._current = {}
+            self.completed += count
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def labels_per_minute(self):
+        elapsed = self.elapsed()
+        return self.completed * 60.0 / elapsed if elapsed > 0 else 0.0
+
+    def eta_seconds(self):
+        """
+        Estimate the remaining time from the recent per-label average.
+        """
+        remaining = self.total - self.completed
+        if remaining <= 0:
+            return 0.0
+        with self._lock:
+            recent = list(self._recent)
+        if recent:
+            per_label = sum(sum(timings.values()) for timings in recent) / len(recent)
+        elif self.completed:
+            per_label = self.elapsed() / self.completed
+        else:
+            return None
+        return per_label * remaining
+
+    def breakdown(self):
+        """
+        Return the share of time spent in each stage over the rolling window, background
+        registration included.
+        """
+        with self._lock:
+            recent = list(self._recent)
+            background = list(self._recent_background)
+        sums = dict.fromkeys(STAGES, 0.0)
+        for timings in recent:
+            for name, elapsed in timings.items():
+                sums[name] = sums.get(name, 0.0) + elapsed
+        for name, elapsed in background:
+            sums[name] = sums.get(name, 0.0) + elapsed
+        total = sum(sums.values())
+        if not total:
+            return {}
+        return {name: value / total for name, value in sums.items() if value}
+
+    def rate_text(self):
+        eta = self.eta_seconds()
+        eta_text = "--:--" if eta is None else time.strftime("%M:%S", time.gmtime(eta))
+        if eta is not None and eta >= 3600:
+            eta_text = time.strftime("%H:%M:%S", time.gmtime(eta))
+        return f"{self.labels_per_minute():.1f} labels/min  |  ETA {eta_text}"
+
+    def breakdown_text(self):
+        breakdown = self.breakdown()
+        if not breakdown:
+            return ""
+        return "  ".join(
+            f"{STAGE_LABELS.get(name, name)} {share * 100:.0f}%"
+            for name, share in breakdown.items()
+        )
+
+    def summary(self, status):
+        """
+        Build the structured summary record of the run.
+        """
+        with self._lock:
+            totals = dict(self._totals)
+            maxima = dict(self._max)
+        completed = self.completed
+        elapsed = self.elapsed()
+        stages = {
+            name: {
+                "total_s": round(totals[name], 4),
+                "avg_ms": round(totals[name] * 1000 / completed, 2) if completed else None,
+                "max_ms": round(maxima[name] * 1000, 2),
+            }
+            for name in totals if totals[name]
+        }
+        return {
+            "type": "print_run",
+            "run_id": run_id_var.get(),
+            "status": status,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "duration_s": round(elapsed, 3),
+            "requested": self.total,
+            "completed": completed,
+            "labels_per_min": round(self.labels_per_minute(), 2),
+            "bottleneck": max(totals, key=totals.get) if any(totals.values()) else None,
+            "stages": stages,
+            **self.context,
+        }
+
+    def write_summary(self, status, path=None):
+        """
+        Log the summary record and append it to the run summary file.
+        """
+        path = path or RUN_SUMMARY_FILE
+        record = self.summary(status)
+        PRINT_RUNS.inc(status=status)
+        line = json.dumps(record, default=str)
+        logging.info(
+            "Print run summary: %s, %d/%d labels, %.1f labels/min",
+            status, record["completed"], record["requested"], record["labels_per_min"],
+            extra={"data": record},
+        )
+        try:
+            with open(path, "a", encoding="utf-8") as summary_file:
+                summary_file.write(line + "\n")
+        except OSError as e:
+            logging.warning(f"Could not write print run summary to {path}: {e}")
+        return record
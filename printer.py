@@ -1,23 +1,76 @@
+import contextvars
+import os
+import re
 import time
 from tkinter import messagebox, ttk
 import tkinter as tk
 import config
 from database import logging
+from app_logging import log_sampled, truncate
+from metrics import PRINT_JOBS, COMPLETION_WAIT_DURATION
+from profiling import profiled
 import platform
 
 # Global variable to store printer name
 printer_name = None
 
-# Function to auto-detect Zebra printers (Cross-platform)
-def detect_printers():
-    global printer_name
-    
+# Job status poll interval for the emulated printer; finer than the spooler's so
+# benchmarks measure the printer rather than the polling
+EMULATOR_POLL_INTERVAL = float(os.environ.get("EVO_EMULATOR_POLL_INTERVAL", 0.05))
+
+def uses_emulator():
+    """
+    True when print jobs go to the emulated printer (config.PRINTER_BACKEND = "emulator").
+    """
+    return config.PRINTER_BACKEND == "emulator"
+
+def uses_network():
+    """
+    True when print jobs go straight to a network printer (config.PRINTER_BACKEND = "network").
+    """
+    return config.PRINTER_BACKEND == "network"
+
+def verifies_encodes():
+    """
+    True when the backend reads the RFID encode result of every label back from the
+    printer; the Windows spooler port is send-only.
+    """
+    return uses_emulator() or uses_network()
+
+def sends_print_jobs():
+    """
+    True when labels are actually sent to a printer: the Windows spooler, a network printer
+    or the emulator. Elsewhere printing is only simulated in the log.
+    """
+    return platform.system() == "Windows" or uses_emulator() or uses_network()
+
+# Encode result reporting (~RVE) is only useful where the replies are read
+_ENCODE_REPORTING = re.compile(r"[\^~]RV[ED]?[ \t]*\r?\n?")
+
+def strip_encode_reporting(zpl_data):
+    """
+    Remove the ~RV commands of a job sent where nothing reads the printer's replies.
+    """
+    return _ENCODE_REPORTING.sub("", zpl_data)
+
+# Function to auto-detect Zebra printers (Cross-platform), without any UI so it can run in a background thread
+def discover_printers():
     system_os = platform.system()
     logging.info(f"Running on {system_os} - detecting printers")
     
     zebra_printers = []
     
-    if system_os == "Windows":
+    if uses_emulator():
+        from printer_emulator import get_emulator
+        zebra_printers = [get_emulator().name]
+
+    elif uses_network():
+        from printer_network import get_network_printer
+        zebra_printers = [get_network_printer().name] if config.PRINTER_HOST else []
+        if not config.PRINTER_HOST:
+            logging.error("EVO_PRINTER_BACKEND=network needs EVO_PRINTER_HOST (the printer's address)")
+
+    elif system_os == "Windows":
         # Windows-specific printer detection
         try:
             import win32print  # type: ignore
@@ -29,9 +82,14 @@ def detect_printers():
             
             if not zebra_printers:
                 # Also try WMI for more comprehensive detection
-                c = wmi.WMI()
-                wmi_printers = c.Win32_Printer()
-                zebra_printers = [printer.Name for printer in wmi_printers if "zebra" in printer.Name.lower()]
+                import pythoncom  # type: ignore
+                pythoncom.CoInitialize()  # Discovery runs on a background thread
+                try:
+                    c = wmi.WMI()
+                    wmi_printers = c.Win32_Printer()
+                    zebra_printers = [printer.Name for printer in wmi_printers if "zebra" in printer.Name.lower()]
+                finally:
+                    pythoncom.CoUninitialize()  # Clean up COM
                 
         except ImportError:
             logging.warning("Windows printer libraries not available. Install pywin32 and wmi for Windows support.")
@@ -52,6 +110,14 @@ def detect_printers():
         zebra_printers = ["Virtual Zebra Printer (Cross-platform)"]
     
     logging.info(f"Found Zebra Printers: {zebra_printers}")
+    return zebra_printers
+
+# Function to auto-detect Zebra printers, falling back to a virtual printer when none is found
+def detect_printers(zebra_printers=None):
+    global printer_name
+
+    if zebra_printers is None:
+        zebra_printers = discover_printers()
 
     if not zebra_printers:
         messagebox.showwarning("No Printers", "No Zebra printers found. Using virtual printer for demo.")
@@ -61,7 +127,12 @@ def detect_printers():
     return zebra_printers
 
 # Function to show printer selection dialog and return selected printer
-def select_printer(available_printers):
+def select_printer(available_printers, on_selected=None):
+    """
+    Select the Zebra printer to use: automatically when there is at most one, otherwise
+    on the printer selection screen. `on_selected(printer_name)` is called once a printer
+    is selected; returns the printer name when it was selected automatically.
+    """
     global printer_name
     
     # Check if user is authenticated before allowing access to printer selection
@@ -74,37 +145,48 @@ def select_printer(available_printers):
     
     if not available_printers:
         printer_name = "Virtual Zebra Printer"
-        return printer_name
-
-    if len(available_printers) == 1:
+    elif len(available_printers) == 1:
         printer_name = available_printers[0]  # Automatically select the only available Zebra printer
         logging.info(f"Auto-selected Zebra printer: {printer_name}")
-        return printer_name
+    else:
+        # If multiple Zebra printers are found, prompt the user to select one
+        from ui import app_shell
+        app_shell.show_screen(
+            "printer_selection",
+            build_printer_screen,
+            "Generate RFID Tag (Select Printer)",
+            args=(available_printers, on_selected),
+        )
+        return None
+
+    if on_selected:
+        on_selected(printer_name)
+    return printer_name
+
+def build_printer_screen(screen, available_printers, on_selected=None):
+    """
+    Build the printer selection screen into the `screen` frame of the app shell.
+    """
+    callbacks = {"on_selected": on_selected}
 
-    # If multiple Zebra printers are found, prompt the user to select one
     def on_select_printer(selected):
         global printer_name
         printer_name = selected.get()
         logging.info(f"User selected Zebra printer: {printer_name}")
-        printer_window.destroy()
+        if callbacks["on_selected"]:
+            callbacks["on_selected"](printer_name)
 
-    printer_window = tk.Tk()
+    def refresh_printers(new_printers, new_on_selected=None):
+        """Show the newly discovered printers when returning to the cached screen"""
+        callbacks["on_selected"] = new_on_selected
+        dropdown["values"] = new_printers
+        if selected_printer.get() not in new_printers:
+            selected_printer.set(new_printers[0])
 
-    window_width = 700
-    window_height = 650
-    result = config.center_window(printer_window, window_width, window_height, "Generate RFID Tag (Select Printer)", show_menu=True)
-
-    # Configure background to match main window
-    printer_window.configure(bg=config.BACKGROUND_COLOR)
-    
-    # Connect menu button functionality if menu was created
-    if result and isinstance(result, tuple) and len(result) == 2:
-        title_bar, menu_button = result
-        from ui.login_interface import show_logout_menu
-        menu_button.config(command=lambda: show_logout_menu(printer_window, menu_button))
+    screen.refresh = refresh_printers
     
     # Main container with padding
-    main_container = tk.Frame(printer_window, bg=config.BACKGROUND_COLOR)
+    main_container = tk.Frame(screen, bg=config.BACKGROUND_COLOR)
     main_container.pack(fill='both', expand=True, padx=50, pady=50)
     
     # Printer Selection Card
@@ -162,9 +244,6 @@ def select_printer(available_printers):
         **config.BUTTON_STYLE
     )
     select_button.pack(side=tk.RIGHT)
-    printer_window.mainloop()
-
-    return printer_name
 
 # Simulated printer status check for Linux/Replit
 def can_print_to_printer():
@@ -172,7 +251,10 @@ def can_print_to_printer():
     system_os = platform.system()
     try:
     ###
-        if system_os == "Windows":
+        if uses_emulator():
+            from printer_emulator import get_emulator
+            return get_emulator().is_online()
+        elif system_os == "Windows":
             import win32print  # type: ignore
             import wmi  # type: ignore
             # Try to open the printer for printing
@@ -197,12 +279,37 @@ def can_print_to_printer():
         logging.error(f"Cannot print to '{printer_name}': {e}")
         return False
 
+# Why the last print_zpl/is_printer_online call of the current thread failed, as (title, message);
+# print jobs run off the UI thread, so the caller decides how to show it
+_last_error = contextvars.ContextVar("print_last_error", default=None)
+
+def get_print_error():
+    """
+    Return (title, message) describing the last printer error in the current thread, or None.
+    """
+    return _last_error.get()
+
 # Function to check whether printer is online (simulated)
 def is_printer_online():
     system_os = platform.system()
     try:
     ###
-        if system_os == "Windows":
+        if uses_emulator():
+            from printer_emulator import get_emulator
+            if get_emulator().is_online():
+                log_sampled(logging.INFO, "printer_online", 100, "Emulated printer '%s' is online.", printer_name)
+                return True
+            logging.error(f"Emulated printer '{printer_name}' is offline.")
+            return False
+        elif uses_network():
+            from printer_network import get_network_printer
+            if get_network_printer().host_status()["paused"]:
+                _last_error.set(("Printer Paused", f"The printer '{printer_name}' is paused. Press its pause button to resume."))
+                logging.error(f"Printer '{printer_name}' is paused.")
+                return False
+            log_sampled(logging.INFO, "printer_online", 100, "Network printer '%s' is online.", printer_name)
+            return True
+        elif system_os == "Windows":
             import win32print  # type: ignore
             import wmi  # type: ignore
             # Try to open the printer for printing            
@@ -212,8 +319,7 @@ def is_printer_online():
 
             status = printer_status["Status"]
             attributes = printer_status["Attributes"]
-            logging.info(f"Printer Status: {status} ({bin(status)})")
-            logging.info(f"Printer Attributes: {attributes} ({bin(attributes)})")
+            logging.debug("Printer Status: %s (%s), Attributes: %s (%s)", status, bin(status), attributes, bin(attributes))
 
             # Define known online attributes
             ONLINE_ATTRIBUTES = (
@@ -237,32 +343,96 @@ def is_printer_online():
                 logging.error(f"Printer '{printer_name}' has attributes indicating offline status.")
                 return False
 
-            logging.info(f"Printer '{printer_name}' is online.")
+            log_sampled(logging.INFO, "printer_online", 100, "Printer '%s' is online.", printer_name)
             return True            
         else:
             # macOS or other OS .Linux/Replit printer detection (simulation for cloud environment)
-            logging.info(f"Simulated printer '{printer_name}' is online.")
+            log_sampled(logging.INFO, "printer_online", 100, "Simulated printer '%s' is online.", printer_name)
             return True
     except Exception as e:
         error_message = f"Failed to check printer status: {e}"
-        messagebox.showerror("Printer Error", error_message)
+        _last_error.set(("Printer Error", error_message))
         logging.error(error_message)
         return False
    
+# Function to check media, ribbon and print head before a print run
+def get_media_problems():
+    """
+    Return the list of media/ribbon problems reported by the printer (empty when it is ready to print).
+    """
+    system_os = platform.system()
+    try:
+        if uses_emulator():
+            from printer_emulator import get_emulator
+            status = get_emulator().media_status()
+            problems = []
+            if status["paper_out"]:
+                problems.append("The printer is out of labels.")
+            if status["ribbon_out"]:
+                problems.append("The printer is out of ribbon.")
+            if status["head_open"]:
+                problems.append("The print head is open.")
+            return problems
+        elif uses_network():
+            from printer_network import get_network_printer
+            status = get_network_printer().host_status()
+            checks = (
+                ("paper_out", "The printer is out of labels."),
+                ("ribbon_out", "The printer is out of ribbon."),
+                ("head_open", "The print head is open."),
+            )
+            return [message for name, message in checks if status[name]]
+        elif system_os == "Windows":
+            import win32print  # type: ignore
+            hprinter = win32print.OpenPrinter(printer_name)
+            try:
+                status = win32print.GetPrinter(hprinter, 2)["Status"]
+            finally:
+                win32print.ClosePrinter(hprinter)
+            checks = (
+                (win32print.PRINTER_STATUS_PAPER_OUT, "The printer is out of labels."),
+                (win32print.PRINTER_STATUS_PAPER_JAM, "The labels are jammed."),
+                (win32print.PRINTER_STATUS_PAPER_PROBLEM, "The printer reports a media problem."),
+                (win32print.PRINTER_STATUS_NO_TONER, "The printer is out of ribbon."),
+                (win32print.PRINTER_STATUS_DOOR_OPEN, "The print head or cover is open."),
+                (win32print.PRINTER_STATUS_USER_INTERVENTION, "The printer needs attention."),
+            )
+            return [message for flag, message in checks if status & flag]
+        else:
+            # Simulation: no media to run out of
+            return []
+    except Exception as e:
+        logging.error(f"Failed to check printer media status: {e}")
+        return [f"Failed to check printer media status: {e}"]
+
 # Function to send ZPL data to the printer (Cross-platform)
 def print_zpl(zpl_data):
     system_os = platform.system()
     # Check printer status
+    _last_error.set(None)
     if not is_printer_online():
-        messagebox.showerror(
-            "Printer Offline",
-            "The printer is currently offline. Please turn it on or check the connection."
-        )
+        PRINT_JOBS.inc(outcome="offline")
+        if _last_error.get() is None:
+            _last_error.set((
+                "Printer Offline",
+                "The printer is currently offline. Please turn it on or check the connection."
+            ))
         return None
     try:
-        if system_os == "Windows":
+        if uses_emulator():
+            from printer_emulator import get_emulator
+            job_id = get_emulator().submit(zpl_data)
+            logging.debug("Print job %s sent to the emulated printer (%d bytes).", job_id, len(zpl_data))
+            return job_id
+        elif uses_network():
+            from printer_network import get_network_printer
+            job_id = get_network_printer().submit(zpl_data)
+            logging.debug("Print job %s sent to '%s' (%d bytes).", job_id, printer_name, len(zpl_data))
+            return job_id
+        elif system_os == "Windows":
             import win32print  # type: ignore
             import wmi  # type: ignore
+            zpl_data = strip_encode_reporting(zpl_data)  # Nothing reads the replies through the spooler
             # Open a handle to the printer
             hprinter = win32print.OpenPrinter(printer_name)
             try:
@@ -270,35 +440,44 @@ def print_zpl(zpl_data):
                 hjob = win32print.StartDocPrinter(hprinter, 1, ("ZPL Print Job", "", "RAW"))
                 if hjob == 0:
                     logging.error("Failed to start printer job.")
+                    _last_error.set(("Print Error", "Failed to start printer job."))
+                    PRINT_JOBS.inc(outcome="spool_error")
                     return None
                 win32print.StartPagePrinter(hprinter)
                 win32print.WritePrinter(hprinter, zpl_data.encode('utf-8'))
                 win32print.EndPagePrinter(hprinter)
                 win32print.EndDocPrinter(hprinter)
-                logging.info(f"Print job {hjob} sent successfully.")
+                logging.debug("Print job %s sent successfully (%d bytes).", hjob, len(zpl_data))
                 return hjob  # Return the print job ID for tracking
             finally:
                 # Close the printer handle
                 win32print.ClosePrinter(hprinter)        
         else:   
             # Simulation mode (Linux, macOS, or Windows fallback)
-            logging.info("=== SIMULATED PRINT JOB ===")
-            logging.info(f"Printer: {printer_name}")
-            logging.info(f"ZPL Data Length: {len(zpl_data)} characters")
-            logging.info("ZPL Content Preview:")
-            logging.info(zpl_data[:200] + "..." if len(zpl_data) > 200 else zpl_data)
-            logging.info("=== END PRINT JOB ===")
-            
             # Simulate a job ID
             job_id = int(time.time() * 1000) % 100000
-            logging.info(f"Simulated print job {job_id} sent successfully.")
+            logging.debug("Simulated print job %s to '%s' (%d characters): %s",
+                          job_id, printer_name, len(zpl_data), truncate(zpl_data))
+            log_sampled(logging.INFO, "print_zpl", 50, "Simulated print job %s sent successfully.", job_id)
             return job_id            
     except Exception as e:
-        messagebox.showerror("Print Error", f"Failed to print: {e}")
+        PRINT_JOBS.inc(outcome="spool_error")
+        logging.error(f"Failed to print: {e}")
+        _last_error.set(("Print Error", f"Failed to print: {e}"))
         return None  
 
-# Function to wait for print job completion using simulation
+# Function to wait for print job completion, recording the wait duration and job outcome
+@profiled("wait_for_print_completion")
 def wait_for_print_completion(job_id, max_unknown_retries=5, poll_interval=0.5):
+    start = time.perf_counter()
+    completed = _wait_for_job(job_id, max_unknown_retries, poll_interval)
+    outcome = "completed" if completed else "failed"
+    COMPLETION_WAIT_DURATION.observe(time.perf_counter() - start, outcome=outcome)
+    PRINT_JOBS.inc(outcome=outcome)
+    return completed
+
+# Function to wait for print job completion using simulation
+def _wait_for_job(job_id, max_unknown_retries=5, poll_interval=0.5):
     """
     Waits until the print job is completed, removed from the queue, or encounters an error.
     Uses WMI to track job status on Windows, simulates on other platforms.
@@ -312,12 +491,18 @@ def wait_for_print_completion(job_id, max_unknown_retries=5, poll_interval=0.5):
         bool: True if the job completed successfully, False otherwise.
     """
     system_os = platform.system()
+
+    if uses_emulator():
+        return _wait_for_emulated_job(job_id, poll_interval=min(poll_interval, EMULATOR_POLL_INTERVAL))
+
+    if uses_network():
+        from printer_network import get_network_printer
+        return get_network_printer().wait(job_id, poll_interval=poll_interval)
     
     if system_os != "Windows":
         # Simulate completion on non-Windows systems
-        logging.info(f"Simulating completion of print job {job_id}")
         time.sleep(1)  # Brief simulation delay
-        logging.info(f"Simulated print job {job_id} completed successfully.")
+        logging.debug("Simulated print job %s completed successfully.", job_id)
         return True
     
     try:
@@ -331,7 +516,7 @@ def wait_for_print_completion(job_id, max_unknown_retries=5, poll_interval=0.5):
         c = wmi.WMI()
 
         # logging.info(f"Monitoring print job {job_id}...")
-        logging.info(f"Monitoring print job {job_id} on printer '{printer_name}'...")
+        logging.debug("Monitoring print job %s on printer '%s'...", job_id, printer_name)
 
         unknown_status_count = 0  # Counter for UNKNOWN status
 
@@ -341,7 +526,7 @@ def wait_for_print_completion(job_id, max_unknown_retries=5, poll_interval=0.5):
                 if str(job.JobId) == str(job_id):  # Ensure JobId matches
                     job_found = True
                     job_status = str(job.JobStatus).lower() if job.JobStatus else ""
-                    logging.info(f"Print job {job_id} - Status: {job.Status}, Job_Status: {job_status}")
+                    logging.debug("Print job %s - Status: %s, Job_Status: %s", job_id, job.Status, job_status)
 
                     if job.Status is None or "unknown" in str(job.Status).lower():
                         unknown_status_count += 1
@@ -359,7 +544,7 @@ def wait_for_print_completion(job_id, max_unknown_retries=5, poll_interval=0.5):
                         continue
 
                     if job_status == "completed":
-                        logging.info(f"Print job {job_id} completed successfully.")
+                        logging.debug("Print job %s completed successfully.", job_id)
                         return True
                     elif job_status ==  "deleted":
                         logging.warning(f"Print job {job_id} was deleted.")
@@ -368,10 +553,10 @@ def wait_for_print_completion(job_id, max_unknown_retries=5, poll_interval=0.5):
                         logging.error(f"Print job {job_id} encountered an error: {job_status}")
                         return False
                     elif "printing" in job_status:
-                        logging.info(f"Print job {job_id} is currently printing...")
+                        logging.debug("Print job %s is currently printing...", job_id)
                         time.sleep(poll_interval)
                     else:
-                        logging.info(f"Print job {job_id} is in an intermediate state: {job_status}")
+                        logging.debug("Print job %s is in an intermediate state: %s", job_id, job_status)
                         time.sleep(poll_interval)
 
             # If the print job is no longer in the queue, check if the printer itself is IDLE
@@ -382,7 +567,7 @@ def wait_for_print_completion(job_id, max_unknown_retries=5, poll_interval=0.5):
                 printer = next((p for p in c.Win32_Printer() if p.Name and p.Name.lower() == printer_name.lower()), None)
                 if printer:
                     if printer.PrinterStatus == 3:  # 3 = Idle
-                        logging.info(f"Printer '{printer.Name}' is idle. Assuming job {job_id} is complete.")
+                        logging.debug("Printer '%s' is idle. Assuming job %s is complete.", printer.Name, job_id)
                         return True  # Printer is idle, assume job is done
                     else:
                         logging.warning(f"Printer '{printer.Name}' status: {printer.PrinterStatus} - Waiting...")
@@ -398,13 +583,88 @@ def wait_for_print_completion(job_id, max_unknown_retries=5, poll_interval=0.5):
 
     finally:
         pythoncom.CoUninitialize()  # Clean up COM
-        logging.info(f"Stopped monitoring print job {job_id}.")
+        logging.debug("Stopped monitoring print job %s.", job_id)
+
+def _wait_for_emulated_job(job_id, poll_interval=EMULATOR_POLL_INTERVAL):
+    """
+    Waits for a job of the emulated printer, reading the same status strings as the WMI loop above.
+    """
+    from printer_emulator import get_emulator, PRINTER_IDLE
+    emulator = get_emulator()
+    while True:
+        state = emulator.job_status(job_id)
+        if state is None:
+            # Not in the queue: assume it is done once the printer is idle
+            if emulator.printer_status() == PRINTER_IDLE:
+                logging.debug("Emulated printer is idle. Assuming job %s is complete.", job_id)
+                return True
+        else:
+            job_status = state[1].lower()
+            if job_status == "completed":
+                logging.debug("Print job %s completed successfully.", job_id)
+                return True
+            elif job_status == "deleted":
+                logging.warning(f"Print job {job_id} was deleted.")
+                return False
+            elif "error" in job_status:
+                logging.error(f"Print job {job_id} encountered an error: {job_status}")
+                return False
+        time.sleep(poll_interval)
+
+class EncodeReport:
+    """
+    RFID encode results of a print job read back from the printer (~RVE).
+    """
+
+    def __init__(self, verified, voided=0, encode_failed=False):
+        self.verified = list(verified)  # EPCs written and verified, in print order
+        self.voided = voided  # labels voided because their encode failed
+        self.encode_failed = encode_failed  # the job stopped on an encode error
+
+def get_encode_report(job_id, tag_ids=()):
+    """
+    Encode results of a finished job printing `tag_ids`, None when the printer can't
+    report them (the Windows spooler port is send-only, see verifies_encodes).
+    """
+    report = None
+    if uses_emulator():
+        from printer_emulator import get_emulator
+        report = get_emulator().encode_report(job_id)
+    elif uses_network():
+        from printer_network import get_network_printer
+        report = get_network_printer().encode_report(job_id, tag_ids)
+    if report is not None:
+        return EncodeReport(report["verified"], report["voided"], report["encode_failed"])
+    return None
+
+def get_labels_printed(job_id):
+    """
+    Number of labels a job printed before it stopped, None when the printer can't tell
+    (the Windows spooler only reports the job as a whole).
+    """
+    if uses_emulator():
+        from printer_emulator import get_emulator
+        return get_emulator().labels_printed_by(job_id)
+    if uses_network():
+        from printer_network import get_network_printer
+        return get_network_printer().labels_printed_by(job_id)
+    return None
 
 def cancel_print_job(job_id):
     """
     Cancels a specific print job using win32print on Windows, simulates on other platforms.
     """
     system_os = platform.system()
+
+    if uses_emulator():
+        from printer_emulator import get_emulator
+        return get_emulator().cancel(job_id)
+
+    if uses_network():
+        # The printer can only cancel its whole buffer (~JA)
+        from printer_network import get_network_printer
+        get_network_printer().cancel_all()
+        return True
     
     if system_os != "Windows":
         logging.info(f"Simulating cancellation of print job {job_id}")
@@ -463,6 +723,16 @@ def clear_all_print_jobs():
     Clears all print jobs from the queue using win32print on Windows, simulates on other platforms.
     """
     system_os = platform.system()
+
+    if uses_emulator():
+        from printer_emulator import get_emulator
+        get_emulator().clear()
+        return True
+
+    if uses_network():
+        from printer_network import get_network_printer
+        get_network_printer().cancel_all()
+        return True
     
     if system_os != "Windows":
         logging.info("Simulated: All print jobs cleared successfully.")
@@ -0,0 +1,516 @@
+"""
+Emulated Zebra RFID printer, used as a printer backend when EVO_PRINTER_BACKEND=emulator.
+
+Parses the ZPL it receives (including ^DF/^XF stored formats with ^FN fields and
+^SF/^SN serialized fields), prints the labels at a configurable feed rate, encodes RFID tags with a configurable failure
+rate (honoring ^RR retries and ^RS error handling), reports the encode results of each
+job once ~RVE enables them (like a real printer) and reports job status with the
+same status strings as the Windows print queue, so the real printing pipeline can be
+run and measured on machines without a printer.
+"""
+import logging
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Optional
+
+EMULATOR_NAME = "Emulated Zebra ZD621R"
+
+LABELS_PER_SECOND = float(os.environ.get("EVO_EMULATOR_LPS", 4.0))
+RFID_ERROR_RATE = float(os.environ.get("EVO_EMULATOR_RFID_ERROR_RATE", 0.0))  # per encode attempt
+EMULATOR_SEED = os.environ.get("EVO_EMULATOR_SEED")
+
+# Win32_Printer.PrinterStatus values reported by printer_status()
+PRINTER_IDLE = 3
+PRINTER_PRINTING = 4
+
+
+def tokenize(zpl):
+    """
+    Split ZPL into (command, parameters) pairs, e.g. ("FD", "LA,1234"). The ^A font
+    command keeps the font name in its parameters ("A", "0N,17,23").
+    """
+    if isinstance(zpl, bytes):
+        zpl = zpl.decode("utf-8", errors="replace")
+    positions = [match.start() for match in re.finditer(r"[\^~]", zpl)]
+    commands = []
+    for index, start in enumerate(positions):
+        end = positions[index + 1] if index + 1 < len(positions) else len(zpl)
+        token = zpl[start + 1:end]
+        if not token:
+            continue
+        name_length = 1 if token[0].upper() == "A" and token[:2] != "A@" else 2
+        name = token[:name_length].upper()
+        params = token[name_length:]
+        # Parameters end at the line break, except for field data
+        if name != "FD":
+            params = params.split("\n", 1)[0].strip()
+        commands.append((name, params))
+    return commands
+
+
+def split_formats(commands):
+    """
+    Group commands into ^XA ... ^XZ formats.
+    """
+    formats, current = [], None
+    for name, params in commands:
+        if name == "XA":
+            current = []
+        elif name == "XZ":
+            if current is not None:
+                formats.append(current)
+            current = None
+        elif current is not None:
+            current.append((name, params))
+    return formats
+
+
+def _decode_field_data(data, hex_indicator):
+    if hex_indicator is None:
+        return data
+    pattern = re.escape(hex_indicator) + r"([0-9A-Fa-f]{2})"
+    return re.sub(pattern, lambda match: chr(int(match.group(1), 16)), data)
+
+
+@dataclass
+class Field:
+    """
+    One ^FD field of a label: its position, field number (^FN), data and kind
+    ("text", "qr", "barcode" or "rfid").
+    """
+    x: int = 0
+    y: int = 0
+    number: Optional[int] = None
+    data: str = ""
+    kind: str = "text"
+    rfid_block: Optional[int] = None  # For ^RFW writes: starting block and memory bank
+    rfid_bank: str = "1"  # 1 = EPC
+    serial_mask: Optional[str] = None  # ^SF/^SN: characters incremented on each label
+    serial_increment: str = "1"
+
+
+# ^SF mask characters: the alphabet of each serialized position, % leaves it unchanged
+_SERIAL_ALPHABETS = {
+    "D": "0123456789",
+    "H": "0123456789ABCDEF",
+    "O": "01234567",
+    "A": "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+    "N": "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+}
+
+
+def serialize(data, mask, increment="1", steps=1):
+    """
+    The data of a ^SF field after `steps` labels: the positions of `mask` (right-aligned
+    with the data) count as one number that is incremented by `increment` per label and
+    wraps around, the other positions are kept.
+    """
+    mask = mask[-len(data):] if len(mask) > len(data) else mask
+    offset = len(data) - len(mask)
+    positions = []  # (index in data, alphabet), least significant first
+    for index in range(len(data) - 1, offset - 1, -1):
+        alphabet = _SERIAL_ALPHABETS.get(mask[index - offset].upper())
+        if alphabet is not None:
+            positions.append((index, alphabet))
+    if not positions:
+        return data
+
+    def value_of(text, text_offset):
+        value, weight = 0, 1
+        for index, alphabet in positions:
+            position = index - text_offset
+            char = text[position].upper() if 0 <= position < len(text) else alphabet[0]
+            value += alphabet.index(char) * weight if char in alphabet else 0
+            weight *= len(alphabet)
+        return value, weight
+
+    current, modulus = value_of(data, 0)
+    step, _ = value_of(increment, len(data) - len(increment))
+    value = (current + step * steps) % modulus
+    chars = list(data)
+    for index, alphabet in positions:
+        value, digit = divmod(value, len(alphabet))
+        char = alphabet[digit]
+        chars[index] = char.lower() if data[index].islower() else char
+    return "".join(chars)
+
+
+def parse_fields(commands):
+    """
+    Extract the fields defined by a list of commands.
+    """
+    fields = []
+    current = Field()
+    hex_indicator = None
+    for name, params in commands:
+        if name in ("FO", "FT"):
+            parts = params.split(",")
+            try:
+                current.x, current.y = int(parts[0] or 0), int(parts[1] or 0)
+            except (ValueError, IndexError):
+                pass
+        elif name == "FN":
+            try:
+                current.number = int(params.split('"')[0] or 0)
+            except ValueError:
+                pass
+        elif name == "FH":
+            hex_indicator = params[:1] or "_"
+        elif name == "BQ":
+            current.kind = "qr"
+        elif name[0] == "B" and name not in ("BY",):
+            current.kind = "barcode"
+        elif name == "RF":
+            parts = params.split(",")
+            if parts and parts[0].upper().startswith("W"):
+                current.kind = "rfid"
+                try:
+                    current.rfid_block = int(parts[2]) if len(parts) > 2 and parts[2] else 0
+                except ValueError:
+                    current.rfid_block = 0
+                current.rfid_bank = parts[4] if len(parts) > 4 and parts[4] else "1"
+        elif name == "FD":
+            current.data = _decode_field_data(params, hex_indicator)
+        elif name == "SF":
+            parts = params.split(",")
+            current.serial_mask = parts[0]
+            current.serial_increment = parts[1] if len(parts) > 1 and parts[1] else "1"
+        elif name == "SN":
+            # ^SNv,n,z: the start value replaces ^FD and its digits are incremented
+            parts = params.split(",")
+            current.data = parts[0]
+            current.serial_mask = "".join("D" if char.isdigit() else "%" for char in parts[0])
+            current.serial_increment = parts[1] if len(parts) > 1 and parts[1] else "1"
+        elif name == "FS":
+            if current.data or current.number is not None:
+                fields.append(current)
+            current = Field()
+            hex_indicator = None
+    return fields
+
+
+@dataclass
+class Label:
+    fields: list
+    epc: Optional[str] = None  # Data written to the EPC bank
+
+    def text(self):
+        return [f.data for f in self.fields if f.kind == "text"]
+
+
+@dataclass
+class PrintJob:
+    job_id: int
+    data: bytes
+    status: str = "OK"  # Win32_PrintJob.Status
+    job_status: str = "Spooling"  # Win32_PrintJob.JobStatus
+    submitted_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+    labels: list = field(default_factory=list)
+    labels_printed: int = 0
+    labels_voided: int = 0
+    encode_failed: bool = False  # stopped on an RFID encode error (^RS ...E)
+    error: Optional[str] = None
+
+
+class EmulatedPrinter:
+    """
+    Single-queue printer: jobs are processed one after the other by a worker thread.
+    """
+
+    def __init__(self, labels_per_second=LABELS_PER_SECOND, rfid_error_rate=RFID_ERROR_RATE, seed=EMULATOR_SEED,
+                 name=EMULATOR_NAME, media_labels=None):
+        self.name = name
+        self.labels_per_second = labels_per_second
+        self.rfid_error_rate = rfid_error_rate
+        self.media_labels = media_labels  # None = endless roll
+        self.online = True
+        self.head_open = False
+        self.ribbon_out = False
+        self.rng = random.Random(seed)
+        self.stored_formats = {}  # name -> commands
+        self.rfid_retries = 0  # ^RR
+        self.rfid_error_handling = "N"  # ^RS parameter 5: N (no action), P (pause) or E (error)
+        self.rfid_verify_reporting = False  # ~RVE: encode results are reported to the host
+        self.jobs = {}
+        self.queue = []
+        self.encoded_tags = []
+        self.bytes_received = 0
+        self.labels_printed = 0
+        self.labels_voided = 0
+        self._next_job_id = 1
+        self._busy = False
+        self._condition = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name="printer-emulator", daemon=True)
+        self._worker.start()
+
+    # Print queue interface (mirrors what printer.py reads from WMI)
+
+    def is_online(self):
+        return self.online
+
+    def submit(self, zpl_data):
+        """
+        Spool a raw ZPL job and return its job ID.
+        """
+        data = zpl_data.encode("utf-8") if isinstance(zpl_data, str) else bytes(zpl_data)
+        with self._condition:
+            job = PrintJob(job_id=self._next_job_id, data=data)
+            self._next_job_id += 1
+            self.jobs[job.job_id] = job
+            self.queue.append(job)
+            self.bytes_received += len(data)
+            self._condition.notify_all()
+        return job.job_id
+
+    def job_status(self, job_id):
+        """
+        (Status, JobStatus) of a job like Win32_PrintJob, None if the job is unknown.
+        """
+        job = self.jobs.get(int(job_id))
+        if job is None:
+            return None
+        return job.status, job.job_status
+
+    def printer_status(self):
+        """
+        Win32_Printer.PrinterStatus: 3 (idle) or 4 (printing).
+        """
+        return PRINTER_PRINTING if self._busy or self.queue else PRINTER_IDLE
+
+    def media_status(self):
+        """
+        Media, ribbon and print head state, like the ~HS host status of a real printer.
+        """
+        return {
+            "paper_out": self.media_labels is not None and self.media_labels <= 0,
+            "labels_left": self.media_labels,
+            "ribbon_out": self.ribbon_out,
+            "head_open": self.head_open,
+        }
+
+    def encode_report(self, job_id):
+        """
+        RFID encode results of a job, like the ~RV replies of a printer after ~RVE: the EPCs
+        written and verified in print order, the voided label count and whether the job
+        stopped on an encode error. None if reporting is off or the job is unknown.
+        """
+        job = self.jobs.get(int(job_id))
+        if job is None or not self.rfid_verify_reporting:
+            return None
+        return {
+            "verified": [label.epc for label in job.labels if label.epc],
+            "voided": job.labels_voided,
+            "encode_failed": job.encode_failed,
+        }
+
+    def labels_printed_by(self, job_id):
+        """
+        Labels a job printed so far, None if the job is unknown.
+        """
+        job = self.jobs.get(int(job_id))
+        return None if job is None else job.labels_printed
+
+    def cancel(self, job_id):
+        """
+        Delete a job that hasn't started printing. Returns False if it is unknown or already printing.
+        """
+        with self._condition:
+            job = self.jobs.get(int(job_id))
+            if job is None or job not in self.queue:
+                return False
+            self.queue.remove(job)
+            job.job_status = "Deleted"
+            self._condition.notify_all()
+            return True
+
+    def clear(self):
+        """
+        Delete every job waiting in the queue.
+        """
+        with self._condition:
+            for job in self.queue:
+                job.job_status = "Deleted"
+            self.queue.clear()
+            self._condition.notify_all()
+
+    def wait_idle(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self.queue or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def reset_stats(self):
+        with self._condition:
+            self.encoded_tags = []
+            self.bytes_received = 0
+            self.labels_printed = 0
+            self.labels_voided = 0
+
+    # Job processing
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self.queue:
+                    self._condition.wait()
+                job = self.queue.pop(0)
+                self._busy = True
+            try:
+                self._process(job)
+            except Exception as e:
+                logging.exception("Emulated printer failed on job %s", job.job_id)
+                job.status, job.job_status, job.error = "Error", "Error", str(e)
+            finally:
+                job.finished_at = time.monotonic()
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _process(self, job):
+        job.job_status = "Printing"
+        for commands in split_formats(tokenize(job.data)):
+            names = {name for name, _ in commands}
+            self._apply_settings(commands)
+            if "DF" in names:
+                self._store_format(commands)
+                continue
+            if not ("XF" in names or any(name == "FD" for name in names)):
+                continue  # Settings only
+            for label in self._labels_for(commands):
+                if not self._print_label(job, label):
+                    return
+        job.job_status = "Completed"
+
+    def _apply_settings(self, commands):
+        for name, params in commands:
+            parts = params.split(",")
+            if name == "RR":
+                try:
+                    self.rfid_retries = int(parts[0] or 0)
+                except ValueError:
+                    pass
+            elif name == "RS" and len(parts) > 4 and parts[4]:
+                self.rfid_error_handling = parts[4].upper()
+            elif name == "RV":
+                self.rfid_verify_reporting = params.strip().upper().startswith("E")
+
+    def _store_format(self, commands):
+        name, params = next((name, params) for name, params in commands if name == "DF")
+        format_name = params.strip()
+        definition = [command for command in commands if command[0] != "DF"]
+        self.stored_formats[format_name] = definition
+
+    def _labels_for(self, commands):
+        """
+        Build the labels of a printable format, recalling a stored format with ^XF and
+        filling its ^FN fields, printed ^PQ times.
+        """
+        recalled = next((params.strip() for name, params in commands if name == "XF"), None)
+        own_fields = parse_fields(commands)
+        if recalled is not None:
+            definition = self.stored_formats.get(recalled)
+            if definition is None:
+                raise ValueError(f"Stored format {recalled} not found")
+            values = {f.number: f for f in own_fields if f.number is not None}
+            fields = parse_fields(definition)
+            for f in fields:
+                if f.number in values:
+                    f.data = values[f.number].data
+                    f.serial_mask = values[f.number].serial_mask or f.serial_mask
+                    f.serial_increment = values[f.number].serial_increment
+            fields += [f for f in own_fields if f.number is None]
+        else:
+            fields = own_fields
+
+        quantity = 1
+        for name, params in commands:
+            if name == "PQ":
+                try:
+                    quantity = max(1, int(params.split(",")[0] or 1))
+                except ValueError:
+                    pass
+        if not any(f.serial_mask for f in fields):
+            return [Label(fields=fields) for _ in range(quantity)]
+        # Serialized fields: each label of the batch gets the next value
+        return [
+            Label(fields=[
+                replace(f, data=serialize(f.data, f.serial_mask, f.serial_increment, copy)) if f.serial_mask else f
+                for f in fields
+            ])
+            for copy in range(quantity)
+        ]
+
+    def _feed(self):
+        if self.labels_per_second > 0:
+            time.sleep(1.0 / self.labels_per_second)
+
+    def _print_label(self, job, label):
+        """
+        Encode and print one label, voiding labels whose encoding fails and retrying
+        up to ^RR times. Returns False when the job stops with an error.
+        """
+        rfid_fields = [f for f in label.fields if f.kind == "rfid"]
+        attempts = 1 + self.rfid_retries if rfid_fields else 1
+        for attempt in range(attempts):
+            if self.media_labels is not None:
+                if self.media_labels <= 0:
+                    job.status, job.job_status, job.error = "Error", "Error - Paper Out", "media out"
+                    return False
+                self.media_labels -= 1
+            self._feed()
+            if rfid_fields and self.rng.random() < self.rfid_error_rate:
+                # Failed encode: the label is voided and the next one is tried
+                job.labels_voided += 1
+                with self._condition:
+                    self.labels_voided += 1
+                continue
+            # The EPC itself starts at block 2 of the EPC bank (blocks 0-1 hold CRC and PC bits)
+            epc = next((f.data for f in rfid_fields if f.rfid_bank == "1" and f.rfid_block == 2), None)
+            label.epc = epc
+            job.labels.append(label)
+            job.labels_printed += 1
+            with self._condition:
+                self.labels_printed += 1
+                if epc:
+                    self.encoded_tags.append(epc)
+            return True
+
+        job.error = f"RFID encode failed after {attempts} attempts"
+        if self.rfid_error_handling == "E":
+            job.encode_failed = True
+            job.status, job.job_status = "Error", "Error - RFID encode failed"
+            return False
+        return True  # N/P: the printer carries on with the next label
+
+
+_emulator = None
+_emulator_lock = threading.Lock()
+
+
+def get_emulator():
+    """
+    The process-wide emulated printer, configured from the EVO_EMULATOR_* variables.
+    """
+    global _emulator
+    with _emulator_lock:
+        if _emulator is None:
+            _emulator = EmulatedPrinter()
+        return _emulator
+
+
+def set_emulator(emulator):
+    """
+    Replace the process-wide emulated printer (e.g. with one configured by a benchmark).
+    """
+    global _emulator
+    with _emulator_lock:
+        _emulator = emulator
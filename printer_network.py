@@ -0,0 +1,257 @@
+"""
+Zebra printer on the network, used as a printer backend when EVO_PRINTER_BACKEND=network.
+
+Print jobs are sent as raw ZPL to the printer's TCP port (9100 by default) instead of the
+Windows spooler, because the spooler port is send-only: on the same connection the printer
+answers ~HS host status queries and, once ~RVE enables it, reports the RFID encode result
+of every label (_+,n_ for a verified tag, _-,n_ for a voided label, n being the encode
+attempts). Those replies are what tells which tags of a job may be registered.
+"""
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+NETWORK_PORT = int(os.environ.get("EVO_PRINTER_PORT", 9100))
+CONNECT_TIMEOUT = float(os.environ.get("EVO_PRINTER_CONNECT_TIMEOUT", 5))  # seconds
+JOB_TIMEOUT = float(os.environ.get("EVO_PRINTER_JOB_TIMEOUT", 30))  # seconds per job, plus LABEL_TIMEOUT per label
+LABEL_TIMEOUT = float(os.environ.get("EVO_PRINTER_LABEL_TIMEOUT", 5))
+STATUS_INTERVAL = 2.0  # seconds between ~HS queries while waiting for a job
+
+ENCODE_RESULT = re.compile(rb"_([+-]),(\d+)_")
+STATUS_FRAME = re.compile(rb"\x02([^\x02\x03]*)\x03")
+QUANTITY = re.compile(r"\^PQ(\d+)")
+
+
+def labels_in(zpl):
+    """
+    Labels a ZPL job prints: the sum of its ^PQ quantities (1 without any).
+    """
+    return sum(int(quantity) for quantity in QUANTITY.findall(zpl)) or 1
+
+
+def parse_host_status(frames):
+    """
+    Parse the three ~HS strings (without STX/ETX) into the flags the app uses.
+    """
+    first, second = frames[0].decode("ascii", "replace").split(","), frames[1].decode("ascii", "replace").split(",")
+    return {
+        "paper_out": first[1] == "1",
+        "paused": first[2] == "1",
+        "head_open": second[2] == "1",
+        "ribbon_out": second[3] == "1",
+        "labels_remaining": int(second[8]) if second[8].strip().isdigit() else None,
+    }
+
+
+@dataclass
+class NetworkJob:
+    job_id: int
+    labels: int  # labels the job prints
+    verified: int = 0
+    voided: int = 0
+    encode_failed: bool = False  # a label could not be encoded: the job stopped (^RS ...E)
+    error: Optional[str] = None
+
+    @property
+    def done(self):
+        return self.verified >= self.labels or self.encode_failed or self.error is not None
+
+
+class NetworkPrinter:
+    """
+    One connection to a network Zebra printer, shared by the print runs of this process.
+    """
+
+    def __init__(self, host, port=NETWORK_PORT):
+        self.host = host
+        self.port = port
+        self.name = f"Zebra {host}:{port}"
+        self._socket = None
+        self._buffer = b""
+        self._jobs = {}  # job_id -> NetworkJob, in submission order
+        self._status_frames = []
+        self._next_job_id = 1
+        self._lock = threading.RLock()
+
+    def _connect(self):
+        if self._socket is None:
+            self._socket = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT)
+            self._buffer = b""
+            # Encode results are reported on this connection for every label from now on
+            self._socket.sendall(b"~RVE\r\n")
+        return self._socket
+
+    def _disconnect(self, reason):
+        if self._socket is not None:
+            logging.warning(f"Connection to printer {self.name} lost: {reason}")
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+            self._socket = None
+        # Results of jobs in progress can't be read any more
+        for job in self._jobs.values():
+            if not job.done:
+                job.error = f"connection lost: {reason}"
+
+    def _send(self, data):
+        try:
+            self._connect().sendall(data)
+        except OSError as e:
+            self._disconnect(e)
+            raise
+
+    def _read(self, timeout):
+        """
+        Read what the printer sent within `timeout` seconds and dispatch it.
+        """
+        sock = self._connect()
+        sock.settimeout(timeout)
+        try:
+            data = sock.recv(4096)
+        except socket.timeout:
+            return
+        except OSError as e:
+            self._disconnect(e)
+            return
+        if not data:
+            self._disconnect("closed by the printer")
+            return
+        self._buffer += data
+        while True:
+            result, frame = ENCODE_RESULT.search(self._buffer), STATUS_FRAME.search(self._buffer)
+            match = min((m for m in (result, frame) if m), key=lambda m: m.start(), default=None)
+            if match is None:
+                break
+            self._buffer = self._buffer[match.end():]
+            if match is frame:
+                self._status_frames.append(match.group(1))
+            else:
+                self._record_result(match.group(1) == b"+")
+
+    def _record_result(self, verified):
+        job = next((job for job in self._jobs.values() if not job.done), None)
+        if job is None:
+            logging.warning(f"Printer {self.name} reported an encode result for no pending job")
+            return
+        if verified:
+            job.verified += 1
+        else:
+            job.voided += 1
+            job.encode_failed = True
+
+    def submit(self, zpl):
+        """
+        Send a job and return its ID (local to this connection).
+        """
+        with self._lock:
+            job = NetworkJob(self._next_job_id, labels_in(zpl))
+            self._next_job_id += 1
+            self._send(zpl.encode("utf-8"))
+            self._jobs[job.job_id] = job
+            # Keep the results of the recent jobs only
+            while len(self._jobs) > 100:
+                self._jobs.pop(next(iter(self._jobs)))
+            return job.job_id
+
+    def host_status(self, timeout=CONNECT_TIMEOUT):
+        """
+        The printer's ~HS host status (see parse_host_status). Raises OSError when it doesn't answer.
+        """
+        with self._lock:
+            self._status_frames = []
+            self._send(b"~HS\r\n")
+            deadline = time.monotonic() + timeout
+            while len(self._status_frames) < 3:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._socket is None:
+                    raise OSError(f"printer {self.name} did not answer the host status query")
+                self._read(remaining)
+            return parse_host_status(self._status_frames)
+
+    def wait(self, job_id, poll_interval=0.5):
+        """
+        Wait until every label of the job is encoded and verified. False when a label was
+        voided, the printer reports a media problem, the connection drops or it times out.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            deadline = time.monotonic() + JOB_TIMEOUT + LABEL_TIMEOUT * job.labels
+            next_status = time.monotonic() + STATUS_INTERVAL
+            while not job.done:
+                now = time.monotonic()
+                if now >= deadline:
+                    job.error = "timed out"
+                    break
+                if now >= next_status:
+                    next_status = now + STATUS_INTERVAL
+                    try:
+                        status = self.host_status()
+                    except OSError as e:
+                        job.error = str(e)
+                        break
+                    problem = next((name for name in ("paper_out", "head_open", "ribbon_out") if status[name]), None)
+                    if problem:
+                        job.error = problem.replace("_", " ")
+                        break
+                    continue
+                self._read(min(poll_interval, deadline - now))
+            if job.error:
+                logging.error(f"Print job {job_id} on {self.name} failed: {job.error}")
+            return job.verified >= job.labels
+
+    def encode_report(self, job_id, tag_ids):
+        """
+        Encode results of a job printing `tag_ids`: the verified tags (labels are encoded in
+        print order and a voided label stops the job), the voided count and whether the job
+        stopped on an encode error. None for an unknown job.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {
+                "verified": list(tag_ids)[:job.verified],
+                "voided": job.voided,
+                "encode_failed": job.encode_failed,
+            }
+
+    def labels_printed_by(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else job.verified
+
+    def cancel_all(self):
+        """
+        Cancel every job in the printer's buffer (~JA).
+        """
+        with self._lock:
+            self._send(b"~JA\r\n")
+            for job in self._jobs.values():
+                if not job.done:
+                    job.error = "cancelled"
+
+
+_printer = None
+_printer_lock = threading.Lock()
+
+
+def get_network_printer(host=None, port=None):
+    """
+    The process-wide network printer at config.PRINTER_HOST (or `host`).
+    """
+    global _printer
+    import config
+    host = host or config.PRINTER_HOST
+    port = port or NETWORK_PORT
+    with _printer_lock:
+        if _printer is None or (_printer.host, _printer.port) != (host, port):
+            _printer = NetworkPrinter(host, port)
+        return _printer
@@ -0,0 +1,223 @@
+"""
+Opt-in profiling of the print and preview hot paths.
+
+Spans: functions wrapped with @profiled (print_labels, update_preview, api_request,
+wait_for_print_completion) are timed into the evo_profile_span_seconds histogram and,
+inside a profiled run, summed into a per-run breakdown that is logged at the end.
+Sampling: a profiled run (profile_run) can also sample the stack of its thread and write
+the result as folded stacks (flamegraph.pl / speedscope) next to app.log.
+
+Enabled with EVO_PROFILE=spans (timing only) or EVO_PROFILE=sample (timing and sampling
+profile), or from the Profiling entry of the menu. Disabled, a wrapped call costs one
+global lookup.
+"""
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from app_logging import LOG_FILE, run_id_var
+from metrics import REGISTRY
+
+MODES = ("off", "spans", "sample")
+SAMPLE_INTERVAL = float(os.environ.get("EVO_PROFILE_INTERVAL", 0.005))  # seconds between stack samples
+MAX_STACK_DEPTH = 64
+
+PROFILE_SPAN_DURATION = REGISTRY.histogram(
+    "evo_profile_span_seconds", "Duration of profiled spans (only recorded while profiling).", ("span",))
+
+
+def _mode_from_env(value):
+    value = (value or "").strip().lower()
+    if value in ("1", "true", "yes", "on", "spans"):
+        return "spans"
+    if value == "sample":
+        return "sample"
+    return "off"
+
+
+_mode = _mode_from_env(os.environ.get("EVO_PROFILE"))
+_enabled = _mode != "off"
+_runs_lock = threading.Lock()
+_active_runs = []  # span collectors of the profiled runs in progress
+
+
+def get_mode():
+    return _mode
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_mode(mode):
+    """
+    Switch profiling to "off", "spans" or "sample" at runtime (menu or tests).
+    """
+    global _mode, _enabled
+    if mode not in MODES:
+        raise ValueError(f"unknown profiling mode {mode!r}, expected one of {MODES}")
+    _mode = mode
+    _enabled = mode != "off"
+    logging.info("Profiling mode set to %s", mode)
+
+
+class SpanCollector:
+    """
+    Count, total and maximum duration of each span of one profiled run.
+    """
+
+    def __init__(self):
+        self.spans = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, elapsed):
+        with self._lock:
+            entry = self.spans.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+
+    def summary(self):
+        with self._lock:
+            return {
+                name: {"count": count, "total_ms": round(total * 1000, 2), "max_ms": round(maximum * 1000, 2)}
+                for name, (count, total, maximum) in sorted(self.spans.items(), key=lambda span: -span[1][1])
+            }
+
+
+def _record(name, elapsed):
+    PROFILE_SPAN_DURATION.observe(elapsed, span=name)
+    if _active_runs:
+        with _runs_lock:
+            collectors = list(_active_runs)
+        for collector in collectors:
+            collector.add(name, elapsed)
+
+
+@contextmanager
+def span(name):
+    """
+    Time the block as the span `name` when profiling is enabled.
+    """
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start)
+
+
+def profiled(name):
+    """
+    Decorator timing every call of the function as the span `name` when profiling is enabled.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.splitext(os.path.basename(code.co_filename))[0]}:{code.co_name}"
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread from a daemon thread and counts the folded stacks.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None and len(names) < MAX_STACK_DEPTH:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def write_folded(self, path):
+        """
+        Write "frame;frame;frame count" lines, the input format of flamegraph.pl and speedscope.
+        """
+        with open(path, "w", encoding="utf-8") as folded_file:
+            for stack, count in self.stacks.most_common():
+                folded_file.write(f"{stack} {count}\n")
+
+
+def profile_path(name, run_id=None):
+    """
+    Path of the folded-stacks file of a profiled run, in the directory of the log file.
+    """
+    directory = os.path.dirname(os.path.abspath(LOG_FILE))
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    suffix = f"-{run_id}" if run_id else ""
+    return os.path.join(directory, f"profile-{name}-{stamp}{suffix}.folded")
+
+
+@contextmanager
+def profile_run(name):
+    """
+    Profile a whole run (e.g. a print run): time it as a span, log the breakdown of the
+    spans inside it and, in "sample" mode, write a sampling profile of the calling thread.
+    """
+    if not _enabled:
+        yield
+        return
+    collector = SpanCollector()
+    with _runs_lock:
+        _active_runs.append(collector)
+    sampler = StackSampler(threading.get_ident()).start() if _mode == "sample" else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _runs_lock:
+            _active_runs.remove(collector)
+        _record(name, elapsed)
+        record = {"type": "profile", "span": name, "run_id": run_id_var.get(),
+                  "duration_ms": round(elapsed * 1000, 2), "spans": collector.summary()}
+        if sampler is not None:
+            sampler.stop()
+            path = profile_path(name, run_id_var.get())
+            try:
+                sampler.write_folded(path)
+                record["profile"] = path
+                record["samples"] = sampler.samples
+            except OSError as e:
+                logging.warning(f"Could not write the profile of {name} to {path}: {e}")
+        logging.info("Profile of %s: %.1f ms", name, elapsed * 1000, extra={"data": record})
@@ -0,0 +1,214 @@
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+import requests
+import urllib3
+from metrics import REGISTRY
+
+# Retry policy, overridable through environment variables
+MAX_ATTEMPTS = int(os.environ.get("EVO_API_MAX_ATTEMPTS", 4))
+BACKOFF_BASE = float(os.environ.get("EVO_API_BACKOFF_BASE", 0.5))  # seconds
+BACKOFF_CAP = float(os.environ.get("EVO_API_BACKOFF_CAP", 8.0))  # seconds
+RETRY_BUDGET = float(os.environ.get("EVO_API_RETRY_BUDGET", 30.0))  # max seconds spent on one call
+
+# Circuit breaker settings
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("EVO_BREAKER_FAILURES", 5))
+BREAKER_RESET_TIMEOUT = float(os.environ.get("EVO_BREAKER_RESET_TIMEOUT", 30.0))  # seconds
+
+# Statuses worth retrying; for non-idempotent calls only those where the server did not process the request
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+NOT_PROCESSED_STATUS = {429, 503}
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+API_RETRIES = REGISTRY.counter(
+    "evo_api_retries_total", "REST API retries by endpoint and reason.", ("endpoint", "reason"))
+BREAKER_STATE = REGISTRY.gauge(
+    "evo_circuit_breaker_state", "Circuit breaker state per host (0=closed, 1=half-open, 2=open).", ("host",))
+BREAKER_REJECTED = REGISTRY.counter(
+    "evo_circuit_breaker_rejected_total", "Calls failed fast because the circuit was open.", ("host",))
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """
+    Raised instead of calling a host whose circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker: opens after consecutive failures, lets a single
+    trial call through after the reset timeout and closes again on success.
+    """
+
+    def __init__(self, host, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        BREAKER_STATE.set(0, host=host)
+
+    def _set_state(self, state):
+        if state != self.state:
+            logging.warning("Circuit breaker for %s: %s -> %s", self.host, self.state, state)
+            self.state = state
+            BREAKER_STATE.set(_STATE_VALUES[state], host=self.host)
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+        BREAKER_REJECTED.inc(host=self.host)
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def retry_in(self):
+        """
+        Seconds until the breaker lets a trial call through (0 when closed).
+        """
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def snapshot(self):
+        return {"state": self.state, "failures": self.failures, "retry_in": round(self.retry_in(), 1)}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(host):
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+        return breaker
+
+
+def breaker_states():
+    """
+    Current state of every circuit breaker, keyed by host.
+    """
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.host: breaker.snapshot() for breaker in breakers}
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """
+    Exponential backoff with full jitter for the given (zero-based) retry attempt.
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after_seconds(response):
+    """
+    Parse the Retry-After header (delta seconds or HTTP date), None if absent or invalid.
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def _request_not_sent(error):
+    """
+    True when the connection failed before the request could be sent.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+def send_with_retry(send, breaker, endpoint, idempotent=True, max_attempts=MAX_ATTEMPTS, budget=RETRY_BUDGET):
+    """
+    Call `send()` (which performs one HTTP request and returns the response) with
+    retries and circuit breaking.
+
+    Idempotent calls are retried on connection errors, timeouts and retryable statuses.
+    Non-idempotent calls are only retried when the request provably did not reach the
+    application (connect timeout, connection refused, 429/503).
+    Returns the last response; raises the last exception (or CircuitOpenError).
+    """
+    deadline = time.monotonic() + budget
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(
+                f"{breaker.host} is unavailable, retrying in {breaker.retry_in():.0f}s (circuit open)"
+            )
+
+        response = error = retry_after = None
+        try:
+            response = send()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            breaker.record_failure()
+            error = e
+            reason = type(e).__name__
+            retryable = idempotent or _request_not_sent(e)
+        except BaseException:
+            # Anything else (a broken response, a bug in send) is not retried, but must
+            # still count as a failure and free the half-open trial slot
+            breaker.record_failure()
+            raise
+        else:
+            status = response.status_code
+            if status not in RETRYABLE_STATUS:
+                breaker.record_success()
+                return response
+            if status >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            reason = str(status)
+            retry_after = retry_after_seconds(response)
+            retryable = idempotent or status in NOT_PROCESSED_STATUS
+
+        attempt += 1
+        delay = retry_after if retry_after is not None else backoff_delay(attempt - 1)
+        if not retryable or attempt >= max_attempts or time.monotonic() + delay > deadline:
+            if error is not None:
+                raise error
+            return response
+
+        if response is not None:
+            response.close()  # Release the pooled connection of the discarded response
+        API_RETRIES.inc(endpoint=endpoint, reason=reason)
+        logging.warning("Retrying %s in %.2fs (attempt %d/%d, reason: %s)", endpoint, delay, attempt + 1, max_attempts, reason)
+        time.sleep(delay)
@@ -0,0 +1,248 @@
+"""
+Journal of the print runs in progress, so a run cut short by a crash or power loss can be
+resumed from the next tag instead of being reprinted.
+
+One JSON-lines file per run in DATA_DIR/runs: a header with the job and its reserved tag
+IDs, then one event per label stage (spooled, printed, registered), each flushed to disk
+before the run moves on. A torn last line (power lost mid-write) is ignored when loading.
+The file is removed when the run completes.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import config
+
+RUNS_DIR = os.environ.get("EVO_RUNS_DIR") or os.path.join(config.DATA_DIR, "runs")
+FSYNC = os.environ.get("EVO_JOURNAL_FSYNC", "1") != "0"  # fsync every event (survives power loss)
+
+# Label stages in order; a tag only moves forward, unless its print job failed (voided)
+SPOOLED, PRINTED, REGISTERED = "spooled", "printed", "registered"
+VOIDED = "voided"  # the print job failed: the tag is pending again
+_STAGE_ORDER = {SPOOLED: 1, PRINTED: 2, REGISTERED: 3}
+
+# Runs printing in this process (new or resumed): their journals are not unfinished
+_active_runs = set()
+_active_lock = threading.Lock()
+
+
+class RunJournal:
+    """
+    The journal of one print run: the job, its tag IDs and how far each tag got.
+    """
+
+    def __init__(self, path, header, states=None, status=None):
+        self.path = path
+        self.header = header
+        self.tag_ids = list(header["tag_ids"])
+        self.reservation_ids = list(header.get("reservation_ids", []))
+        self.states = states or {}  # tag_id -> last stage reached
+        self.status = status  # final status of a run that stopped, None while running or after a crash
+        self._lock = threading.Lock()
+
+    @property
+    def run_id(self):
+        return self.header["run_id"]
+
+    @property
+    def job(self):
+        """
+        The job record given to create(), as a dict.
+        """
+        return self.header["job"]
+
+    @classmethod
+    def create(cls, run_id, job, tag_ids, reservation_ids=()):
+        """
+        Start the journal of a new run; `job` is a JSON-serialisable record of the job.
+        """
+        os.makedirs(RUNS_DIR, exist_ok=True)
+        header = {
+            "event": "run",
+            "run_id": run_id,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "job": job,
+            "tag_ids": list(tag_ids),
+            "reservation_ids": list(reservation_ids),
+        }
+        journal = cls(os.path.join(RUNS_DIR, f"{run_id}.jsonl"), header)
+        journal._append(header, mode="w")
+        journal.activate()
+        return journal
+
+    @classmethod
+    def load(cls, path):
+        """
+        Rebuild a journal from its file; returns None if the header is unreadable.
+        """
+        with open(path, "r", encoding="utf-8") as journal_file:
+            lines = journal_file.read().splitlines()
+        events = []
+        for number, line in enumerate(lines, start=1):
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                if number == len(lines):
+                    break  # torn last write
+                logging.warning("Skipping corrupt line %d of run journal %s", number, path)
+        if not events or events[0].get("event") != "run":
+            return None
+        journal = cls(path, events[0])
+        for event in events[1:]:
+            kind = event.get("event")
+            if kind == "stage":
+                for tag_id in event.get("tag_ids") or [event["tag_id"]]:
+                    journal._advance(tag_id, event["stage"])
+            elif kind == "reserved":
+                journal._replace_pending(event["tag_ids"], event.get("reservation_ids", []))
+            elif kind == "finished":
+                journal.status = event.get("status")
+        return journal
+
+    def activate(self):
+        """
+        Mark the run as in progress in this process until finish() or discard(), so it is
+        not offered for resuming meanwhile.
+        """
+        with _active_lock:
+            _active_runs.add(self.run_id)
+
+    def _deactivate(self):
+        with _active_lock:
+            _active_runs.discard(self.run_id)
+
+    def _append(self, event, mode="a"):
+        line = json.dumps(event, separators=(",", ":")) + "\n"
+        with self._lock:
+            with open(self.path, mode, encoding="utf-8") as journal_file:
+                journal_file.write(line)
+                journal_file.flush()
+                if FSYNC:
+                    os.fsync(journal_file.fileno())
+
+    def _advance(self, tag_id, stage):
+        if stage == VOIDED:
+            if self.states.get(tag_id) != REGISTERED:
+                self.states.pop(tag_id, None)
+            return
+        if _STAGE_ORDER[stage] > _STAGE_ORDER.get(self.states.get(tag_id), 0):
+            self.states[tag_id] = stage
+
+    def _replace_pending(self, tag_ids, reservation_ids):
+        self.tag_ids = [tag_id for tag_id in self.tag_ids if tag_id in self.states] + list(tag_ids)
+        self.reservation_ids = list(reservation_ids)
+
+    def mark(self, tag_id, stage):
+        """
+        Record that `tag_id` reached `stage` (spooled, printed, registered or voided).
+        """
+        try:
+            self._append({"event": "stage", "tag_id": tag_id, "stage": stage})
+        except OSError as e:
+            logging.warning(f"Could not write the run journal {self.path}: {e}")
+        with self._lock:
+            self._advance(tag_id, stage)
+
+    def mark_many(self, tag_ids, stage):
+        """
+        Record that all of `tag_ids` reached `stage` in one event (a serialized print job).
+        """
+        if not tag_ids:
+            return
+        try:
+            self._append({"event": "stage", "tag_ids": list(tag_ids), "stage": stage})
+        except OSError as e:
+            logging.warning(f"Could not write the run journal {self.path}: {e}")
+        with self._lock:
+            for tag_id in tag_ids:
+                self._advance(tag_id, stage)
+
+    def replace_pending(self, tag_ids, reservation_ids):
+        """
+        Record new tag IDs for the tags not printed yet (a reservation renewed on resume).
+        """
+        self._append({"event": "reserved", "tag_ids": list(tag_ids), "reservation_ids": list(reservation_ids)})
+        with self._lock:
+            self._replace_pending(tag_ids, reservation_ids)
+
+    def pending_tags(self):
+        """
+        Tags not sent to the printer yet, in print order.
+        """
+        with self._lock:
+            return [tag_id for tag_id in self.tag_ids if tag_id not in self.states]
+
+    def unregistered_tags(self):
+        """
+        Tags sent to the printer but not registered. A spooled tag whose completion was not
+        confirmed counts as printed: the spooler keeps its job across a restart.
+        """
+        with self._lock:
+            return [tag_id for tag_id in self.tag_ids if self.states.get(tag_id) in (SPOOLED, PRINTED)]
+
+    def printed_count(self):
+        with self._lock:
+            return sum(1 for tag_id in self.tag_ids if tag_id in self.states)
+
+    def finish(self, status):
+        """
+        Close the run: the journal is removed once nothing is left to print or register,
+        otherwise the status is recorded and the run is offered for resuming.
+        """
+        if status == "completed" or not self.printed_count() or not (self.pending_tags() or self.unregistered_tags()):
+            self.discard()
+            return
+        self.status = status
+        try:
+            self._append({"event": "finished", "status": status})
+        except OSError as e:
+            logging.warning(f"Could not write the run journal {self.path}: {e}")
+        self._deactivate()
+
+    def discard(self):
+        self._deactivate()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning(f"Could not remove the run journal {self.path}: {e}")
+
+    def describe(self):
+        job = self.job
+        item = job["item"]
+        unregistered = len(self.unregistered_tags())
+        text = (f"PO {job['po_number']}, {item.get('sku')} {item.get('item_name', '')}, "
+                f"inventory ID {job['inventory_id']}: {self.printed_count()} of {len(self.tag_ids)} labels printed")
+        if unregistered:
+            text += f", {unregistered} not registered yet"
+        return f"{text}.\nStarted {self.header['created_at']}" + (f", stopped: {self.status}." if self.status else ", interrupted.")
+
+
+def unfinished_runs():
+    """
+    Journals of the runs that were interrupted or stopped with work left, oldest first.
+    Runs still printing in this process are left out.
+    """
+    try:
+        names = sorted(name for name in os.listdir(RUNS_DIR) if name.endswith(".jsonl"))
+    except FileNotFoundError:
+        return []
+    journals = []
+    with _active_lock:
+        active = set(_active_runs)
+    for name in names:
+        if name[:-len(".jsonl")] in active:
+            continue
+        path = os.path.join(RUNS_DIR, name)
+        try:
+            journal = RunJournal.load(path)
+        except OSError as e:
+            logging.warning(f"Could not read the run journal {path}: {e}")
+            continue
+        if journal is None:
+            logging.warning("Ignoring run journal without a header: %s", path)
+            continue
+        journals.append(journal)
+    return sorted(journals, key=lambda journal: journal.header["created_at"])
@@ -0,0 +1,296 @@
+"""
+Session store: keeps the API access token with its expiry, caches it on disk so a
+restart doesn't need a new login, and renews it in the background before it expires.
+Renewing itself (refresh endpoint or re-login) is done by auth.renew_session().
+
+A session resumed from disk has no password in memory: without a refresh token it can't
+be renewed, so it is only resumed while it has MIN_RESUME_LIFETIME left. When a session
+can't be renewed otherwise, the password is asked again through set_password_prompt().
+"""
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+import config
+from metrics import REGISTRY
+
+SESSION_FILE = os.environ.get("EVO_SESSION_FILE") or os.path.join(config.DATA_DIR, "session.dat")
+DEFAULT_TTL = float(os.environ.get("EVO_SESSION_TTL", 3600))  # seconds, when the server doesn't say
+REFRESH_MARGIN = float(os.environ.get("EVO_SESSION_REFRESH_MARGIN", 300))  # renew this long before expiry
+EXPIRY_SKEW = 30.0  # a token expiring within this many seconds is treated as expired
+# Lifetime a cached session without a refresh token needs to be resumed: long enough for a print run
+MIN_RESUME_LIFETIME = float(os.environ.get("EVO_SESSION_MIN_RESUME", 1800))  # seconds
+RETRY_INTERVAL = 60.0  # seconds between background renewal attempts after a failure
+
+# Stored file format: a marker line followed by the DPAPI-encrypted (Windows) or plain JSON session
+_DPAPI_MARKER = b"EVO-SESSION-DPAPI\n"
+_PLAIN_MARKER = b"EVO-SESSION-PLAIN\n"
+
+SESSION_REFRESHES = REGISTRY.counter(
+    "evo_session_refreshes_total", "Access token renewals by trigger and result.", ("trigger", "result"))
+
+
+@dataclass
+class Session:
+    username: str
+    access_token: str
+    refresh_token: Optional[str] = None
+    expires_at: float = 0.0  # epoch seconds
+
+    def expires_in(self):
+        return self.expires_at - time.time()
+
+    def is_valid(self, skew=EXPIRY_SKEW):
+        return bool(self.access_token) and self.expires_in() > skew
+
+
+def jwt_expiry(token):
+    """
+    The `exp` claim of a JWT access token, None if the token isn't a JWT.
+    """
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def token_expiry(access_token, expires_in=None):
+    """
+    Expiry of a new access token: from `expires_in` of the login response, else the
+    JWT `exp` claim, else DEFAULT_TTL from now.
+    """
+    try:
+        if expires_in is not None:
+            return time.time() + float(expires_in)
+    except (TypeError, ValueError):
+        pass
+    return jwt_expiry(access_token) or time.time() + DEFAULT_TTL
+
+
+_lock = threading.RLock()
+_current = None
+_credentials = None  # (username, password), kept in memory only to log in again without a refresh token
+_timer = None
+_password_prompt = None  # callback(username) -> password or None, see set_password_prompt
+_prompt_declined = None  # access token for which the user declined to enter the password
+_prompt_lock = threading.Lock()  # one password prompt at a time
+
+
+def _protect(raw):
+    try:
+        import win32crypt  # type: ignore
+    except ImportError:
+        return _PLAIN_MARKER + raw
+    return _DPAPI_MARKER + win32crypt.CryptProtectData(raw, "EVO RFID Printer session", None, None, None, 0)
+
+
+def _unprotect(blob):
+    if blob.startswith(_PLAIN_MARKER):
+        return blob[len(_PLAIN_MARKER):]
+    if blob.startswith(_DPAPI_MARKER):
+        import win32crypt  # type: ignore
+        return win32crypt.CryptUnprotectData(blob[len(_DPAPI_MARKER):], None, None, None, 0)[1]
+    raise ValueError("unknown session file format")
+
+
+def _save(session):
+    """
+    Write the session to disk atomically, readable by the current user only
+    (encrypted with DPAPI on Windows).
+    """
+    try:
+        config.get_data_dir()
+        blob = _protect(json.dumps(asdict(session)).encode("utf-8"))
+        tmp_path = f"{SESSION_FILE}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as session_file:
+            session_file.write(blob)
+        os.replace(tmp_path, SESSION_FILE)
+    except Exception as e:
+        logging.warning(f"Could not cache the session: {e}")
+
+
+def _delete_file():
+    try:
+        os.remove(SESSION_FILE)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.warning(f"Could not remove the cached session: {e}")
+
+
+def load():
+    """
+    Return the session cached on disk if it is still valid, otherwise None
+    (an expired or unreadable cache is removed). Without a refresh token the session
+    can't be renewed, so it must still have MIN_RESUME_LIFETIME left.
+    """
+    try:
+        with open(SESSION_FILE, "rb") as session_file:
+            session = Session(**json.loads(_unprotect(session_file.read())))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable cached session: {e}")
+        _delete_file()
+        return None
+    if not session.is_valid():
+        logging.info("Cached session for %s has expired", session.username)
+        _delete_file()
+        return None
+    if not session.refresh_token and not session.is_valid(skew=MIN_RESUME_LIFETIME):
+        logging.info("Cached session for %s expires in %.0fs and can't be renewed: logging in again",
+                     session.username, session.expires_in())
+        _delete_file()
+        return None
+    return session
+
+
+def _schedule(session):
+    """
+    (Re)start the background timer renewing the token REFRESH_MARGIN before it expires.
+    """
+    global _timer
+    if _timer is not None:
+        _timer.cancel()
+    delay = max(0.0, session.expires_in() - REFRESH_MARGIN)
+    _timer = threading.Timer(delay, _background_refresh)
+    _timer.daemon = True
+    _timer.start()
+    logging.debug("Session renewal scheduled in %.0fs", delay)
+
+
+def _background_refresh():
+    global _timer
+    if refresh(trigger="scheduled"):
+        return
+    with _lock:
+        if _current is not None and _current.is_valid():
+            # Keep trying while the current token still works
+            _timer = threading.Timer(min(RETRY_INTERVAL, max(1.0, _current.expires_in() - EXPIRY_SKEW)), _background_refresh)
+            _timer.daemon = True
+            _timer.start()
+
+
+def start(session, password=None, persist=True):
+    """
+    Make `session` the current one (after a login or when resuming a cached session),
+    cache it on disk and schedule its renewal.
+    """
+    global _current, _credentials
+    with _lock:
+        _current = session
+        if password is not None:
+            _credentials = (session.username, password)
+        if persist:
+            _save(session)
+        _schedule(session)
+
+
+def current():
+    return _current
+
+
+def clear():
+    """
+    Forget the session (logout): stop renewing it and remove it from disk.
+    """
+    global _current, _credentials, _timer
+    with _lock:
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+        _current = None
+        _credentials = None
+        _delete_file()
+
+
+def set_password_prompt(callback):
+    """
+    Set how the password is asked again when the session can't be renewed otherwise:
+    `callback(username)` returns the password, or None if the user declined.
+    """
+    global _password_prompt
+    _password_prompt = callback
+
+
+def _renew_with_prompt(session):
+    """
+    Renew by asking the password. Not called under _lock: the prompt is shown by the UI
+    thread, which may itself be waiting for the lock. Worker threads wait for a prompt
+    already shown; the UI thread doesn't, so it can't block the prompt it has to show.
+    """
+    global _credentials, _prompt_declined
+    if _password_prompt is None:
+        return None
+    if not _prompt_lock.acquire(blocking=threading.current_thread() is not threading.main_thread()):
+        return None
+    try:
+        if _current is not session:
+            # Renewed (or logged out) while waiting for the prompt of another thread
+            return _current if _current is not None and _current.is_valid() else None
+        if _prompt_declined == session.access_token:
+            return None
+        from auth import renew_session
+        for _ in range(3):
+            password = _password_prompt(session.username)
+            if password is None:
+                _prompt_declined = session.access_token  # Don't ask again for this token
+                return None
+            renewed = renew_session(session, (session.username, password))
+            if renewed is not None:
+                _credentials = (session.username, password)
+                return renewed
+            logging.warning("Could not log in again as %s", session.username)
+        return None
+    finally:
+        _prompt_lock.release()
+
+
+def refresh(stale_token=None, trigger="manual"):
+    """
+    Renew the access token. With `stale_token` (the token a request was rejected with)
+    nothing is done when another thread already replaced it. Returns True when a
+    valid token is available afterwards.
+    """
+    with _lock:
+        session = _current
+        if session is None:
+            return False
+        if stale_token is not None and session.access_token != stale_token:
+            return True
+        from auth import renew_session  # Imported lazily, auth depends on this module
+        renewed = renew_session(session, _credentials)
+        needs_password = renewed is None and _credentials is None
+    if needs_password:
+        # No other way to renew it: ask the password again
+        renewed = _renew_with_prompt(session)
+    with _lock:
+        if renewed is not None and renewed is _current:
+            return True
+        SESSION_REFRESHES.inc(trigger=trigger, result="ok" if renewed else "failed")
+        if renewed is None:
+            logging.warning("Could not renew the session for %s", session.username)
+            if stale_token is not None:
+                # The server rejected the token, a cached copy is useless on the next start
+                _delete_file()
+            return False
+        logging.info("Session renewed for %s (%s)", renewed.username, trigger)
+        start(renewed)
+        return True
+
+
+def ensure_fresh():
+    """
+    Renew the token before a request if it is about to expire (e.g. after the machine
+    slept through the scheduled renewal). Cheap when the token is fresh.
+    """
+    session = _current
+    if session is not None and not session.is_valid():
+        refresh(trigger="expiring")
@@ -0,0 +1,155 @@
+"""
+Background work started while the login window is shown: warming up the heavy
+imports, printer discovery, the first PO and warehouse fetch, and later the items of
+the PO being selected (prefetched per warehouse). Keep this module free of heavy
+top-level imports, it is loaded before the first window appears.
+"""
+import functools
+import importlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Modules that are not needed to show the login window, imported in the background
+WARM_UP_MODULES = (
+    "requests",
+    "database",
+    "auth",
+    "printer",
+    "zpl",
+    "PIL.Image",
+    "PIL.ImageTk",
+    "tkcalendar",
+    "ui.main_interface",
+    "ui.ui_item_selection",
+)
+
+_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup")
+_lock = threading.Lock()
+_futures = {}
+
+
+def _submit(name, func):
+    with _lock:
+        future = _futures.get(name)
+        if future is None:
+            future = _futures[name] = _executor.submit(func)
+        return future
+
+
+def _warm_up():
+    for module_name in WARM_UP_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:  # Missing optional modules surface later where they are used
+            logging.warning(f"Background import of {module_name} failed: {e}")
+    import metrics
+    metrics.start_exporters()
+
+
+def _discover_printers():
+    from printer import discover_printers
+    return discover_printers()
+
+
+def _fetch_po_numbers():
+    from database import get_po_page
+    # Only the first page: the PO screen loads more on demand and searches on the server
+    result = get_po_page()
+    return (result.data if result.ok else None), result.error
+
+
+def _fetch_warehouses():
+    from database import get_warehouses
+    return get_warehouses()
+
+
+def _fetch_items(po_number, warehouse_id):
+    from database import fetch_items
+    return fetch_items(po_number, warehouse_id)
+
+
+def _take(name, func):
+    """
+    Wait for the background result `name` and forget it, so the next call starts afresh.
+    """
+    future = _submit(name, func)
+    try:
+        return future.result()
+    finally:
+        with _lock:
+            if _futures.get(name) is future:
+                del _futures[name]
+
+
+def start_background_init():
+    """
+    Start warming up imports and discovering printers. Called right after the login
+    window is built so the work overlaps with the user typing credentials.
+    """
+    _submit("warm_up", _warm_up)
+    _submit("printers", _discover_printers)
+
+
+def start_po_prefetch():
+    """
+    Start fetching the active POs and the warehouses; needs a valid API token.
+    """
+    _submit("po_numbers", _fetch_po_numbers)
+    _submit("warehouses", _fetch_warehouses)
+
+
+def start_items_prefetch(po_number, warehouse_id):
+    """
+    Start fetching the items of `po_number` in `warehouse_id` (e.g. as soon as the PO is
+    selected). Only the latest prefetch is kept: one for another PO or warehouse is dropped.
+    """
+    key = ("items", warehouse_id, po_number)
+    with _lock:
+        for name in [name for name in _futures if isinstance(name, tuple) and name != key]:
+            del _futures[name]
+    _submit(key, functools.partial(_fetch_items, po_number, warehouse_id))
+
+
+def get_printers():
+    """
+    Return the discovered printers, waiting for the background discovery if needed.
+    """
+    return _submit("printers", _discover_printers).result()
+
+
+def get_po_numbers():
+    """
+    Return (po_page, error_message) for the first page of active POs (a
+    database.PoPage, None if it could not be fetched) from the prefetch and forget it,
+    so the next call fetches fresh data.
+    """
+    return _take("po_numbers", _fetch_po_numbers)
+
+
+def get_warehouses():
+    """
+    Return the warehouses ({name: id}) from the prefetch, or from database.get_warehouses.
+    """
+    return _take("warehouses", _fetch_warehouses)
+
+
+def get_items(po_number, warehouse_id):
+    """
+    Return the items of `po_number` in `warehouse_id` from the matching prefetch, or fetch
+    them now; a prefetch made for another warehouse is never used.
+    """
+    key = ("items", warehouse_id, po_number)
+    return _take(key, functools.partial(_fetch_items, po_number, warehouse_id))
+
+
+def reset():
+    """
+    Forget cached background results (e.g. after logout) so they are redone on next use.
+    """
+    with _lock:
+        _futures.pop("po_numbers", None)
+        _futures.pop("printers", None)
+        _futures.pop("warehouses", None)
+        for name in [name for name in _futures if isinstance(name, tuple)]:
+            del _futures[name]
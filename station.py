@@ -0,0 +1,57 @@
+"""
+Station settings: choices remembered on this workstation across restarts, such as the
+last warehouse used. Stored as JSON in the data directory and written atomically.
+"""
+import json
+import logging
+import os
+import threading
+import config
+
+STATION_FILE = os.environ.get("EVO_STATION_FILE") or os.path.join(config.DATA_DIR, "station.json")
+
+_lock = threading.Lock()
+
+
+def _load():
+    try:
+        with open(STATION_FILE, "r", encoding="utf-8") as station_file:
+            settings = json.load(station_file)
+        return settings if isinstance(settings, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable station settings {STATION_FILE}: {e}")
+        return {}
+
+
+def _save(settings):
+    try:
+        config.get_data_dir()
+        tmp_path = f"{STATION_FILE}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as station_file:
+            json.dump(settings, station_file, indent=2)
+        os.replace(tmp_path, STATION_FILE)
+    except OSError as e:
+        logging.warning(f"Could not save the station settings: {e}")
+
+
+def get_last_warehouse():
+    """
+    ID of the warehouse last used on this station with the current server, or None.
+    """
+    with _lock:
+        return _load().get("last_warehouse", {}).get(config.BASE_URL)
+
+
+def set_last_warehouse(warehouse_id):
+    """
+    Remember the warehouse selected on this station (per server, IDs differ between them).
+    """
+    with _lock:
+        settings = _load()
+        last = settings.setdefault("last_warehouse", {})
+        if last.get(config.BASE_URL) == warehouse_id:
+            return
+        last[config.BASE_URL] = warehouse_id
+        _save(settings)
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Keep the tests away from the user's log, metrics, session and run journal
+_scratch = tempfile.mkdtemp(prefix="evo-tests-")
+os.environ.setdefault("EVO_LOG_FILE", os.path.join(_scratch, "app.log"))
+os.environ.setdefault("EVO_DATA_DIR", _scratch)
+os.environ.setdefault("EVO_SESSION_FILE", os.path.join(_scratch, "session.dat"))
+os.environ.setdefault("EVO_PRINTER_BACKEND", "emulator")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
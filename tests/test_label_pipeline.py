@@ -0,0 +1,77 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+import config
+import label_pipeline
+import print_stats
+import run_journal
+from label_pipeline import LabelJob, run_label_job, serial_tag_ids
+
+ITEM = {"item_id": 1001, "sku": "SKU-001001", "item_name": "Carprofen Tablet 50mg", "receive_item_number": "WH/IN/00001/001"}
+TAG_IDS = serial_tag_ids("2610191200000000", 3)
+
+
+@pytest.fixture
+def run_job(tmp_path, monkeypatch):
+    """
+    Run a print of TAG_IDS on a stubbed printer whose serialized jobs fail after
+    printing `labels` of their labels.
+    """
+    monkeypatch.setattr(config, "PRINT_MODE", "serialized")
+    monkeypatch.setattr(config, "TAG_RESERVATION", "off")
+    monkeypatch.setattr(run_journal, "RUNS_DIR", str(tmp_path))
+    monkeypatch.setattr(run_journal, "FSYNC", False)
+    monkeypatch.setattr(print_stats, "RUN_SUMMARY_FILE", str(tmp_path / "print_runs.jsonl"))
+    monkeypatch.setattr(label_pipeline.preflight, "run_preflight", lambda item, inventory_id: SimpleNamespace(ok=True))
+    monkeypatch.setattr(label_pipeline, "insert_into_stocks", lambda **record: True)
+    monkeypatch.setattr(label_pipeline.printer, "sends_print_jobs", lambda: True)
+    monkeypatch.setattr(label_pipeline.printer, "print_zpl", lambda zpl: "job-1")
+    monkeypatch.setattr(label_pipeline.printer, "wait_for_print_completion", lambda job_id: False)
+    monkeypatch.setattr(label_pipeline.printer, "get_encode_report", lambda job_id, tag_ids=(): None)
+
+    def run(labels):
+        monkeypatch.setattr(label_pipeline.printer, "get_labels_printed", lambda job_id: labels)
+        job = LabelJob(po_number="P25001", item=ITEM, inventory_id="01-A-1-1A", exp_date=date(2030, 1, 1),
+                       amount=len(TAG_IDS), warehouse_id=1)
+        return run_label_job(job, tag_ids=TAG_IDS)
+
+    return run
+
+
+def test_failed_job_blames_the_first_unprinted_tag(run_job):
+    result = run_job(1)
+    assert result.status == "print_failed"
+    assert result.failed_tag == TAG_IDS[1]
+    assert result.printed_tags == TAG_IDS[:1]
+    assert result.registered_tags == TAG_IDS[:1]
+
+
+def test_failed_job_that_printed_every_label(run_job):
+    result = run_job(len(TAG_IDS))
+    assert result.status == "print_failed"
+    assert result.failed_tag is None
+    assert result.printed_tags == TAG_IDS
+    assert result.registered_tags == TAG_IDS
+    assert f"tags {TAG_IDS[0]} to {TAG_IDS[-1]}" in result.error_message
+
+
+def test_unverifiable_encodes_are_not_registered(run_job, monkeypatch):
+    monkeypatch.setattr(config, "PRINT_MODE", "label")
+    monkeypatch.setattr(label_pipeline.printer, "wait_for_print_completion", lambda job_id: True)
+    result = run_job(None)
+    assert result.status == "encode_unverified"
+    assert result.failed_tag == TAG_IDS[0]
+    assert result.registered_tags == []
+    assert run_journal.unfinished_runs() == []
+
+
+def test_allowed_unverifiable_encodes_are_reported_once_per_run(run_job, monkeypatch, caplog):
+    monkeypatch.setattr(config, "PRINT_MODE", "label")
+    monkeypatch.setattr(config, "ALLOW_UNVERIFIED_ENCODES", True)
+    monkeypatch.setattr(label_pipeline.printer, "wait_for_print_completion", lambda job_id: True)
+    result = run_job(None)
+    assert result.ok
+    assert result.stats.context["encode_verification"] == "unavailable"
+    assert sum("encode verification unavailable" in message for message in caplog.messages) == 1
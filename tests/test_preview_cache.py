@@ -0,0 +1,25 @@
+import threading
+import time
+
+from preview_cache import PreviewCache, preview_key
+
+ITEMS = [{"item_id": n, "sku": f"SKU-{n:06d}", "item_name": f"Item {n}"} for n in range(1, 6)]
+
+
+def test_prefetch_is_limited_and_spaced_out_but_requests_are_not():
+    rendered = []
+    cache = PreviewCache(render=lambda item, *args: rendered.append(item["item_id"]) or "image",
+                         workers=1, capacity=10, prefetch_limit=2, prefetch_interval=0.5)
+    cache.prefetch(ITEMS, "01 Jan 2030", "")
+    time.sleep(0.1)
+    assert rendered == [1]
+
+    ready = threading.Event()
+    assert cache.request(ITEMS[4], "01 Jan 2030", "", lambda key, image: ready.set()) is None
+    assert ready.wait(0.3)
+    assert rendered == [1, 5]
+
+    time.sleep(0.6)
+    assert rendered == [1, 5, 2]
+    assert cache.get(ITEMS[2], "01 Jan 2030", "") is None
+    assert cache.pending() == 0 and preview_key(ITEMS[1], "01 Jan 2030", "") in cache._images
@@ -0,0 +1,14 @@
+import pytest
+
+from print_stats import PrintRunStats
+
+
+def test_background_registration_is_in_the_breakdown_but_not_the_eta():
+    stats = PrintRunStats(total=4)
+    stats._current = {"render": 0.1, "wait": 0.3}
+    stats.label_done()
+    stats.record("register", 0.4, per_label=True)
+    stats.record("reserve", 5.0)
+
+    assert stats.breakdown() == pytest.approx({"render": 0.125, "wait": 0.375, "register": 0.5})
+    assert stats.eta_seconds() == pytest.approx(0.4 * 3)
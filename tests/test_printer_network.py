@@ -0,0 +1,143 @@
+import re
+import socket
+import threading
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+import config
+import label_pipeline
+import print_stats
+import printer
+import run_journal
+from label_pipeline import LabelJob, generate_label_zpl, run_label_job, serial_tag_ids
+
+ITEM = {"item_id": 1001, "sku": "SKU-001001", "item_name": "Carprofen Tablet 50mg", "receive_item_number": "WH/IN/00001/001"}
+COMMAND = re.compile(rb"~HS|~JA|\^PQ(\d+)")
+
+
+class FakeZebra:
+    """
+    TCP server answering like a network Zebra printer: ~HS host status, and one ~RV
+    encode result per printed label, voiding the labels listed in `voids` (label numbers
+    counted from 1 over the whole session).
+    """
+
+    def __init__(self, voids=(), paper_out=False, paused=False):
+        self.voids = set(voids)
+        self.paper_out = paper_out
+        self.paused = paused
+        self.labels = 0
+        self.received = b""
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def _handle(self, connection):
+        buffer = b""
+        with connection:
+            while True:
+                data = connection.recv(4096)
+                if not data:
+                    return
+                self.received += data
+                buffer += data
+                end = 0
+                for match in COMMAND.finditer(buffer):
+                    end = match.end()
+                    if match.group(0) == b"~HS":
+                        connection.sendall(
+                            b"\x02030,%d,%d,1245,000,0,0,0,000,0,0,0\x03\r\n" % (self.paper_out, self.paused)
+                            + b"\x02001,0,0,0,1,2,6,0,00000000,1,000\x03\r\n\x021234,0\x03\r\n")
+                    elif match.group(1):
+                        for _ in range(int(match.group(1))):
+                            self.labels += 1
+                            voided = self.labels in self.voids
+                            connection.sendall(b"_-,11_" if voided else b"_+,1_")
+                            if voided:
+                                break  # ^RS ...E: the job stops on the voided label
+                buffer = buffer[end:]
+
+    def close(self):
+        self.listener.close()
+
+
+@pytest.fixture
+def zebra(monkeypatch):
+    printers = []
+
+    def start(**kwargs):
+        printers.append(FakeZebra(**kwargs))
+        monkeypatch.setattr(config, "PRINTER_BACKEND", "network")
+        monkeypatch.setattr(config, "PRINTER_HOST", "127.0.0.1")
+        monkeypatch.setattr("printer_network.NETWORK_PORT", printers[-1].port)
+        monkeypatch.setattr(printer, "printer_name", "Zebra 127.0.0.1")
+        return printers[-1]
+
+    yield start
+    for fake in printers:
+        fake.close()
+
+
+def label(tag_id):
+    return generate_label_zpl(ITEM, tag_id, "01-A-1-1A", "01 Jan 2030")
+
+
+def test_verified_label(zebra):
+    fake = zebra()
+    job_id = printer.print_zpl(label("2610191200000000"))
+    assert printer.wait_for_print_completion(job_id)
+    report = printer.get_encode_report(job_id, ["2610191200000000"])
+    assert report.verified == ["2610191200000000"] and not report.encode_failed
+    assert fake.received.startswith(b"~RVE")
+
+
+def test_voided_label_stops_the_serialized_job(zebra):
+    zebra(voids={3})
+    tag_ids = serial_tag_ids("2610191200000000", 4)
+    job_id = printer.print_zpl(label_pipeline.generate_serialized_zpl(ITEM, tag_ids[0], 4, "01-A-1-1A", "01 Jan 2030"))
+    assert not printer.wait_for_print_completion(job_id)
+    report = printer.get_encode_report(job_id, tag_ids)
+    assert report.verified == tag_ids[:2]
+    assert report.voided == 1 and report.encode_failed
+    assert printer.get_labels_printed(job_id) == 2
+
+
+def test_host_status(zebra):
+    zebra(paper_out=True, paused=True)
+    assert printer.get_media_problems() == ["The printer is out of labels."]
+    assert not printer.is_printer_online()
+    assert printer.get_print_error()[0] == "Printer Paused"
+
+
+def test_run_registers_only_verified_tags(zebra, tmp_path, monkeypatch):
+    zebra(voids={2})
+    monkeypatch.setattr(config, "PRINT_MODE", "label")
+    monkeypatch.setattr(config, "TAG_RESERVATION", "off")
+    monkeypatch.setattr(run_journal, "RUNS_DIR", str(tmp_path))
+    monkeypatch.setattr(print_stats, "RUN_SUMMARY_FILE", str(tmp_path / "print_runs.jsonl"))
+    monkeypatch.setattr(label_pipeline.preflight, "run_preflight", lambda item, inventory_id: SimpleNamespace(ok=True))
+    registered = []
+    monkeypatch.setattr(label_pipeline, "insert_into_stocks", lambda **record: registered.append(record["tag_id"]) or True)
+    tag_ids = serial_tag_ids("2610191200000000", 3)
+    job = LabelJob(po_number="P25001", item=ITEM, inventory_id="01-A-1-1A", exp_date=date(2030, 1, 1),
+                   amount=len(tag_ids), warehouse_id=1)
+    result = run_label_job(job, tag_ids=tag_ids)
+    assert result.ok
+    # The second label was voided and printed again with the same tag ID
+    assert registered == tag_ids
+
+
+def test_spooler_jobs_do_not_ask_for_encode_results():
+    zpl = label("2610191200000000")
+    assert "~RVE" in zpl
+    assert "RV" not in printer.strip_encode_reporting(zpl)
@@ -0,0 +1,203 @@
+import socket
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import resilience
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, send_with_retry
+
+
+class ScriptedServer:
+    """
+    Local HTTP server answering each request with the next step of a script: a status
+    code (with an optional Retry-After), or "reset" to drop the connection unanswered.
+    The last step repeats once the script runs out.
+    """
+
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    step = server.steps[min(server.requests, len(server.steps) - 1)]
+                    server.requests += 1
+                if step == "reset":
+                    # RST instead of FIN, like a crashed upstream
+                    self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                    self.close_connection = True
+                    return
+                status, retry_after = step if isinstance(step, tuple) else (step, None)
+                body = b'{"status_code": %d}' % status
+                self.send_response(status)
+                if retry_after is not None:
+                    self.send_header("Retry-After", str(retry_after))
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(*steps):
+        servers.append(ScriptedServer(*steps))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """
+    The delays send_with_retry sleeps for, without sleeping.
+    """
+    delays = []
+    monkeypatch.setattr(resilience.time, "sleep", delays.append)
+    return delays
+
+
+def get(url, session=None):
+    return lambda: (session or requests).get(url, timeout=5)
+
+
+def test_retries_503_then_returns_200(serve, sleeps):
+    server = serve(503, 200)
+    breaker = CircuitBreaker("test")
+    response = send_with_retry(get(server.url), breaker, "test")
+    assert response.status_code == 200
+    assert server.requests == 2
+    assert len(sleeps) == 1
+    assert breaker.state == CLOSED and breaker.failures == 0
+
+
+def test_backoff_grows_and_stays_under_the_cap(serve, sleeps, monkeypatch):
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: high)
+    server = serve(503)
+    response = send_with_retry(get(server.url), CircuitBreaker("test", failure_threshold=99), "test", max_attempts=5)
+    assert response.status_code == 503
+    assert server.requests == 5
+    assert sleeps == [min(resilience.BACKOFF_CAP, resilience.BACKOFF_BASE * 2 ** n) for n in range(4)]
+
+
+def test_retry_after_is_honoured(serve, sleeps):
+    server = serve((429, 2), 200)
+    response = send_with_retry(get(server.url), CircuitBreaker("test"), "test")
+    assert response.status_code == 200
+    assert sleeps == [2.0]
+
+
+def test_retry_budget_stops_retrying(serve, sleeps):
+    server = serve((503, 10), 200)
+    response = send_with_retry(get(server.url), CircuitBreaker("test"), "test", budget=5)
+    assert response.status_code == 503
+    assert server.requests == 1
+    assert sleeps == []
+
+
+def test_connection_reset_is_retried_when_idempotent(serve, sleeps):
+    server = serve("reset", 200)
+    response = send_with_retry(get(server.url), CircuitBreaker("test"), "test")
+    assert response.status_code == 200
+    assert server.requests == 2
+
+
+def test_connection_reset_is_not_retried_when_not_idempotent(serve, sleeps):
+    server = serve("reset", 200)
+    breaker = CircuitBreaker("test")
+    with pytest.raises(requests.exceptions.ConnectionError):
+        send_with_retry(get(server.url), breaker, "test", idempotent=False)
+    assert server.requests == 1
+    assert breaker.failures == 1
+
+
+def test_discarded_responses_are_closed(serve, sleeps):
+    server = serve(503, 503, 200)
+    responses = []
+
+    def send():
+        responses.append(requests.get(server.url, timeout=5, stream=True))
+        return responses[-1]
+
+    send_with_retry(send, CircuitBreaker("test"), "test")
+    assert [response.raw.closed for response in responses] == [True, True, False]
+
+
+def test_breaker_opens_half_opens_and_closes(serve, sleeps, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    server = serve(503)
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+
+    send_with_retry(get(server.url), breaker, "test", max_attempts=3)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        send_with_retry(get(server.url), breaker, "test")
+    assert server.requests == 3
+
+    # After the reset timeout one trial call goes through; its failure reopens the circuit
+    now[0] += 30
+    send_with_retry(get(server.url), breaker, "test", max_attempts=1)
+    assert server.requests == 4
+    assert breaker.state == OPEN
+
+    now[0] += 30
+    server.steps = [200]
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()  # a single trial at a time
+    breaker.record_failure()
+    now[0] += 30
+    assert send_with_retry(get(server.url), breaker, "test").status_code == 200
+    assert breaker.state == CLOSED and breaker.failures == 0
+
+
+@pytest.mark.parametrize("error", [requests.exceptions.ChunkedEncodingError, requests.exceptions.InvalidURL, ValueError])
+def test_other_errors_release_the_half_open_trial(error, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    now[0] += 30
+
+    def send():
+        raise error("boom")
+
+    with pytest.raises(error):
+        send_with_retry(send, breaker, "test")
+    assert breaker.state == OPEN
+
+    # The trial slot was released: the next trial is let through after the timeout
+    now[0] += 30
+    assert breaker.allow()
+
+
+def test_non_idempotent_call_is_only_retried_when_not_processed(serve, sleeps):
+    # 502: the backend may have processed the request, so it isn't sent again
+    server = serve(502, 201)
+    assert send_with_retry(get(server.url), CircuitBreaker("test"), "test", idempotent=False).status_code == 502
+    assert server.requests == 1
+    # 503: the backend refused it unprocessed, so it is retried
+    server = serve(503, 201)
+    assert send_with_retry(get(server.url), CircuitBreaker("test"), "test", idempotent=False).status_code == 201
+    assert server.requests == 2
@@ -0,0 +1,41 @@
+import pytest
+
+import run_journal
+from run_journal import PRINTED, RunJournal, unfinished_runs
+
+JOB = {"po_number": "P25001", "item": {"sku": "SKU-001001", "item_name": "Carprofen"}, "inventory_id": "01-A-1-1A"}
+
+
+@pytest.fixture(autouse=True)
+def runs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_journal, "RUNS_DIR", str(tmp_path))
+    monkeypatch.setattr(run_journal, "FSYNC", False)
+
+
+def test_run_printing_in_this_process_is_not_unfinished():
+    journal = RunJournal.create("run-1", JOB, ["t1", "t2", "t3"])
+    journal.mark("t1", PRINTED)
+    assert unfinished_runs() == []
+
+    journal.finish("print_failed")
+    assert [run.run_id for run in unfinished_runs()] == ["run-1"]
+
+
+def test_resumed_run_is_not_offered_again_until_it_stops():
+    journal = RunJournal.create("run-1", JOB, ["t1", "t2"])
+    journal.mark("t1", PRINTED)
+    journal.finish("print_failed")
+
+    resumed = unfinished_runs()[0]
+    resumed.activate()
+    assert unfinished_runs() == []
+    resumed.finish("print_failed")
+    assert [run.run_id for run in unfinished_runs()] == ["run-1"]
+
+
+def test_completed_run_is_removed():
+    journal = RunJournal.create("run-1", JOB, ["t1"])
+    journal.mark("t1", PRINTED)
+    journal.finish("completed")
+    assert unfinished_runs() == []
+    assert "run-1" not in run_journal._active_runs
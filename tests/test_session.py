@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+import auth
+import session
+from session import Session
+
+
+@pytest.fixture(autouse=True)
+def session_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(session, "SESSION_FILE", str(tmp_path / "session.dat"))
+    yield
+    session.clear()
+    session.set_password_prompt(None)
+
+
+def cached(expires_in, refresh_token=None):
+    session._save(Session("alice", "token-1", refresh_token, time.time() + expires_in))
+
+
+def test_session_without_refresh_token_needs_the_resume_lifetime():
+    cached(session.MIN_RESUME_LIFETIME - 60)
+    assert session.load() is None
+
+    cached(session.MIN_RESUME_LIFETIME + 60)
+    assert session.load().access_token == "token-1"
+
+
+def test_session_with_refresh_token_is_resumed_until_it_expires():
+    cached(120, refresh_token="refresh-1")
+    assert session.load().refresh_token == "refresh-1"
+
+
+def test_unrenewable_session_asks_the_password_again(monkeypatch):
+    def renew(current_session, credentials=None):
+        if credentials != ("alice", "secret"):
+            return None
+        return Session("alice", "token-2", None, time.time() + 3600)
+
+    monkeypatch.setattr(auth, "renew_session", renew)
+    prompts = []
+    session.set_password_prompt(lambda username: prompts.append(username) or "secret")
+    session.start(Session("alice", "token-1", None, time.time() + 600), persist=False)
+
+    assert session.refresh(stale_token="token-1", trigger="unauthorized")
+    assert session.current().access_token == "token-2"
+    assert prompts == ["alice"]
+    # The password is kept in memory for the next renewals
+    assert session.refresh(trigger="manual") and prompts == ["alice"]
+
+
+def test_declined_password_prompt_is_not_repeated(monkeypatch):
+    monkeypatch.setattr(auth, "renew_session", lambda current_session, credentials=None: None)
+    prompts = []
+    session.set_password_prompt(lambda username: prompts.append(username))
+    session.start(Session("alice", "token-1", None, time.time() + 600), persist=False)
+
+    assert not session.refresh(trigger="scheduled")
+    assert not session.refresh(trigger="scheduled")
+    assert prompts == ["alice"]
@@ -0,0 +1,161 @@
+"""
+Single Tk root shared by all screens. Each screen is built once into its own frame
+and screens are swapped with pack_forget/tkraise, so navigating does not recreate
+the root, the ttk styles, the custom title bar or the icons.
+"""
+from collections import OrderedDict
+import tkinter as tk
+import config
+
+DEFAULT_WIDTH = 700
+DEFAULT_HEIGHT = 650
+# Screens kept alive besides the visible one; the least recently shown are destroyed first
+MAX_CACHED_SCREENS = 6
+
+
+class AppShell:
+    """
+    Owns the Tk root, the custom title bar and the cached screens.
+    """
+
+    def __init__(self, max_screens=MAX_CACHED_SCREENS):
+        self.root = tk.Tk()
+        self.size = (DEFAULT_WIDTH, DEFAULT_HEIGHT)
+        self.title_bar, self.menu_button = config.center_window(
+            self.root, DEFAULT_WIDTH, DEFAULT_HEIGHT, "EVO RFID Printer", show_menu=True
+        )
+        self.root.configure(bg=config.BACKGROUND_COLOR)
+        self.menu_button.config(command=self._show_menu)
+        self.menu_visible = True
+
+        self.content = tk.Frame(self.root, bg=config.BACKGROUND_COLOR)
+        self.content.pack(fill="both", expand=True)
+
+        self.max_screens = max_screens
+        self.screens = OrderedDict()  # name -> frame, least recently shown first
+        self.current = None
+        self.running = False
+
+    def _show_menu(self):
+        from ui.login_interface import show_logout_menu
+        show_logout_menu(self.root, self.menu_button)
+
+    def _set_menu_visible(self, visible):
+        if visible == self.menu_visible:
+            return
+        if visible:
+            self.menu_button.pack(side="right", padx=5, before=self.title_bar.minimize_button)
+        else:
+            self.menu_button.pack_forget()
+        self.menu_visible = visible
+
+    def show(self, name, build, title, args=(), width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, show_menu=True):
+        """
+        Show the screen `name`. On first use the screen is built with `build(frame, *args)`;
+        a cached screen is shown as it was left, after calling `frame.refresh(*args)` if
+        the builder defined one.
+        """
+        frame = self.screens.get(name)
+        if frame is None:
+            frame = tk.Frame(self.content, bg=config.BACKGROUND_COLOR)
+            try:
+                build(frame, *args)
+            except Exception:
+                frame.destroy()
+                raise
+            self.screens[name] = frame
+        else:
+            self.screens.move_to_end(name)
+            refresh = getattr(frame, "refresh", None)
+            if refresh is not None:
+                refresh(*args)
+
+        if self.current is not None and self.current is not frame:
+            self.current.pack_forget()
+        frame.pack(fill="both", expand=True)
+        frame.tkraise()
+        self.current = frame
+
+        self.title_bar.title_label.config(text=title)
+        self.root.title(title)
+        self._set_menu_visible(show_menu)
+        if (width, height) != self.size:
+            self.size = (width, height)
+            config.center_geometry(self.root, width, height)
+
+        self._evict()
+        return frame
+
+    def drop(self, name):
+        """
+        Destroy a cached screen so it is rebuilt the next time it is shown.
+        """
+        frame = self.screens.pop(name, None)
+        if frame is not None:
+            if frame is self.current:
+                self.current = None
+            frame.destroy()
+
+    def drop_all(self, keep=()):
+        for name in list(self.screens):
+            if name not in keep:
+                self.drop(name)
+
+    def _evict(self):
+        for name in list(self.screens):
+            if len(self.screens) <= self.max_screens + 1:
+                break
+            if self.screens[name] is not self.current:
+                self.drop(name)
+
+
+_shell = None
+
+
+def get_shell():
+    """
+    Return the application shell, creating the Tk root on first use.
+    """
+    global _shell
+    if _shell is None:
+        _shell = AppShell()
+    return _shell
+
+
+def show_screen(name, build, title, args=(), width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, show_menu=True):
+    return get_shell().show(name, build, title, args, width, height, show_menu)
+
+
+def drop_screens(keep=()):
+    """
+    Forget the cached screens (e.g. on logout) except those named in `keep`.
+    """
+    if _shell is not None:
+        _shell.drop_all(keep)
+
+
+def run():
+    """
+    Run the Tk main loop unless it is already running (navigation from a callback).
+    """
+    global _shell
+    shell = get_shell()
+    if shell.running:
+        return
+    shell.running = True
+    try:
+        shell.root.mainloop()
+    finally:
+        if _shell is shell:
+            _shell = None
+
+
+def close():
+    """
+    Close the application window and end the main loop.
+    """
+    global _shell
+    shell, _shell = _shell, None
+    if shell is not None:
+        shell.root.quit()
+        shell.root.destroy()
@@ -0,0 +1,70 @@
+"""
+Input-change scheduler of a screen. The UI tasks that follow input changes (the label
+preview, the inventory-ID validation and autocomplete) are triggered through it rather
+than called directly: the triggers of a task fired within its delay of each other, as
+one user action often fires several, collapse into a single run once they stop, which
+then reads the latest state of the form.
+
+Every run records how many triggers it absorbed (evo_input_triggers_per_run) and the
+triggers are counted by source (evo_input_triggers_total), so the runs per user action
+can be followed in the metrics.
+"""
+import logging
+from metrics import INPUT_RUNS, INPUT_TRIGGERS, INPUT_TRIGGERS_PER_RUN
+
+
+class InputScheduler:
+    """
+    Coalesces triggers of named tasks with `widget.after`; use from the Tk thread only.
+    """
+
+    def __init__(self, widget):
+        self.widget = widget
+        self._tasks = {}  # name -> (func, delay_ms)
+        self._pending = {}  # name -> (after id, sources of the coalesced triggers)
+        self.runs = {}  # name -> runs so far
+        self.triggers = {}  # name -> triggers so far
+
+    def add_task(self, name, func, delay_ms):
+        """
+        Register `func` to run `delay_ms` after the last trigger of `name`.
+        """
+        self._tasks[name] = (func, delay_ms)
+
+    def trigger(self, name, source):
+        """
+        Ask for a run of `name` because of `source` (the input that changed), postponing a pending one.
+        """
+        delay_ms = self._tasks[name][1]
+        INPUT_TRIGGERS.inc(task=name, source=source)
+        self.triggers[name] = self.triggers.get(name, 0) + 1
+        after_id, sources = self._pending.pop(name, (None, []))
+        if after_id is not None:
+            self.widget.after_cancel(after_id)
+        sources.append(source)
+        self._pending[name] = (self.widget.after(delay_ms, self._run, name), sources)
+
+    def flush(self, name):
+        """
+        Run `name` now if a run is pending.
+        """
+        if name in self._pending:
+            self.widget.after_cancel(self._pending[name][0])
+            self._run(name)
+
+    def cancel(self, name=None):
+        """
+        Drop the pending run of `name` (of every task by default).
+        """
+        for task in [name] if name is not None else list(self._pending):
+            pending = self._pending.pop(task, None)
+            if pending is not None:
+                self.widget.after_cancel(pending[0])
+
+    def _run(self, name):
+        _, sources = self._pending.pop(name)
+        self.runs[name] = self.runs.get(name, 0) + 1
+        INPUT_RUNS.inc(task=name)
+        INPUT_TRIGGERS_PER_RUN.observe(len(sources), task=name)
+        logging.debug("Running %s once for %d input changes (%s)", name, len(sources), ", ".join(sources))
+        self._tasks[name][0]()
@@ -1,28 +1,103 @@
+import threading
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import messagebox, simpledialog
 import config
-import auth
-from ui.main_interface import main
-from database import fetch_po_number
-from printer import detect_printers, select_printer
-from PIL import Image, ImageTk
+import startup
+import profiling
+from ui import app_shell
+
+# NOTE: keep the imports above light. requests, PIL, tkcalendar and the printer
+# backends are imported in the background by startup.py while the login window is shown.
+
+# A cached session is only resumed once per launch; afterwards the login screen is shown
+_resume_tried = False
 
 def show_login():
     """
-    Display the login window.
+    Display the login screen, starting the main loop if it isn't running yet.
+    """
+    import session
+    session.set_password_prompt(ask_password_again)
+
+    if _resume_session():
+        app_shell.run()
+        return
+
+    app_shell.show_screen(
+        "login",
+        build_login_screen,
+        "EVO RFID Printer - Secure Access",
+        width=500,
+        height=550,
+        show_menu=False,  # No menu button for login page
+    )
+
+    # Warm up imports and discover printers while the user types credentials
+    startup.start_background_init()
+
+    app_shell.run()
+
+def _resume_session():
+    """
+    Skip the login screen when the previous run left a valid session on disk.
+    """
+    global _resume_tried
+    if _resume_tried:
+        return False
+    _resume_tried = True
+
+    import session
+    cached_session = session.load()
+    if cached_session is None:
+        return False
+
+    import auth
+    auth.resume_session(cached_session)
+
+    # Start the background work and the PO fetch right away, there is no login to wait for
+    startup.start_background_init()
+    startup.start_po_prefetch()
+    app_shell.get_shell().root.after(0, start_main_application)
+    return True
+
+def ask_password_again(username):
+    """
+    Ask the password of `username` when the session can't be renewed otherwise.
+    Called from any thread; returns None when the user cancels.
+    """
+    root = app_shell.get_shell().root
+
+    def ask():
+        return simpledialog.askstring(
+            "Session Expired",
+            f"Your session has expired. Enter the password of {username} to continue:",
+            show="*",
+            parent=root,
+        )
+
+    if threading.current_thread() is threading.main_thread():
+        return ask()
+
+    # Worker threads (print runs, background renewal) wait for the answer from the UI thread
+    answer = {}
+    done = threading.Event()
+
+    def ask_on_ui_thread():
+        try:
+            answer["password"] = ask()
+        finally:
+            done.set()
+
+    root.after(0, ask_on_ui_thread)
+    done.wait()
+    return answer.get("password")
+
+def build_login_screen(screen):
+    """
+    Build the login screen into the `screen` frame of the app shell.
     """
-    login_window = tk.Tk()
-    window_width = 500
-    window_height = 550
-    result = config.center_window(login_window, window_width, window_height, "EVO RFID Printer - Secure Access", show_menu=False)
-    
-    # Configure background
-    login_window.configure(bg=config.BACKGROUND_COLOR)
-    
-    # No menu button for login page (show_menu=False)
-    
     # Main container with adjusted padding
-    main_container = tk.Frame(login_window, bg=config.BACKGROUND_COLOR)
+    main_container = tk.Frame(screen, bg=config.BACKGROUND_COLOR)
     main_container.pack(fill='both', expand=True, padx=30, pady=30)
     
     # Login Card
@@ -41,10 +116,10 @@ def show_login():
     card_content.grid_columnconfigure(1, weight=2)  # Give more weight to textbox column
     card_content.grid_columnconfigure(2, weight=1)
     
-    # Logo
+    # Logo (cached per process, see assets.py)
     try:
-        logo_image = Image.open("attached_assets/Evo200pixel_1757673015542.png")
-        logo_photo = ImageTk.PhotoImage(logo_image)
+        import assets
+        logo_photo = assets.get_photo(assets.EVO_LOGO, master=screen)
         logo_label = tk.Label(card_content, image=logo_photo, bg=config.CARD_COLOR)
         logo_label.image = logo_photo  # Keep a reference to prevent garbage collection
         logo_label.grid(row=1, column=0, columnspan=3, pady=(0, 20), sticky='ew')
@@ -79,15 +154,17 @@ def show_login():
             messagebox.showwarning("Login Required", "Please enter both username and password.")
             return
         
+        import auth
+        
         # Disable login button and show loading state
         login_button.config(text="Logging in...", state=tk.DISABLED)
-        login_window.update_idletasks()
+        screen.update_idletasks()
         
         try:
             # Attempt login
             if auth.login(username, password):
-                # Login successful - close login window and start main application
-                login_window.destroy()
+                # Login successful - start main application
+                password_entry.delete(0, tk.END)
                 start_main_application()
             else:
                 # Login failed
@@ -95,7 +172,7 @@ def show_login():
                 password_entry.delete(0, tk.END)  # Clear password field
         finally:
             # Restore login button state if window still exists
-            if login_window.winfo_exists():
+            if screen.winfo_exists():
                 login_button.config(text="Login", state=tk.NORMAL)
     
     def handle_enter(event):
@@ -111,52 +188,72 @@ def show_login():
     login_button.grid(row=5, column=1, pady=(30, 10), sticky='w')  # Left justified with textboxes
     
     # Bind Enter key to login
-    login_window.bind('<Return>', handle_enter)
     username_entry.bind('<Return>', handle_enter)
     password_entry.bind('<Return>', handle_enter)
     
+    def reset_form():
+        """Clear the password and focus the username when the login screen is shown again"""
+        password_entry.delete(0, tk.END)
+        login_button.config(text="Login", state=tk.NORMAL)
+        username_entry.focus_set()
+
+    screen.refresh = reset_form
+
     # Focus on username field
     username_entry.focus_set()
-    
-    # Start the login window
-    login_window.mainloop()
 
 def start_main_application():
     """
     Start the main RFID application after successful login.
     """
     try:
-        # Detect available printers
-        available_printers = detect_printers()
-        
-        # Handle printer selection (auto-select if one, show UI if multiple)
-        selected_printer = select_printer(available_printers)
+        from printer import detect_printers, select_printer
+
+        # Fetch PO numbers in the background while the printer is being selected
+        startup.start_po_prefetch()
+
+        # Printers were discovered in the background while the login window was shown
+        available_printers = detect_printers(startup.get_printers())
         
+        # Handle printer selection (auto-select if one, show the selection screen if multiple)
+        select_printer(available_printers, on_selected=show_po_selection)
+    except Exception as e:
+        messagebox.showerror("Application Error", f"Failed to start application: {e}")
+        # Return to login on error
+        show_login()
+
+def show_po_selection(selected_printer):
+    """
+    Continue to the PO selection once a printer has been selected.
+    """
+    try:
+        from ui.main_interface import main
+
         # Check if user cancelled printer selection
         if not selected_printer:
+            startup.reset()
             messagebox.showinfo("Printer Required", "A printer must be selected to use the application.")
             show_login()
             return
         
-        # Fetch PO numbers
-        po_numbers = fetch_po_number()
+        # Collect the prefetched first page of PO numbers
+        po_page, error_msg = startup.get_po_numbers()
         
-        if not po_numbers:
-            root = tk.Tk()
-            root.withdraw()
+        if po_page is None or not po_page.po_numbers:
             msg = "No Purchase Order available."
-            from database import get_err_msg
-            error_msg = get_err_msg()
             if error_msg:
                 msg += f"\n{error_msg}"
             messagebox.showwarning("No PO numbers", msg)
-            root.destroy()
             # Don't exit, return to login
             show_login()
             return
         
         # Start main interface with logout functionality
-        main(po_numbers)
+        main(po_page)
+
+        # Once the PO screen is up, offer to resume a print run a crash left unfinished
+        from ui.ui_item_selection import offer_unfinished_runs
+        app_shell.get_shell().root.after(100, offer_unfinished_runs)
     except Exception as e:
         messagebox.showerror("Application Error", f"Failed to start application: {e}")
         # Return to login on error
@@ -184,6 +281,8 @@ def show_logout_menu(parent_window, menu_button):
     # Create popup menu
     menu = tk.Menu(parent_window, tearoff=0)
     menu.add_command(label="Logout", command=lambda: handle_logout(parent_window))
+    profiling_var = tk.BooleanVar(master=menu, value=profiling.is_enabled())
+    menu.add_checkbutton(label="Profiling", variable=profiling_var, command=lambda: toggle_profiling(profiling_var.get()))
     menu.add_command(label="Exit", command=lambda: handle_exit(parent_window))
     
     # Show menu below the button (since button is now at top)
@@ -191,6 +290,17 @@ def show_logout_menu(parent_window, menu_button):
     y = menu_button.winfo_rooty() + 30  # Show below the button
     menu.tk_popup(x, y)
 
+def toggle_profiling(enabled):
+    """
+    Turn profiling (span timings and a sampling profile of each print run) on or off.
+    """
+    profiling.set_mode("sample" if enabled else "off")
+    if enabled:
+        messagebox.showinfo(
+            "Profiling",
+            "Profiling is on. Each print run writes a profile next to app.log until it is turned off.",
+        )
+
 def handle_logout(current_window):
     """
     Handle logout process.
@@ -198,12 +308,14 @@ def handle_logout(current_window):
     # Confirm logout
     if messagebox.askyesno("Logout", "Are you sure you want to logout?"):
         # Perform logout
+        import auth
         auth.logout()
+        startup.reset()
         
-        # Close current window
-        current_window.destroy()
+        # Forget the screens of this session, the next user starts from fresh ones
+        app_shell.drop_screens(keep=("login",))
         
-        # Show login window again
+        # Show login screen again
         show_login()
 
 def handle_exit(current_window):
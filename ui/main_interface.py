@@ -1,82 +1,142 @@
+import contextvars
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
-from database import fetch_po_number, fetch_warehouse, fetch_items
+from database import get_po_page, get_warehouses, invalidate_po_pages
 import config # Import the config module directly
 # from config import center_window, BUTTON_STYLE, HEADER_STYLE # Removed specific imports
-from ui.ui_item_selection import second_interface
 import auth
+import startup
+import station
+from ui import app_shell
+
+# The PO dropdown shows one page of POs at a time; typing searches the server by prefix
+PO_SEARCH_DELAY_MS = 300  # pause in typing before searching
+MORE_PO_ENTRY = "More results…"
 
 # Main Interface to start the program + PO Number Selector
-def main(initial_po_numbers=None):
+def main(initial_po_page=None):
     # Check if user is authenticated before allowing access
     if not auth.is_authenticated():
         # Import and show login instead of continuing
         from ui.login_interface import show_login
         show_login()
         return
-    
-    root = tk.Tk()
-    window_width = 700
-    window_height = 650
-    result = config.center_window(root, window_width, window_height, "Generate RFID Tag (Step 1 of 2)", show_menu=True)
-    
-    # Configure root background
-    root.configure(bg=config.BACKGROUND_COLOR)
-    
-    # Connect menu button functionality if menu was created
-    if result and isinstance(result, tuple) and len(result) == 2:
-        title_bar, menu_button = result
-        from ui.login_interface import show_logout_menu
-        menu_button.config(command=lambda: show_logout_menu(root, menu_button))
 
+    # The screen is built once and reused; a new first page of POs refreshes the cached screen
+    app_shell.show_screen("po_selection", build_po_screen, "Generate RFID Tag (Step 1 of 2)", args=(initial_po_page,))
+
+def build_po_screen(screen, initial_po_page=None):
+    """
+    Build the PO selection screen into the `screen` frame of the app shell, starting
+    with `initial_po_page` (a database.PoPage) if given.
+    """
     # Variables
     selected_po = tk.StringVar()
     warehouse_var = tk.StringVar()
-    #warehouse_id = None  # initially None or "1"
-    warehouse_id = 1 # NOTE: need to hard coded warehouse_id since we don't use it anymore in Odoo
+    warehouse_map = {}  # name -> id
+    # The last warehouse used on this station, until the list says otherwise
+    warehouse_id = station.get_last_warehouse() or config.DEFAULT_WAREHOUSE_ID
+
+    # Loaded POs of the current search: the pages fetched so far, in server order
+    search = {"prefix": "", "page": 0, "has_more": False, "total": None, "seq": 0}
+    po_numbers = []
+    search_timer = None
+
+    def show_po_numbers(open_list=False):
+        """Fill the dropdown with the loaded POs, plus an entry loading the next page"""
+        values = [po[0] for po in po_numbers]
+        if search["has_more"]:
+            values.append(MORE_PO_ENTRY)
+        dropdown_po['values'] = values
+        shown = f"{len(po_numbers)} of {search['total']}" if search["total"] is not None else str(len(po_numbers))
+        matching = f' starting with "{search["prefix"]}"' if search["prefix"] else ""
+        po_hint.config(text=f"Showing {shown} POs{matching}. Type to search by PO number.")
+        if open_list and values:
+            try:
+                dropdown_po.tk.call("ttk::combobox::Post", dropdown_po)
+            except tk.TclError:
+                pass
+
+    def load_po_page(prefix, page, force=False, on_done=None):
+        """
+        Fetch a page of POs on a worker thread; only the latest request updates the screen.
+        `on_done(result, current)` is called either way, `current` telling whether it did.
+        """
+        search["seq"] += 1
+        seq = search["seq"]
+
+        def apply(result):
+            nonlocal po_numbers
+            current = seq == search["seq"]  # Otherwise a newer search was started meanwhile
+            if current and result.ok:
+                page_data = result.data
+                po_numbers = page_data.po_numbers if page == 1 else po_numbers + page_data.po_numbers
+                search.update(prefix=prefix, page=page, has_more=page_data.has_more, total=page_data.total)
+                show_po_numbers(open_list=page > 1)
+            elif current:
+                po_hint.config(text=f"Could not load the POs: {result.error}")
+            if on_done:
+                on_done(result, current)
+
+        def fetch():
+            screen.after(0, apply, get_po_page(prefix, page, force=force))
+
+        threading.Thread(target=contextvars.copy_context().run, args=(fetch,), name="po-page", daemon=True).start()
+
+    def schedule_search(event=None):
+        """Search the server for the typed prefix once typing pauses"""
+        nonlocal search_timer
+        if event is not None and event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        prefix = selected_po.get().strip()
+        if search_timer is not None:
+            screen.after_cancel(search_timer)
+            search_timer = None
+        if prefix == search["prefix"] and search["page"]:
+            return
+        search_timer = screen.after(PO_SEARCH_DELAY_MS, lambda: load_po_page(prefix, 1))
 
     def refresh_po_numbers():
         """Refresh the PO numbers list with loading state"""
-        nonlocal po_numbers
-        
-        # Store original text and disable buttons during loading
-        original_refresh_text = refresh_button.cget('text')
-        original_next_state = next_button.cget('state')
-        
         # Set loading state
         refresh_button.config(text="Loading Data...", state=tk.DISABLED)
         next_button.config(state=tk.DISABLED)
-        dropdown_po.config(state=tk.DISABLED)
-        
-        # Update the UI to show loading state immediately
-        root.update_idletasks()
-        
-        try:
-            # Fetch new PO numbers
-            po_numbers = fetch_po_number()
-            
-            if not po_numbers:
-                messagebox.showwarning("No PO numbers", "No Purchase Orders available.")
-                dropdown_po['values'] = []
-                selected_po.set('')
-            else:
-                dropdown_po['values'] = [po[0] for po in po_numbers]
-                # Keep the current selection if it still exists in the new list
-                current_selection = selected_po.get()
-                if current_selection in [po[0] for po in po_numbers]:
-                    selected_po.set(current_selection)
-        
-        finally:
+        invalidate_po_pages()
+
+        def finish(result, current):
+            if current:
+                if not result.ok:
+                    messagebox.showwarning("No PO numbers", f"No Purchase Orders available.\n{result.error}")
+                elif not po_numbers and not search["prefix"]:
+                    messagebox.showwarning("No PO numbers", "No Purchase Orders available.")
+                if selected_po.get() not in [po[0] for po in po_numbers]:
+                    # Keep the current selection only if it still exists in the new list
+                    selected_po.set(search["prefix"])
             # Restore original state regardless of success/failure
-            refresh_button.config(text=original_refresh_text, state=tk.NORMAL)
-            dropdown_po.config(state="readonly")
+            refresh_button.config(text="↻ Refresh", state=tk.NORMAL)
             update_next_button_state()
 
-    # Use pre-fetched PO numbers if available, otherwise fetch them
-    po_numbers = initial_po_numbers if initial_po_numbers is not None else fetch_po_number()
+        load_po_page(search["prefix"], 1, force=True, on_done=finish)
+
+        load_warehouses(lambda: get_warehouses(force=True))
+
+    def set_po_page(po_page):
+        """Show a freshly fetched first page of POs when returning to the cached screen"""
+        nonlocal po_numbers
+        if po_page is None:
+            return  # Keep the list as it was left, Refresh updates it on demand
+        search["seq"] += 1  # Drop a search still in flight
+        po_numbers = list(po_page.po_numbers)
+        search.update(prefix=po_page.prefix, page=po_page.page, has_more=po_page.has_more, total=po_page.total)
+        if selected_po.get() not in [po[0] for po in po_numbers]:
+            selected_po.set('')
+        show_po_numbers()
+
+    screen.refresh = set_po_page
 
     # Main container with padding
-    main_container = tk.Frame(root, bg=config.BACKGROUND_COLOR)
+    main_container = tk.Frame(screen, bg=config.BACKGROUND_COLOR)
     main_container.pack(fill='both', expand=True, padx=50, pady=50)
 
 
@@ -94,7 +154,7 @@ def main(initial_po_numbers=None):
     # Add instruction text
     instruction_label = tk.Label(
         card_content, 
-        text="Select a Purchase Order from the dropdown. If you don't see it, click Refresh to update the list, then click Continue to proceed.",
+        text="Select a Purchase Order from the dropdown or type the start of its number to search. If you don't see it, click Refresh to update the list, then click Continue to proceed.",
         font=config.FONT_BODY,
         bg=config.CARD_COLOR,
         fg=config.SECONDARY_COLOR,
@@ -115,8 +175,8 @@ def main(initial_po_numbers=None):
     dropdown_po = ttk.Combobox(
         po_selector_frame, 
         textvariable=selected_po, 
-        values=[po[0] for po in po_numbers] if po_numbers else [], 
-        state="readonly", 
+        values=[], 
+        state="normal", 
         width=15,
         style='Fluent.TCombobox',
         font=config.FONT_PO_DROPDOWN
@@ -144,24 +204,84 @@ def main(initial_po_numbers=None):
     )
     refresh_button.pack(side='left')
 
+    po_hint = tk.Label(
+        card_content,
+        text="",
+        font=config.FONT_SMALL,
+        bg=config.CARD_COLOR,
+        fg=config.SECONDARY_COLOR,
+        anchor='w'
+    )
+    po_hint.pack(fill='x', pady=(5, 0))
 
-    # Step 2: Select Warehouse (Commented out as per original code)
-    # warehouse_map = fetch_warehouse()
-    # tk.Label(root, text="Step 2: Select Warehouse:", **HEADER_STYLE).pack(pady=10)
-    # dropdown = ttk.Combobox(root, textvariable=warehouse_var, values=list(warehouse_map.keys()), state="readonly", width=38)
-    # dropdown.pack()
+    # Start with the prefetched first page, or fetch it without blocking the screen
+    if initial_po_page is not None:
+        set_po_page(initial_po_page)
+    else:
+        po_hint.config(text="Loading Purchase Orders...")
+        load_po_page("", 1)
 
-    # # Pre-select the first warehouse key
-    # if warehouse_map:
-    #     first_warehouse_key = list(warehouse_map.keys())[0]
-    #     warehouse_var.set(first_warehouse_key)
-    #     warehouse_id = warehouse_map[first_warehouse_key]
+
+    # Warehouse selection (the list is cached, see database.get_warehouses)
+    warehouse_frame = tk.Frame(card_content, bg=config.CARD_COLOR)
+    warehouse_frame.pack(fill='x', pady=(15, 0))
+    tk.Label(
+        warehouse_frame,
+        text="Warehouse",
+        font=config.FONT_BODY,
+        bg=config.CARD_COLOR,
+        fg=config.SECONDARY_COLOR,
+    ).pack(anchor='w')
+    dropdown_warehouse = ttk.Combobox(
+        warehouse_frame,
+        textvariable=warehouse_var,
+        values=[],
+        state="readonly",
+        width=38,
+        style='Fluent.TCombobox',
+        font=config.FONT_BODY
+    )
+    dropdown_warehouse.pack(anchor='w', pady=(5, 0))
+
+    def set_warehouses(new_warehouse_map):
+        """Show the warehouse list, preselecting the current or last used warehouse"""
+        nonlocal warehouse_map, warehouse_id
+        if new_warehouse_map:
+            warehouse_map = new_warehouse_map
+        if not warehouse_map:
+            # The list could not be fetched: keep using the last known warehouse
+            dropdown_warehouse['values'] = []
+            warehouse_var.set(f"Warehouse {warehouse_id} (list unavailable)")
+            dropdown_warehouse.config(state=tk.DISABLED)
+            return
+        dropdown_warehouse['values'] = list(warehouse_map)
+        dropdown_warehouse.config(state="readonly")
+        if warehouse_var.get() not in warehouse_map:
+            names = [name for name, wid in warehouse_map.items() if wid == warehouse_id]
+            warehouse_var.set(names[0] if names else next(iter(warehouse_map)))
+        warehouse_id = warehouse_map[warehouse_var.get()]
+
+    def load_warehouses(fetch):
+        """Fetch the warehouse list with `fetch` on a worker thread and show it when it arrives"""
+        def run():
+            warehouses = fetch()
+            screen.after(0, set_warehouses, warehouses)
+
+        threading.Thread(target=contextvars.copy_context().run, args=(run,), name="warehouses", daemon=True).start()
+
+    # Usually prefetched during login; until it arrives the last used warehouse applies
+    warehouse_var.set("Loading warehouses...")
+    dropdown_warehouse.config(state=tk.DISABLED)
+    load_warehouses(startup.get_warehouses)
 
     def handle_next_button():
         """Handle next button click with validation"""
         if not selected_po.get():
             messagebox.showwarning("Selection Required", "Select Purchase Order before you click Continue")
             return
+        if selected_po.get() not in [po[0] for po in po_numbers]:
+            messagebox.showwarning("Selection Required", f"{selected_po.get()} is not an active Purchase Order. Select one from the list.")
+            return
         
         check_items_and_proceed()
     
@@ -175,22 +295,30 @@ def main(initial_po_numbers=None):
         dropdown_po.config(state=tk.DISABLED)
         
         # Update the UI to show loading state immediately
-        root.update_idletasks()
+        screen.update_idletasks()
         
         try:
-            items = fetch_items(po_num, warehouse_id)
+            # Usually prefetched when the PO was selected; only a prefetch for this warehouse is used
+            items = startup.get_items(po_num, warehouse_id)
             
             if not items:
                 messagebox.showwarning("No Items Found", f"We could not locate any item for {po_num}. Please check and try again.")
                 return  # Stay on current window
             
+            station.set_last_warehouse(warehouse_id)
             # Only proceed if items exist - pass the fetched items
-            second_interface(root, po_num, warehouse_id, items)
+            from ui.ui_item_selection import second_interface
+            second_interface(po_num, warehouse_id, items)
             
         finally:
             # Restore original state if user returns to this window
             next_button.config(text=original_next_text, state=tk.NORMAL)
-            dropdown_po.config(state="readonly")
+            dropdown_po.config(state="normal")
+
+    def prefetch_items():
+        """Start loading the items of the selected PO while the user reviews the selection"""
+        if selected_po.get() in [po[0] for po in po_numbers]:
+            startup.start_items_prefetch(selected_po.get(), warehouse_id)
 
     # Function to update the Next button state
     def update_next_button_state():
@@ -199,18 +327,33 @@ def main(initial_po_numbers=None):
 
     # PO selection handler
     def on_po_select(event):
+        if selected_po.get() == MORE_PO_ENTRY:
+            # Load the next page of the current search and reopen the list on it
+            selected_po.set(search["prefix"])
+            load_po_page(search["prefix"], search["page"] + 1)
+            return
         update_next_button_state()
+        prefetch_items()
+
+    def on_po_return(event):
+        # Enter picks the PO when the search narrowed the list down to one
+        if len(po_numbers) == 1 and not search["has_more"] and search["prefix"] == selected_po.get().strip():
+            selected_po.set(po_numbers[0][0])
+            on_po_select(event)
 
     # Warehouse selection handler
-    # def on_warehouse_select(event):
-    #     nonlocal warehouse_id
-    #     selected_name = warehouse_var.get()
-    #     warehouse_id = warehouse_map.get(selected_name)
-    #     update_next_button_state()
+    def on_warehouse_select(event):
+        nonlocal warehouse_id
+        selected_name = warehouse_var.get()
+        warehouse_id = warehouse_map.get(selected_name, warehouse_id)
+        update_next_button_state()
+        prefetch_items()
 
     # Bind events
     dropdown_po.bind("<<ComboboxSelected>>", on_po_select)
-    #dropdown.bind("<<ComboboxSelected>>", on_warehouse_select)
+    dropdown_po.bind("<KeyRelease>", schedule_search)
+    dropdown_po.bind("<Return>", on_po_return)
+    dropdown_warehouse.bind("<<ComboboxSelected>>", on_warehouse_select)
 
     # Button section
     button_frame = tk.Frame(main_container, bg=config.BACKGROUND_COLOR)
@@ -225,5 +368,3 @@ def main(initial_po_numbers=None):
         **config.BUTTON_STYLE # Use config.BUTTON_STYLE
     )
     next_button.pack(side=tk.RIGHT)
-
-    root.mainloop()
\ No newline at end of file
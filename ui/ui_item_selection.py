@@ -1,47 +1,129 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, Canvas, Toplevel, Label
-from database import fetch_items, insert_into_stocks
+from database import fetch_items
 from tkcalendar import DateEntry
 from datetime import datetime
-from printer import print_zpl, wait_for_print_completion
-from zpl import wrap_text_by_words, generate_zpl_item_name, generate_zpl_preview, zpl_template
+from label_pipeline import LabelJob, generate_label_zpl, job_from_record, resume_label_job, run_label_job
+import run_journal
+from preview_cache import get_preview_cache, preview_key
 from config import last_exp_date, center_window, BUTTON_STYLE, LABEL_STYLE, HEADER_STYLE
 from PIL import ImageTk
 from database import logging
+from app_logging import log_context, new_run_id
 import re
 import threading
 import config # Import the config module to access colors and fonts
-import platform
 import auth
+import profiling
+from ui import app_shell
+from ui.input_scheduler import InputScheduler
+
+# Delays of the input-change tasks (see ui/input_scheduler.py), in ms after the last change
+PREVIEW_DELAY_MS = 50  # coalesces the changes of one user action
+VALIDATE_DELAY_MS = 300  # pause in typing the inventory ID
+AUTOCOMPLETE_DELAY_MS = 2000
 
-# Define variables to track the debounce timers
-debounce_timer = None
-autocomplete_timer = None
 ri_number = None
 
 # Global variable to store registered inventory IDs for autocomplete
 registered_inventory_ids = []
 
-# Function to generate tag IDs
-def generate_tag_ids(amount):
-    base_date = datetime.now().strftime("%y%m%d")
-    base_time = datetime.now().strftime("%H%M%S")
-    return [f"{base_date}{base_time}{str(i).zfill(4)}" for i in range(amount)]
+class PrintProgressWindow:
+    """
+    Progress bar window of a print run, with throughput, ETA and the per-stage breakdown.
+    """
+
+    def __init__(self, parent, total, done=0, title="Printing labels..."):
+        self.total = total
+        self.window = Toplevel(parent)
+        self.window.title("Printing Progress")
+
+        # Center the window on the screen
+        center_window(self.window, 360, 190)
+
+        Label(self.window, text=title).pack(pady=10)
+
+        self.progress_label = Label(self.window, text="Starting...")
+        self.progress_label.pack(pady=5)
+
+        self.progress_bar = ttk.Progressbar(self.window, length=300, mode="determinate")
+        self.progress_bar.pack(pady=10)
+        self.progress_bar["maximum"] = total
+        self.progress_bar["value"] = done
+
+        # Throughput, ETA and rolling per-stage breakdown
+        self.rate_label = Label(self.window, text="", font=config.FONT_SMALL)
+        self.rate_label.pack()
+        self.breakdown_label = Label(self.window, text="", font=config.FONT_SMALL, fg="gray")
+        self.breakdown_label.pack()
+
+    def update(self, idx, stats):
+        self.progress_bar["value"] = idx
+        self.progress_label.config(text=f"Printing {idx}/{self.total} tags...")
+        self.rate_label.config(text=stats.rate_text())
+        self.breakdown_label.config(text=stats.breakdown_text())
+        self.window.update_idletasks()
+
+    def destroy(self):
+        self.window.destroy()
+
+# Runs the operator chose to decide on later, not offered again in this session
+_postponed_runs = set()
+
+def offer_unfinished_runs():
+    """
+    Offer to resume a print run left unfinished by a crash or power loss: register the
+    labels it printed and continue from the next tag, or only register the printed labels.
+    """
+    journals = [journal for journal in run_journal.unfinished_runs() if journal.run_id not in _postponed_runs]
+    if not journals:
+        return
+    journal = journals[0]
+    answer = messagebox.askyesnocancel(
+        "Unfinished Print Run",
+        f"A print run did not finish:\n\n{journal.describe()}\n\n"
+        "Yes: register the printed labels and continue from the next tag\n"
+        "No: only register the printed labels and close the run\n"
+        "Cancel: decide later",
+    )
+    if answer is None:
+        _postponed_runs.add(journal.run_id)
+        offer_unfinished_runs()
+        return
+
+    root = app_shell.get_shell().root
+    job = job_from_record(journal.job)
+    progress = PrintProgressWindow(root, job.amount, done=journal.printed_count(), title="Resuming print run...")
+
+    def resume():
+        with log_context(run_id=journal.run_id):
+            result = resume_label_job(journal, on_progress=progress.update, print_remaining=answer)
+        progress.destroy()
+
+        def _report():
+            if result.ok:
+                messagebox.showinfo(
+                    "Print Run Resumed",
+                    f"{len(result.registered_tags)} printed labels registered and {len(result.printed_tags)} labels printed.",
+                )
+                offer_unfinished_runs()
+            else:
+                messagebox.showerror(result.error_title, result.error_message)
+                _postponed_runs.add(journal.run_id)
+
+        root.after(0, _report)
+
+    threading.Thread(target=resume, daemon=True).start()
 
 # Function to handle Item Selection UI
-def second_interface(root, po_number, warehouse_id, initial_items=None):
-    global last_exp_date
-    
+def second_interface(po_number, warehouse_id, initial_items=None):
     # Check if user is authenticated before allowing access
     if not auth.is_authenticated():
-        root.destroy()  # Close the previous window
         messagebox.showerror("Authentication Required", "You must login first to access this feature.")
         # Import and show login instead of continuing
         from ui.login_interface import show_login
         show_login()
         return
-    
-    root.destroy()
 
     # Lazy import to avoid circular dependency
     from ui.main_interface import main
@@ -53,61 +135,90 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
         main()
         return
 
+    # One cached screen per PO; returning to it keeps the form as it was left
+    app_shell.show_screen(
+        f"item_selection:{po_number}:{warehouse_id}",
+        build_item_screen,
+        "Generate RFID Tag (Step 2 of 2)",
+        args=(po_number, warehouse_id, items),
+    )
+
+def build_item_screen(screen, po_number, warehouse_id, items):
+    """
+    Build the item selection screen for a PO into the `screen` frame of the app shell.
+    """
+    global last_exp_date
+
+    # Lazy import to avoid circular dependency
+    from ui.main_interface import main
+
     def generate_zpl(tag_id, inventory_id, formatted_exp_date):
         """
         Generate the ZPL string for a given tag ID and Inventory ID.
         """
-        wrapped_lines = wrap_text_by_words(selected_item_details["item_name"], max_chars_per_line=28)
-        item_name_zpl = generate_zpl_item_name(wrapped_lines)
-        return zpl_template.format(
-            sku=selected_item_details["sku"],
-            item_name=item_name_zpl,
-            rfid_value=tag_id,
-            expiration_date=formatted_exp_date,
-            inventory_id=inventory_id,
-        )
+        return generate_label_zpl(selected_item_details, tag_id, inventory_id, formatted_exp_date)
+
+    previews = get_preview_cache()
+    shown_preview = None  # Key of the preview the canvas is waiting for or showing
+
+    def show_preview_text(text, fill="gray", font=("Arial", 14, "bold")):
+        preview_canvas.delete("all")
+        preview_canvas.create_text(165, 85, text=text, font=font, fill=fill, anchor="center")
 
+    def show_preview(key, image):
+        """
+        Draw a rendered preview, unless the inputs changed since it was asked for.
+        """
+        if key != shown_preview:
+            return
+        if image is None:
+            show_preview_text("Preview unavailable", fill="red", font=("Arial", 12))
+            return
+        preview_canvas.delete("all")  # Clear loading message
+        try:
+            preview_image = ImageTk.PhotoImage(image)
+            # Store the image reference in the canvas to prevent garbage collection
+            preview_canvas.image = preview_image
+            preview_canvas.create_image(0, 0, anchor="nw", image=preview_image)
+        except Exception as e:
+            logging.error(f"Error creating preview image: {e}")
+            show_preview_text("Preview unavailable", fill="red", font=("Arial", 12))
+
+    @profiling.profiled("update_preview")
     def update_preview():
         """
-        Update the print preview dynamically based on inputs.
+        Update the print preview dynamically based on inputs, from the pre-rendered
+        previews when available.
         """
+        nonlocal shown_preview
         if not selected_item_details:
             return
 
-        # Show loading message
-        preview_canvas.delete("all")
-        preview_canvas.create_text(
-            165, 85, 
-            text="Loading...", 
-            font=("Arial", 14, "bold"), 
-            fill="gray",
-            anchor="center"
-        )
-        preview_canvas.update_idletasks()
-
-        tag_id = generate_tag_ids(1)[0]  # Generate the first tag ID
+        item = dict(selected_item_details)
         formatted_exp_date = date_picker.get_date().strftime("%d %b %Y")
         inventory_id = entry_inventory_id.get().upper()
-        zpl_filled = generate_zpl(tag_id, inventory_id, formatted_exp_date)
-
-        # Generate preview image and display it
-        image = generate_zpl_preview(zpl_filled)
-        if image:
-            preview_canvas.delete("all")  # Clear loading message
-            try:
-                preview_image = ImageTk.PhotoImage(image)
-                # Store the image reference in the canvas to prevent garbage collection
-                preview_canvas.image = preview_image
-                preview_canvas.create_image(0, 0, anchor="nw", image=preview_image)
-            except Exception as e:
-                logging.error(f"Error creating preview image: {e}")
-                preview_canvas.create_text(
-                    165, 85, 
-                    text="Preview unavailable", 
-                    font=("Arial", 12), 
-                    fill="red",
-                    anchor="center"
-                )
+        shown_preview = preview_key(item, formatted_exp_date, inventory_id)
+        image = previews.request(item, formatted_exp_date, inventory_id,
+                                 on_ready=lambda key, image: screen.after(0, show_preview, key, image))
+        if image is not None:
+            show_preview(shown_preview, image)
+        else:
+            show_preview_text("Loading...")
+
+    def prerender_previews():
+        """
+        Render the previews of the other items of the PO in the background, first visible
+        first, with the current expiry. Selecting an item clears the inventory ID, so
+        that is how they will be shown.
+        """
+        formatted_exp_date = date_picker.get_date().strftime("%d %b %Y")
+        previews.prefetch(items, formatted_exp_date, "")
+
+    # Preview, validation and autocomplete follow the inputs through one scheduler, so the
+    # several changes of one user action lead to a single run of each
+    scheduler = InputScheduler(screen)
+    scheduler.add_task("preview", update_preview, PREVIEW_DELAY_MS)
+    scheduler.add_task("validate", lambda: validate_print_button("inventory_id"), VALIDATE_DELAY_MS)
 
     def is_valid_inventory_id(inventory_id):
         """
@@ -118,9 +229,10 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
         # Ensure it matches the pattern and has the correct length (8 characters)
         return bool(re.match(inventory_id_pattern, inventory_id))
     
-    def validate_print_button():
+    def validate_print_button(source="inventory_id"):
         """
-        Enable or disable the Print button based on validation.
+        Enable or disable the Print button based on validation, and refresh the preview
+        for a valid inventory ID (`source` is the input that changed).
         """
         inventory_id = entry_inventory_id.get().strip().upper()
         is_inventory_id_valid = is_valid_inventory_id(inventory_id)
@@ -130,7 +242,7 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
             fg="green" if is_inventory_id_valid else "red"
         )
         if is_inventory_id_valid:
-            update_preview()
+            scheduler.trigger("preview", source)
 
         # Enable the button only if both conditions are met
         print_button.config(state=tk.NORMAL if bool(selected_item_details) and is_inventory_id_valid else tk.DISABLED)
@@ -138,7 +250,7 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
     def on_item_select(event):
         global ri_number, registered_inventory_ids    
         selected_item = dropdown_items.get()
-        item = next((item for item in items if item["item_name"] == selected_item), None)
+        item = items.find_by_name(selected_item)
         if item:
             ri_number = item["receive_item_number"]
             selected_item_details.update(item)
@@ -153,11 +265,11 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
             entry_inventory_id_var.set("")
 
             # Populate the Registered Inventory-ID / BIN dropdown with inventory IDs from the selected item
-            registered_inventory_ids = item.get("inventory_id", [])
+            registered_inventory_ids = item.inventory_id  # Tuple shared between items
             # registered_inventory_id_dropdown["values"] = registered_inventory_ids
             # Update autocomplete combobox values
             entry_inventory_id["values"] = registered_inventory_ids
-            update_preview()  # Update preview dynamically
+            scheduler.trigger("preview", "item")  # Update preview dynamically
         else:
             # Clear details if no valid item is selected
             selected_item_details.clear()
@@ -167,7 +279,7 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
             registered_inventory_ids = []
             entry_inventory_id["values"] = []
 
-        validate_print_button()  # Re-validate the Print button
+        validate_print_button("item")  # Re-validate the Print button
 
     # def on_registered_inventory_select(event):
     #     global registered_inventory_ids
@@ -178,19 +290,9 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
 
     def on_inventory_id_change(*args):
         """
-        Validate the Inventory ID and update the preview with debouncing.
+        Validate the Inventory ID and update the preview once typing pauses.
         """
-        global debounce_timer
-
-        # Cancel any existing timer
-        if debounce_timer:
-            next_window.after_cancel(debounce_timer)
-
-        def delayed_update():
-            validate_print_button()  # Validate the Print button
-
-        # Set a new timer (e.g., 300ms)
-        debounce_timer = next_window.after(300, delayed_update)
+        scheduler.trigger("validate", "inventory_id")
 
     def validate_quantity(new_value):
         """
@@ -205,106 +307,41 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
         Action when print button is executed
         """
         def print_labels():
-            global ri_number
-            system_os = platform.system()
-            inventory_id = entry_inventory_id.get().upper()
-            amount = int(quantity_var.get())
-            exp_date = date_picker.get_date().strftime("%Y-%m-%d")
-            formatted_exp_date = date_picker.get_date().strftime("%d %b %Y")  # Format for ZPL template
-            tag_ids = generate_tag_ids(amount)
-
-            successful_count = 0
-            successful_tags = []
-    
-            # Print each tag
-            for idx, tag_id in enumerate(tag_ids, start=1):
-                if system_os == "Windows":
-                    # >>> COMMENT THIS BLOCK TO DISABLE PRINTING, START HERE >>>
-                    
-                    zpl_filled = generate_zpl(tag_id, inventory_id, formatted_exp_date)
-
-                    # Submit print job and check if it succeeds
-                    job_id = print_zpl(zpl_filled)  # Ensure this function returns job ID      
-                    if not job_id:
-                        progress_window.destroy()
-                        return
-          
-                    if not wait_for_print_completion(job_id):
-                        progress_window.destroy()
-                        error_msg = f"Print job for tag {tag_id} failed. {successful_count} tags were successfully printed."
-                        logging.error(error_msg)
-                        messagebox.showerror("Print Error", error_msg)
-                        next_window.destroy()
-                        return
-                    
-                    # <<< COMMENT BLOCK ENDS HERE <<<                 
-                else:  
-                    logging.info("Linux/Replit environment - using printer simulation and disable sending job to printer")                               
-                # Insert printed label data into database via REST API - Individual
-                if not insert_into_stocks(
-                    po_number=po_number,
-                    ri_number=ri_number,
-                    item_id=selected_item_details["item_id"],
-                    tag_id=tag_id,
-                    exp_date=exp_date,
-                    inventory_id=inventory_id,
-                    warehouse_id=warehouse_id,
-                ):
-                    progress_window.destroy()
-                    error_msg = f"Failed to insert tag {tag_id} into database. {successful_count} tags were successfully processed."
-                    logging.error(error_msg)
-                    messagebox.showerror("Database Error", error_msg)
-                    next_window.destroy()
-                    return
-                
-                # Update progress bar
-                progress_bar["value"] = idx
-                progress_label.config(text=f"Printing {idx}/{amount} tags...")
-                progress_window.update_idletasks()
-
-                # Track successful operations
-                successful_count += 1
-                successful_tags.append(tag_id)
-                
-            # Destroy progress window after printing is complete
-            progress_window.destroy()
+            with log_context(run_id=new_run_id()):
+                run_print_labels()
+
+        def run_print_labels():
+            job = LabelJob(
+                po_number=po_number,
+                item=selected_item_details,
+                inventory_id=entry_inventory_id.get().upper(),
+                exp_date=date_picker.get_date(),
+                amount=int(quantity_var.get()),
+                warehouse_id=warehouse_id,
+            )
+
+            result = run_label_job(job, on_progress=progress.update)
+            progress.destroy()
+            if not result.ok:
+                messagebox.showerror(result.error_title, result.error_message)
+                if result.status not in ("preflight_failed", "reservation_failed", "printer_offline"):
+                    screen.after(0, main)
+                return
 
             # Save the current expiration date as the last selected date (for ease of use)
             global last_exp_date
-            last_exp_date = date_picker.get_date()
+            last_exp_date = job.exp_date
 
-            # Log success
-            success_msg = f"All {successful_count} tags printed and processed successfully!"
-            logging.info(success_msg)
-            logging.info(f"Successful Tags: {successful_tags}")
+            success_msg = f"All {len(result.printed_tags)} tags printed and processed successfully!"
 
             # Schedule success message and navigation on the main thread for thread-safety
             def _success_and_return():
                 messagebox.showinfo("Success", success_msg)
-                next_window.destroy()
-                from ui.main_interface import main
                 main()
             
-            next_window.after(0, _success_and_return)
-
-        # Create a progress bar window
-        progress_window = Toplevel(next_window)
-        progress_window.title("Printing Progress")
-
-        # Center the window on the screen
-        window_width = 300
-        window_height = 120
-        center_window(progress_window, window_width, window_height)
-
-        Label(progress_window, text="Printing labels...").pack(pady=10)
+            screen.after(0, _success_and_return)
 
-        progress_label = Label(progress_window, text="Starting...")
-        progress_label.pack(pady=5)
-
-        progress_bar = ttk.Progressbar(progress_window, length=250, mode="determinate")
-        progress_bar.pack(pady=10)
-        progress_bar["maximum"] = int(quantity_var.get())
-        progress_bar["value"] = 0
+        progress = PrintProgressWindow(screen, int(quantity_var.get()))
 
         # Use a thread to prevent blocking the mainloop
         threading.Thread(target=print_labels, daemon=True).start()
@@ -359,20 +396,8 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
             font=config.FONT_BODY
         ).pack(side="left")
 
-    next_window = tk.Tk()
-    window_width = 700
-    window_height = 650
-    result = center_window(next_window, window_width, window_height, "Generate RFID Tag (Step 2 of 2)", show_menu=True)
-    next_window.configure(bg=config.BACKGROUND_COLOR)
-    
-    # Connect menu button functionality if menu was created
-    if result and isinstance(result, tuple) and len(result) == 2:
-        title_bar, menu_button = result
-        from ui.login_interface import show_logout_menu
-        menu_button.config(command=lambda: show_logout_menu(next_window, menu_button))
-
     # Main container
-    main_container = tk.Frame(next_window, bg=config.BACKGROUND_COLOR)
+    main_container = tk.Frame(screen, bg=config.BACKGROUND_COLOR)
     main_container.pack(fill='both', expand=True, padx=20, pady=20)
 
 
@@ -411,7 +436,7 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
     create_label_with_asterisk(form_frame, "Select Item:", row=0, column=0)
     selected_item_details = {}
     dropdown_items = ttk.Combobox(form_frame, state="readonly", width=50, style='Fluent.TCombobox')
-    dropdown_items["values"] = [item["item_name"] for item in items]
+    dropdown_items["values"] = items.names
     dropdown_items.grid(row=0, column=1, pady=5, sticky="w")
     dropdown_items.bind("<<ComboboxSelected>>", on_item_select)
 
@@ -420,7 +445,7 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
     frame_quantity = tk.Frame(form_frame, bg=config.CARD_COLOR)
     frame_quantity.grid(row=1, column=1, sticky="w", pady=5)
     quantity_var = tk.StringVar()
-    vcmd = next_window.register(validate_quantity)
+    vcmd = screen.register(validate_quantity)
     entry_quantity = config.create_fluent_entry(frame_quantity, textvariable=quantity_var, validate="key", validatecommand=(vcmd, "%P"), width=10)
     entry_quantity.pack(side="left")
     label_unit_name = tk.Label(frame_quantity, text="", **config.LABEL_STYLE)
@@ -439,7 +464,11 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
         **date_picker_style
     )
     date_picker.grid(row=2, column=1, sticky="w", pady=5)
-    date_picker.bind("<<DateEntrySelected>>", lambda event: update_preview())
+    def on_date_select(event):
+        scheduler.trigger("preview", "date")
+        prerender_previews()  # The previews rendered ahead were for the previous date
+
+    date_picker.bind("<<DateEntrySelected>>", on_date_select)
 
     # # Registered Inventory-ID / BIN
     # tk.Label(form_frame, text="Registered Inventory-ID:", **config.LABEL_STYLE).grid(row=3, column=0, sticky="nw", pady=5)
@@ -464,35 +493,31 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
     # Configure autocomplete behavior
     entry_inventory_id['values'] = registered_inventory_ids
     
+    def update_autocomplete():
+        """Filter the combobox values on the typed inventory ID and open the list"""
+        # Get current input
+        current_input = entry_inventory_id_var.get().upper()
+
+        if current_input == '':
+            # If input is empty, show all registered inventory IDs
+            entry_inventory_id['values'] = registered_inventory_ids
+        else:
+            # Filter registered inventory IDs that contain the current input
+            filtered_values = [inv_id for inv_id in registered_inventory_ids 
+                             if current_input in inv_id.upper()]
+            entry_inventory_id['values'] = filtered_values
+
+        # Automatically open the dropdown to show filtered results
+        if entry_inventory_id['values']:  # Only open if there are values to show
+            entry_inventory_id.focus_set()
+            entry_inventory_id.event_generate('<Alt-Down>')
+
     def on_autocomplete_keyrelease(event):
         """Filter combobox values based on user input for autocomplete with 2-second delay"""
-        global registered_inventory_ids, autocomplete_timer
-        
-        # Cancel any existing timer
-        if autocomplete_timer:
-            next_window.after_cancel(autocomplete_timer)
-        
-        def delayed_autocomplete_update():
-            # Get current input
-            current_input = entry_inventory_id_var.get().upper()
-            
-            if current_input == '':
-                # If input is empty, show all registered inventory IDs
-                entry_inventory_id['values'] = registered_inventory_ids
-            else:
-                # Filter registered inventory IDs that contain the current input
-                filtered_values = [inv_id for inv_id in registered_inventory_ids 
-                                 if current_input in inv_id.upper()]
-                entry_inventory_id['values'] = filtered_values
-                
-            # Automatically open the dropdown to show filtered results
-            if entry_inventory_id['values']:  # Only open if there are values to show
-                entry_inventory_id.focus_set()
-                entry_inventory_id.event_generate('<Alt-Down>')
-        
-        # Set a new timer for 2 seconds (2000ms)
-        autocomplete_timer = next_window.after(2000, delayed_autocomplete_update)
+        scheduler.trigger("autocomplete", "inventory_id")
     
+    scheduler.add_task("autocomplete", update_autocomplete, AUTOCOMPLETE_DELAY_MS)
+
     # Bind keyrelease event for autocomplete filtering
     entry_inventory_id.bind('<KeyRelease>', on_autocomplete_keyrelease)
     
@@ -501,7 +526,8 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
         """Handle selection from autocomplete dropdown"""
         selected_value = entry_inventory_id.get()
         entry_inventory_id_var.set(selected_value.upper())
-        validate_print_button()
+        scheduler.cancel("validate")  # Validated right away, not after the typing delay
+        validate_print_button("inventory_select")
     
     entry_inventory_id.bind('<<ComboboxSelected>>', on_autocomplete_select)
     inventory_id_status_label = tk.Label(frame_inventory, text="", **config.LABEL_STYLE)  # Validation status
@@ -544,7 +570,7 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
     cancel_button = tk.Button(
         button_container, 
         text="Cancel", 
-        command=next_window.destroy,
+        command=app_shell.close,
         **config.SECONDARY_BUTTON_STYLE
     )
     cancel_button.pack(side=tk.RIGHT, padx=(10, 0))
@@ -563,7 +589,7 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
     back_button = tk.Button(
         button_container, 
         text="← Back", 
-        command=lambda: [next_window.destroy(), main()],
+        command=main,
         **config.SECONDARY_BUTTON_STYLE
     )
     back_button.pack(side=tk.RIGHT, padx=(10, 0))
@@ -575,10 +601,24 @@ def second_interface(root, po_number, warehouse_id, initial_items=None):
             dropdown_items.set(items[0]["item_name"])
             # Trigger the selection event to populate related fields
             dropdown_items.event_generate("<<ComboboxSelected>>")
+            prerender_previews()
 
     # Set the first item as default selection if items are available
     # This is deferred until after the window is fully loaded for better performance
     if items:
-        next_window.after(100, defer_initialization)  # Defer by 100ms
-
-    next_window.mainloop()
\ No newline at end of file
+        screen.after(100, defer_initialization)  # Defer by 100ms
+
+    def refresh_items(new_po_number, new_warehouse_id, new_items):
+        """Show freshly fetched items when returning to the cached screen"""
+        nonlocal items
+        items = new_items
+        dropdown_items["values"] = items.names
+        if dropdown_items.get() not in dropdown_items["values"]:
+            dropdown_items.set(items[0]["item_name"] if items else "")
+        # Re-select the item so the RI number and autocomplete values belong to this screen again
+        inventory_id = entry_inventory_id_var.get()
+        on_item_select(None)
+        entry_inventory_id_var.set(inventory_id)
+        prerender_previews()
+
+    screen.refresh = refresh_items
\ No newline at end of file
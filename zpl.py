@@ -1,6 +1,6 @@
-import requests
-from PIL import Image
 from io import BytesIO
+import functools
+import re
 import textwrap
 from tkinter import messagebox
 
@@ -9,6 +9,7 @@ zpl_template = r"""
 ^XA
 ^RS,,,1,E,,,2
 ^RR10
+~RVE
 ^XZ
 ^XA
 ^SZ2^JMA
@@ -43,18 +44,72 @@ zpl_template = r"""
 ^XZ
 """
 
+# Serialized variant of zpl_template: the stored format takes the tag ID in ^FN2 (QR code),
+# ^FN3 (text) and ^FN4 (EPC), and one recall prints {quantity} labels whose tag IDs the
+# printer increments itself with ^SF (the last {serial_digits} digits, +1 per label)
+zpl_serialized_template = r"""
+^XA
+^RS,,,1,E,,,2
+^RR10
+~RVE
+^XZ
+^XA
+^SZ2^JMA
+^MCY^PMN
+^PW336^MTD
+^MNW
+^MMT
+^ML177
+^JZY
+^LH0,0^LRN
+^XZ
+^XA
+^DFE:SSFMT001.ZPL^FS
+^FT28,31
+^CI0
+^A0N,17,23^FN1^FH\^FD{sku}^FS
+^FT158,31
+^A0N,17,23^FDExp: {expiration_date}^FS
+{item_name}  ; Dynamically generated lines of item_name ZPL
+^FT84,140
+^A0N,14,19^FD{inventory_id}^FS
+^FO32,93
+^BQN,2,2^FN2^FS
+^FT83,117
+^A0N,11,15^FN3^FS
+^RFW,H,1,2,1^FD2400^FS
+^RFW,H,2,8,1^FN4^FS
+^XZ
+^XA
+^XFE:SSFMT001.ZPL^FS
+^FN2^FDLA,{rfid_value}^SF{serial_mask},1^FS
+^FN3^FD{rfid_value}^SF{serial_mask},1^FS
+^FN4^FD{rfid_value}^SF{serial_mask},1^FS
+^PQ{quantity},0,1,Y
+^XZ
+"""
+
+# Function to render a ZPL print preview without any UI (safe from worker threads)
+def render_zpl_preview(zpl_code, timeout=10):
+    """
+    Render `zpl_code` to a PIL image with the Labelary API. Raises on failure.
+    """
+    import requests  # Imported lazily to keep startup fast
+    from PIL import Image
+    label_width_inches = 42 / 25.4
+    label_height_inches = 20 / 25.4
+    api_url = f"https://api.labelary.com/v1/printers/8dpmm/labels/{label_width_inches}x{label_height_inches}/0/"
+    response = requests.post(api_url, data=zpl_code, stream=True, timeout=timeout)
+
+    if response.status_code == 200:
+        return Image.open(BytesIO(response.content))
+    else:
+        raise Exception(f"Labelary API Error: {response.status_code} - {response.text}")
+
 # Function to generate ZPL print preview
 def generate_zpl_preview(zpl_code):
     try:
-        label_width_inches = 42 / 25.4
-        label_height_inches = 20 / 25.4
-        api_url = f"https://api.labelary.com/v1/printers/8dpmm/labels/{label_width_inches}x{label_height_inches}/0/"
-        response = requests.post(api_url, data=zpl_code, stream=True)
-
-        if response.status_code == 200:
-            return Image.open(BytesIO(response.content))
-        else:
-            raise Exception(f"Labelary API Error: {response.status_code} - {response.text}")
+        return render_zpl_preview(zpl_code)
     except Exception as e:
         messagebox.showerror("Preview Error", f"Failed to generate preview: {e}")
         return None
@@ -75,3 +130,560 @@ def wrap_text_by_words(item_name, max_chars_per_line=28):
     Wrap text into multiple lines based on word boundaries.
     """
     return textwrap.wrap(item_name, width=max_chars_per_line)
+
+# QR codes as printed by ^BQN,2,2 (model 2, magnification 2) with "LA," field data (error
+# correction level L, automatic input mode), encoded here so label previews and label
+# checks don't need the Labelary service. The module matrix of each value is cached.
+
+QR_ECC_LEVELS = "LMQH"
+_QR_ECC_FORMAT_BITS = {"L": 1, "M": 0, "Q": 3, "H": 2}
+# Error correction codewords per block and number of blocks, by level and version (1-40)
+_QR_ECC_CODEWORDS_PER_BLOCK = {
+    "L": (7, 10, 15, 20, 26, 18, 20, 24, 30, 18, 20, 24, 26, 30, 22, 24, 28, 30, 28, 28,
+          28, 28, 30, 30, 26, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+    "M": (10, 16, 26, 18, 24, 16, 18, 22, 22, 26, 30, 22, 22, 24, 24, 28, 28, 26, 26, 26,
+          26, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28),
+    "Q": (13, 22, 18, 26, 18, 24, 18, 22, 20, 24, 28, 26, 24, 20, 30, 24, 28, 28, 26, 30,
+          28, 30, 30, 30, 30, 28, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+    "H": (17, 28, 22, 16, 22, 28, 26, 26, 24, 28, 24, 28, 22, 24, 24, 30, 28, 28, 26, 28,
+          30, 24, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+}
+_QR_ERROR_CORRECTION_BLOCKS = {
+    "L": (1, 1, 1, 1, 1, 2, 2, 2, 2, 4, 4, 4, 4, 4, 6, 6, 6, 6, 7, 8,
+          8, 9, 9, 10, 12, 12, 12, 13, 14, 15, 16, 17, 18, 19, 19, 20, 21, 22, 24, 25),
+    "M": (1, 1, 1, 2, 2, 4, 4, 4, 5, 5, 5, 8, 9, 9, 10, 10, 11, 13, 14, 16,
+          17, 17, 18, 20, 21, 23, 25, 26, 28, 29, 31, 33, 35, 37, 38, 40, 43, 45, 47, 49),
+    "Q": (1, 1, 2, 2, 4, 4, 6, 6, 8, 8, 8, 10, 12, 16, 12, 17, 16, 18, 21, 20,
+          23, 23, 25, 27, 29, 34, 34, 35, 38, 40, 43, 45, 48, 51, 53, 56, 59, 62, 65, 68),
+    "H": (1, 1, 2, 4, 4, 4, 5, 6, 8, 8, 11, 11, 16, 16, 18, 16, 19, 21, 25, 25,
+          25, 34, 30, 32, 35, 37, 40, 42, 45, 48, 51, 54, 57, 60, 63, 66, 70, 74, 77, 81),
+}
+_QR_ALPHANUMERIC = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+_QR_NUMERIC, _QR_ALNUM, _QR_BYTE = 1, 2, 4  # mode indicators
+_QR_MASKS = (
+    lambda x, y: (x + y) % 2 == 0,
+    lambda x, y: y % 2 == 0,
+    lambda x, y: x % 3 == 0,
+    lambda x, y: (x + y) % 3 == 0,
+    lambda x, y: (x // 3 + y // 2) % 2 == 0,
+    lambda x, y: x * y % 2 + x * y % 3 == 0,
+    lambda x, y: (x * y % 2 + x * y % 3) % 2 == 0,
+    lambda x, y: ((x + y) % 2 + x * y % 3) % 2 == 0,
+)
+
+# GF(256) arithmetic of the Reed-Solomon codes (primitive polynomial 0x11D)
+_GF_EXP = [0] * 512
+_GF_LOG = [0] * 256
+_value = 1
+for _power in range(255):
+    _GF_EXP[_power] = _value
+    _GF_LOG[_value] = _power
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11D
+for _power in range(255, 512):
+    _GF_EXP[_power] = _GF_EXP[_power - 255]
+del _value, _power
+
+
+def _gf_multiply(a, b):
+    return 0 if a == 0 or b == 0 else _GF_EXP[_GF_LOG[a] + _GF_LOG[b]]
+
+
+def _rs_divisor(degree):
+    """
+    Coefficients (highest first, leading 1 omitted) of the generator polynomial of `degree`.
+    """
+    result = [0] * (degree - 1) + [1]
+    root = 1
+    for _ in range(degree):
+        for index in range(degree):
+            result[index] = _gf_multiply(result[index], root)
+            if index + 1 < degree:
+                result[index] ^= result[index + 1]
+        root = _gf_multiply(root, 2)
+    return result
+
+
+def _rs_remainder(data, divisor):
+    result = [0] * len(divisor)
+    for byte in data:
+        factor = byte ^ result.pop(0)
+        result.append(0)
+        for index, coefficient in enumerate(divisor):
+            result[index] ^= _gf_multiply(coefficient, factor)
+    return result
+
+
+def _rs_syndromes_ok(block, ecc_length):
+    """
+    Whether the codeword `block` (data then error correction bytes) has no detectable error.
+    """
+    for power in range(ecc_length):
+        syndrome = 0
+        for byte in block:
+            syndrome = _gf_multiply(syndrome, _GF_EXP[power]) ^ byte
+        if syndrome:
+            return False
+    return True
+
+
+def _qr_size(version):
+    return version * 4 + 17
+
+
+def _qr_raw_codewords(version):
+    """
+    Codewords (data and error correction) a symbol of `version` holds.
+    """
+    modules = (16 * version + 128) * version + 64
+    if version >= 2:
+        alignments = version // 7 + 2
+        modules -= (25 * alignments - 10) * alignments - 55
+        if version >= 7:
+            modules -= 36
+    return modules // 8
+
+
+def _qr_data_codewords(version, ecc):
+    return (_qr_raw_codewords(version)
+            - _QR_ECC_CODEWORDS_PER_BLOCK[ecc][version - 1] * _QR_ERROR_CORRECTION_BLOCKS[ecc][version - 1])
+
+
+def _qr_alignment_positions(version):
+    if version == 1:
+        return []
+    alignments = version // 7 + 2
+    step = (version * 8 + alignments * 3 + 5) // (alignments * 4 - 4) * 2
+    return [6] + sorted(_qr_size(version) - 7 - index * step for index in range(alignments - 1))
+
+
+def _qr_count_bits(mode, version):
+    index = 0 if version <= 9 else 1 if version <= 26 else 2
+    return {_QR_NUMERIC: (10, 12, 14), _QR_ALNUM: (9, 11, 13), _QR_BYTE: (8, 16, 16)}[mode][index]
+
+
+def _qr_segment(text):
+    """
+    (mode, character count, data bits) of `text` in the most compact single mode, as the
+    printer's automatic mode picks it for the values printed here.
+    """
+    bits = []
+
+    def append(value, length):
+        bits.extend((value >> shift) & 1 for shift in range(length - 1, -1, -1))
+
+    if text.isdigit() and text.isascii():
+        for start in range(0, len(text), 3):
+            group = text[start:start + 3]
+            append(int(group), len(group) * 3 + 1)
+        return _QR_NUMERIC, len(text), bits
+    if all(char in _QR_ALPHANUMERIC for char in text):
+        for start in range(0, len(text) - 1, 2):
+            append(_QR_ALPHANUMERIC.index(text[start]) * 45 + _QR_ALPHANUMERIC.index(text[start + 1]), 11)
+        if len(text) % 2:
+            append(_QR_ALPHANUMERIC.index(text[-1]), 6)
+        return _QR_ALNUM, len(text), bits
+    data = text.encode("utf-8")
+    for byte in data:
+        append(byte, 8)
+    return _QR_BYTE, len(data), bits
+
+
+def _qr_codewords(text, ecc):
+    """
+    (version, codewords with error correction, interleaved) of `text` in the smallest version.
+    """
+    mode, count, data_bits = _qr_segment(text)
+    for version in range(1, 41):
+        capacity = _qr_data_codewords(version, ecc) * 8
+        used = 4 + _qr_count_bits(mode, version) + len(data_bits)
+        if used <= capacity:
+            break
+    else:
+        raise ValueError(f"Too much data for a QR code: {len(text)} characters")
+
+    bits = []
+    for value, length in ((mode, 4), (count, _qr_count_bits(mode, version))):
+        bits.extend((value >> shift) & 1 for shift in range(length - 1, -1, -1))
+    bits.extend(data_bits)
+    bits.extend([0] * min(4, capacity - len(bits)))  # Terminator
+    bits.extend([0] * (-len(bits) % 8))
+    data = [int("".join(map(str, bits[start:start + 8])), 2) for start in range(0, len(bits), 8)]
+    for pad in (0xEC, 0x11) * ((capacity // 8 - len(data)) // 2 + 1):
+        if len(data) == capacity // 8:
+            break
+        data.append(pad)
+
+    blocks_count = _QR_ERROR_CORRECTION_BLOCKS[ecc][version - 1]
+    ecc_length = _QR_ECC_CODEWORDS_PER_BLOCK[ecc][version - 1]
+    raw = _qr_raw_codewords(version)
+    short_blocks = blocks_count - raw % blocks_count
+    short_length = raw // blocks_count
+    divisor = _rs_divisor(ecc_length)
+    blocks = []
+    start = 0
+    for index in range(blocks_count):
+        block = data[start:start + short_length - ecc_length + (0 if index < short_blocks else 1)]
+        start += len(block)
+        ecc_bytes = _rs_remainder(block, divisor)
+        if index < short_blocks:
+            block.append(0)  # Placeholder, skipped when interleaving
+        blocks.append(block + ecc_bytes)
+    codewords = [
+        block[position]
+        for position in range(len(blocks[0]))
+        for index, block in enumerate(blocks)
+        if position != short_length - ecc_length or index >= short_blocks
+    ]
+    return version, codewords
+
+
+def _qr_format_bits(ecc, mask):
+    data = _QR_ECC_FORMAT_BITS[ecc] << 3 | mask
+    remainder = data
+    for _ in range(10):
+        remainder = (remainder << 1) ^ ((remainder >> 9) * 0x537)
+    return (data << 10 | remainder) ^ 0x5412
+
+
+def _qr_version_bits(version):
+    remainder = version
+    for _ in range(12):
+        remainder = (remainder << 1) ^ ((remainder >> 11) * 0x1F25)
+    return version << 12 | remainder
+
+
+def _qr_format_positions(size):
+    """
+    Module coordinates (x, y) of the 15 format bits, least significant first, in both copies.
+    """
+    first = [(8, index) for index in range(6)] + [(8, 7), (8, 8), (7, 8)] + [(14 - index, 8) for index in range(9, 15)]
+    second = [(size - 1 - index, 8) for index in range(8)] + [(8, size - 15 + index) for index in range(8, 15)]
+    return first, second
+
+
+def _qr_function_patterns(version):
+    """
+    (modules, reserved) of a symbol with only its function patterns drawn: finder,
+    timing and alignment patterns, the dark module and the version information;
+    `reserved` marks them and the format information area.
+    """
+    size = _qr_size(version)
+    modules = [[False] * size for _ in range(size)]
+    reserved = [[False] * size for _ in range(size)]
+
+    def draw(x, y, dark):
+        modules[y][x] = dark
+        reserved[y][x] = True
+
+    for index in range(size):
+        draw(6, index, index % 2 == 0)
+        draw(index, 6, index % 2 == 0)
+    for center_x, center_y in ((3, 3), (size - 4, 3), (3, size - 4)):
+        for dy in range(-4, 5):
+            for dx in range(-4, 5):
+                x, y = center_x + dx, center_y + dy
+                if 0 <= x < size and 0 <= y < size:
+                    draw(x, y, max(abs(dx), abs(dy)) not in (2, 4))
+    positions = _qr_alignment_positions(version)
+    last = len(positions) - 1
+    for i, center_x in enumerate(positions):
+        for j, center_y in enumerate(positions):
+            if (i, j) in ((0, 0), (0, last), (last, 0)):
+                continue  # Under a finder pattern
+            for dy in range(-2, 3):
+                for dx in range(-2, 3):
+                    draw(center_x + dx, center_y + dy, max(abs(dx), abs(dy)) != 1)
+    for copy in _qr_format_positions(size):
+        for x, y in copy:
+            draw(x, y, False)
+    draw(8, size - 8, True)
+    if version >= 7:
+        bits = _qr_version_bits(version)
+        for index in range(18):
+            dark = (bits >> index) & 1 == 1
+            a, b = size - 11 + index % 3, index // 3
+            draw(a, b, dark)
+            draw(b, a, dark)
+    return modules, reserved
+
+
+def _qr_data_positions(reserved):
+    """
+    Module coordinates (x, y) of the data bits, in placement order (the zigzag in pairs of columns).
+    """
+    size = len(reserved)
+    positions = []
+    for right in range(size - 1, 0, -2):
+        if right <= 6:
+            right -= 1  # Skip the vertical timing pattern
+        upward = ((right + 1) & 2) == 0
+        for vertical in range(size):
+            y = size - 1 - vertical if upward else vertical
+            for x in (right, right - 1):
+                if not reserved[y][x]:
+                    positions.append((x, y))
+    return positions
+
+
+def _qr_penalty(modules):
+    """
+    Penalty score of a masked symbol (runs, 2x2 blocks, finder-like patterns, dark balance).
+    """
+    size = len(modules)
+    score = 0
+    lines = ["".join("1" if dark else "0" for dark in row) for row in modules]
+    lines += ["".join("1" if modules[y][x] else "0" for y in range(size)) for x in range(size)]
+    for line in lines:
+        run_color, run_length = None, 0
+        for char in line:
+            if char == run_color:
+                run_length += 1
+            else:
+                if run_length >= 5:
+                    score += run_length - 2
+                run_color, run_length = char, 1
+        if run_length >= 5:
+            score += run_length - 2
+        padded = f"0000{line}0000"
+        score += 40 * (padded.count("10111010000") + padded.count("00001011101"))
+    for y in range(size - 1):
+        for x in range(size - 1):
+            if modules[y][x] == modules[y][x + 1] == modules[y + 1][x] == modules[y + 1][x + 1]:
+                score += 3
+    dark = sum(map(sum, modules))
+    total = size * size
+    score += ((abs(dark * 20 - total * 10) + total - 1) // total - 1) * 10
+    return score
+
+
+def qr_matrix(data, ecc="L"):
+    """
+    The module matrix (rows of booleans, True for dark) of the QR code of `data` (str),
+    in the smallest version for the error correction level `ecc` ("L", "M", "Q" or "H")
+    and with the mask of lowest penalty. Cached per value.
+    """
+    return _qr_matrix(data, ecc)
+
+
+@functools.lru_cache(maxsize=4096)
+def _qr_matrix(data, ecc):
+    if ecc not in _QR_ECC_FORMAT_BITS:
+        raise ValueError(f"Unknown QR error correction level {ecc!r}")
+    version, codewords = _qr_codewords(data, ecc)
+    base, reserved = _qr_function_patterns(version)
+    positions = _qr_data_positions(reserved)
+    best = None
+    for mask, masked in enumerate(_QR_MASKS):
+        modules = [row[:] for row in base]
+        for index, (x, y) in enumerate(positions):
+            dark = index < len(codewords) * 8 and (codewords[index >> 3] >> (7 - (index & 7))) & 1 == 1
+            modules[y][x] = dark != masked(x, y)
+        format_bits = _qr_format_bits(ecc, mask)
+        for copy in _qr_format_positions(len(modules)):
+            for index, (x, y) in enumerate(copy):
+                modules[y][x] = (format_bits >> index) & 1 == 1
+        penalty = _qr_penalty(modules)
+        if best is None or penalty < best[0]:
+            best = (penalty, modules)
+    return tuple(tuple(row) for row in best[1])
+
+
+qr_matrix.cache_clear = _qr_matrix.cache_clear
+qr_matrix.cache_info = _qr_matrix.cache_info
+
+
+def decode_qr(matrix):
+    """
+    Read back the text of a QR module matrix (as returned by qr_matrix, or sampled from an
+    image). Raises ValueError when it isn't a valid symbol or fails its error check;
+    errors are detected, not corrected.
+    """
+    size = len(matrix)
+    version = (size - 17) // 4
+    if not 1 <= version <= 40 or _qr_size(version) != size or any(len(row) != size for row in matrix):
+        raise ValueError(f"Not a QR code matrix: {size} rows")
+
+    # Format information: the nearest valid code over both copies
+    best = None
+    for copy in _qr_format_positions(size):
+        read = sum(1 << index for index, (x, y) in enumerate(copy) if matrix[y][x])
+        for ecc in QR_ECC_LEVELS:
+            for mask in range(8):
+                distance = bin(read ^ _qr_format_bits(ecc, mask)).count("1")
+                if best is None or distance < best[0]:
+                    best = (distance, ecc, mask)
+    distance, ecc, mask = best
+    if distance > 3:
+        raise ValueError("Unreadable QR format information")
+
+    _, reserved = _qr_function_patterns(version)
+    masked = _QR_MASKS[mask]
+    raw = _qr_raw_codewords(version)
+    bits = [matrix[y][x] != masked(x, y) for x, y in _qr_data_positions(reserved)]
+    codewords = [sum(bits[index * 8 + shift] << (7 - shift) for shift in range(8)) for index in range(raw)]
+
+    # Undo the interleaving and check each block
+    blocks_count = _QR_ERROR_CORRECTION_BLOCKS[ecc][version - 1]
+    ecc_length = _QR_ECC_CODEWORDS_PER_BLOCK[ecc][version - 1]
+    short_blocks = blocks_count - raw % blocks_count
+    short_length = raw // blocks_count
+    blocks = [[] for _ in range(blocks_count)]
+    position = 0
+    for column in range(short_length + 1):
+        for index in range(blocks_count):
+            if column == short_length - ecc_length and index < short_blocks:
+                continue  # Short blocks have one data codeword less
+            blocks[index].append(codewords[position])
+            position += 1
+    data = []
+    for block in blocks:
+        if not _rs_syndromes_ok(block, ecc_length):
+            raise ValueError("QR code error check failed")
+        data.extend(block[:-ecc_length])
+
+    # Segments
+    bits = [(byte >> shift) & 1 for byte in data for shift in range(7, -1, -1)]
+    position = 0
+
+    def read(length):
+        nonlocal position
+        if position + length > len(bits):
+            raise ValueError("Truncated QR segment")
+        value = 0
+        for bit in bits[position:position + length]:
+            value = value << 1 | bit
+        position += length
+        return value
+
+    text = []
+    while len(bits) - position >= 4:
+        mode = read(4)
+        if mode == 0:
+            break
+        if mode not in (_QR_NUMERIC, _QR_ALNUM, _QR_BYTE):
+            raise ValueError(f"Unsupported QR mode {mode}")
+        count = read(_qr_count_bits(mode, version))
+        if mode == _QR_NUMERIC:
+            digits = []
+            for start in range(0, count, 3):
+                group = min(3, count - start)
+                digits.append(f"{read(group * 3 + 1):0{group}d}")
+            text.append("".join(digits))
+        elif mode == _QR_ALNUM:
+            chars = []
+            for _ in range(count // 2):
+                pair = read(11)
+                chars.append(_QR_ALPHANUMERIC[pair // 45] + _QR_ALPHANUMERIC[pair % 45])
+            if count % 2:
+                chars.append(_QR_ALPHANUMERIC[read(6)])
+            text.append("".join(chars))
+        else:
+            raw_bytes = bytes(read(8) for _ in range(count))
+            try:
+                text.append(raw_bytes.decode("utf-8"))
+            except UnicodeDecodeError:
+                text.append(raw_bytes.decode("latin-1"))
+    return "".join(text)
+
+
+def render_qr(data, magnification=2, ecc="L"):
+    """
+    The QR code of `data` as a 1-bit PIL image, `magnification` dots per module and no
+    quiet zone, as ^BQN,2,{magnification} prints it.
+    """
+    from PIL import Image
+    matrix = qr_matrix(data, ecc)
+    size = len(matrix)
+    image = Image.new("1", (size, size), 1)
+    image.putdata([0 if dark else 1 for row in matrix for dark in row])
+    return image.resize((size * magnification, size * magnification), Image.NEAREST)
+
+
+def decode_qr_image(image, magnification=2):
+    """
+    Read back the text of a QR code image such as render_qr returns (the code on a light
+    background, `magnification` dots per module).
+    """
+    from PIL import ImageOps
+    gray = image.convert("L")
+    box = ImageOps.invert(gray).point(lambda value: 255 if value >= 128 else 0).getbbox()
+    if box is None:
+        raise ValueError("No QR code in the image")
+    left, top, right, bottom = box
+    size = (right - left) // magnification
+    pixels = gray.load()
+    half = magnification // 2
+    matrix = [
+        [pixels[left + x * magnification + half, top + y * magnification + half] < 128 for x in range(size)]
+        for y in range(size)
+    ]
+    return decode_qr(matrix)
+
+
+# Label previews rendered locally: the text fields and QR codes of the label format, drawn
+# without the Labelary service (approximate fonts), for offline previews and label checks
+LABEL_PREVIEW_SIZE = (336, 160)  # 42 x 20 mm at 8 dots/mm, as render_zpl_preview
+
+
+def render_zpl_preview_local(zpl_code):
+    """
+    Render the ^FO/^FT positioned ^A text and ^BQ QR code fields of `zpl_code` (what the
+    label templates use; other commands, RFID writes included, are ignored) to a PIL image.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+    image = Image.new("L", LABEL_PREVIEW_SIZE, 255)
+    draw = ImageDraw.Draw(image)
+    fonts = {}
+    origin = None  # (x, y, "FO" or "FT") of the current field
+    font_height = 9
+    qr_magnification = None
+    hex_indicator = None
+    rfid = False
+    data = None
+
+    def font(height):
+        if height not in fonts:
+            try:
+                fonts[height] = ImageFont.load_default(size=height)
+            except TypeError:  # Pillow < 10.1: fixed size bitmap font
+                fonts[height] = ImageFont.load_default()
+        return fonts[height]
+
+    for command in zpl_code.split("^")[1:]:
+        name, params = command[:2].upper(), command[2:]
+        if name in ("FO", "FT"):
+            coordinates = [value.strip() for value in params.split(",")[:2]] + ["0", "0"]
+            origin = tuple(int(value) if value.isdigit() else 0 for value in coordinates[:2]) + (name,)
+        elif name == "FD":
+            data = params
+        elif name == "FH":
+            hex_indicator = params[:1] or "_"
+        elif name == "BQ":
+            options = params.split(",")
+            qr_magnification = int(options[2]) if len(options) > 2 and options[2].strip().isdigit() else 2
+        elif name == "RF":
+            rfid = True
+        elif name == "FS":
+            if data is not None and origin is not None and not rfid:
+                if hex_indicator:
+                    data = re.sub(re.escape(hex_indicator) + "([0-9A-Fa-f]{2})", lambda m: chr(int(m.group(1), 16)), data)
+                x, y, kind = origin
+                if qr_magnification:
+                    ecc = data[:1].upper() if data[:1].upper() in _QR_ECC_FORMAT_BITS else "L"
+                    qr = render_qr(data.split(",", 1)[-1], qr_magnification, ecc)
+                    image.paste(qr.convert("L"), (x, y - qr.height if kind == "FT" else y))
+                else:
+                    try:
+                        draw.text((x, y), data, fill=0, font=font(font_height), anchor="ls" if kind == "FT" else "la")
+                    except ValueError:  # Bitmap fonts have no anchors
+                        draw.text((x, y - font_height if kind == "FT" else y), data, fill=0, font=font(font_height))
+            origin, qr_magnification, hex_indicator, rfid, data = None, None, None, False, None
+        elif name in ("XA", "XZ"):
+            origin, qr_magnification, hex_indicator, rfid, data = None, None, None, False, None
+        elif command[:1].upper() == "A" and len(command) > 1:
+            options = command[2:].split(",")  # ^A{font}{orientation},{height},{width}
+            if len(options) > 1 and options[1].strip().isdigit():
+                font_height = int(options[1])
+    return image